@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from checkpoint import discard_partial, extract_to_ndjson
+from streaming import iter_ndjson
+
+
+def plan_windows(start_date, end_date, window_days=7):
+    """Split an inclusive date range into consecutive windows of window_days
+
+    Returns (start, end) ISO date pairs; both ends are inclusive, matching the
+    API's startdate/enddate parameters.
+    """
+    start = date.fromisoformat(str(start_date)[:10])
+    end = date.fromisoformat(str(end_date)[:10])
+    windows = []
+    while start <= end:
+        window_end = min(end, start + timedelta(days=window_days - 1))
+        windows.append((start.isoformat(), window_end.isoformat()))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+def plan_shards(start_date, end_date, window_days=7, station_ids=None):
+    """Backfill shards: one per date window, or per station and window
+
+    With ``station_ids`` each shard reads ``stations/{id}/readings``, which
+    keeps every query small even for long windows.
+    """
+    shards = []
+    for window_start, window_end in plan_windows(start_date, end_date, window_days):
+        params = {"startdate": window_start, "enddate": window_end, "_sorted": "asc"}
+        if station_ids is None:
+            shards.append({
+                'id': f"readings_{window_start}_{window_end}",
+                'endpoint': "readings",
+                'params': params
+            })
+            continue
+        for station_id in station_ids:
+            shards.append({
+                'id': f"station-{station_id}_{window_start}_{window_end}",
+                'endpoint': f"stations/{station_id}/readings",
+                'params': params
+            })
+    return shards
+
+
+class BackfillManifest:
+    """Record of completed backfill shards, rewritten atomically on each update"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.data = {'version': 1, 'shards': {}}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+
+    def is_done(self, shard_id):
+        return shard_id in self.data['shards']
+
+    def mark_done(self, shard, rows):
+        with self.lock:
+            self.data['shards'][shard['id']] = {
+                'endpoint': shard['endpoint'],
+                'params': shard['params'],
+                'rows': rows,
+                'completed_at': datetime.now().isoformat()
+            }
+            tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    @property
+    def rows(self):
+        return sum(shard['rows'] for shard in self.data['shards'].values())
+
+
+def run_backfill(engine, shards, work_dir, store, workers=None, limit=1000):
+    """Fetch shards in parallel and commit each to the readings store
+
+    Shards share the engine, so its rate limit covers the whole backfill.
+    Each shard is pulled with checkpointing into ``work_dir``, committed to
+    ``store`` (which skips readings it already holds by measure and
+    dateTime, and writes revision segments for changed values), recorded in
+    ``work_dir/_manifest.json`` and then its spool file is removed. Shards
+    already in the manifest are skipped, so a rerun only fetches what is
+    missing. ``workers`` defaults to the engine's max_workers and is capped
+    at its connection pool size, beyond which keep-alive connections would
+    be discarded. Returns (shards fetched, new readings committed).
+    """
+    workers = workers or engine.max_workers
+    if workers > engine.pool_size:
+        logging.warning(f"Backfill: {workers} workers exceed the engine's pool of "
+                        f"{engine.pool_size} connections; using {engine.pool_size}")
+        workers = engine.pool_size
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    manifest = BackfillManifest(work_dir / "_manifest.json")
+    todo = [shard for shard in shards if not manifest.is_done(shard['id'])]
+    logging.info(f"Backfill: {len(shards) - len(todo)} of {len(shards)} shards already done")
+
+    def fetch(shard):
+        # Parallelism comes from shards, so each pull reads one page at a time
+        path = work_dir / f"{shard['id']}.ndjson"
+        return extract_to_ndjson(engine, shard['endpoint'], path, shard['params'], limit, prefetch=1)
+
+    committed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, shard): shard for shard in todo}
+        try:
+            for future in as_completed(futures):
+                shard = futures[future]
+                dataset = future.result()
+                # The store is not thread-safe, so commits happen here one at a time
+                committed += store.append(iter_ndjson(dataset.path))
+                manifest.mark_done(shard, len(dataset))
+                discard_partial(dataset.path)
+                logging.info(f"Backfill shard {shard['id']}: {len(dataset)} readings")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return len(todo), committed
@@ -0,0 +1,98 @@
+"""Compare a sharded backfill with a single deep-offset readings pull
+
+Both run against the stub API with per-request latency and a cost that
+grows with the offset, and both commit to a readings store. The backfill
+must commit exactly the readings the single pull returns, and a rerun must
+skip every finished shard. The engine is built as run_backfill_extraction
+builds it for ``--workers``, and urllib3 must not discard any connection
+for a full pool; a second backfill through an engine with a smaller pool
+checks the workers are capped to it. Run from the repository root:
+
+    python -m benchmarks.bench_backfill --readings 200000 --window-days 7 --latency 0.1
+"""
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from backfill import plan_shards, run_backfill
+from checkpoint import extract_to_ndjson
+from extraction import ExtractionEngine
+from readings_store import ReadingsStore
+from benchmarks.stub_server import StubFloodServer
+
+
+class PoolFullCounter(logging.Handler):
+    """Counts urllib3's "Connection pool is full, discarding connection" warnings"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if "Connection pool is full" in record.getMessage():
+            self.count += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--stations", type=int, default=10)
+    parser.add_argument("--window-days", type=int, default=1)
+    parser.add_argument("--per-station", action="store_true", help="shard by station as well as by window")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--offset-cost", type=float, default=0.05, help="seconds per 10,000 rows skipped")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    pool_full = PoolFullCounter()
+    logging.getLogger("urllib3.connectionpool").addHandler(pool_full)
+
+    with StubFloodServer(args.stations, args.readings, latency=args.latency, offset_cost=args.offset_cost) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        readings = stub.datasets["readings"]
+        start_date, end_date = readings[0]["dateTime"][:10], readings[-1]["dateTime"][:10]
+        # As FloodDataExtractor(max_workers=workers) in run_backfill_extraction
+        engine = ExtractionEngine(stub.base_url, max_workers=args.workers, rate_limit=0)
+
+        start = time.perf_counter()
+        single = extract_to_ndjson(engine, "readings", Path(tmp) / "single.ndjson", limit=1000)
+        ReadingsStore(Path(tmp) / "single_store").append(single)
+        single_time = time.perf_counter() - start
+        single_stats = (stub.request_count, stub.max_offset)
+        single_ids = {record['@id'] for record in single}
+
+        station_ids = [s['@id'].split('/')[-1] for s in stub.datasets["stations"]] if args.per_station else None
+        shards = plan_shards(start_date, end_date, args.window_days, station_ids)
+        store = ReadingsStore(Path(tmp) / "store")
+
+        stub.request_count = stub.max_offset = 0
+        start = time.perf_counter()
+        fetched, added = run_backfill(engine, shards, Path(tmp) / "backfill", store, workers=args.workers)
+        backfill_time = time.perf_counter() - start
+        backfill_stats = (stub.request_count, stub.max_offset)
+
+        assert {record['@id'] for record in store.iter_records()} == single_ids, "backfill differs from single pull"
+        assert added == len(single_ids)
+
+        requests_before = stub.request_count
+        refetched, _ = run_backfill(engine, shards, Path(tmp) / "backfill", store, workers=args.workers)
+        assert refetched == 0 and stub.request_count == requests_before, "rerun fetched finished shards"
+
+        # More workers than a default engine's pool: capped, so no connection is discarded
+        small_engine = ExtractionEngine(stub.base_url, rate_limit=0)
+        run_backfill(small_engine, shards, Path(tmp) / "small_backfill", ReadingsStore(Path(tmp) / "small_store"),
+                     workers=small_engine.pool_size * 3)
+        assert pool_full.count == 0, f"{pool_full.count} pooled connections discarded"
+
+    print(f"single pull:  {single_time:.2f}s ({len(single_ids):,} readings, "
+          f"{single_stats[0]} requests, deepest offset {single_stats[1]:,})")
+    print(f"backfill:     {backfill_time:.2f}s ({fetched} shards, {args.workers} workers, "
+          f"{backfill_stats[0]} requests, deepest offset {backfill_stats[1]:,})")
+    print(f"identical records; rerun skipped all shards; speedup {single_time / backfill_time:.1f}x")
+    print("no pooled connections discarded, with workers above a smaller pool capped to it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Data status from the catalog against scanning the CSVs
+
+Writes flood_data-style CSVs through ndjson_to_csv and catalogues them as
+the full load does, then compares the old line-counting status scan with
+catalog lookups. Also checks that a deleted catalog is rebuilt with the
+same entries and that a changed file is rescanned. Run from the
+repository root:
+
+    python -m benchmarks.bench_catalog --readings 2000000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from catalog import DataCatalog, time_column
+from streaming import NDJSONPageWriter, ndjson_to_csv
+from benchmarks.stub_server import make_flood, make_reading, make_station
+
+
+def write_dataset(directory, catalog, name, records, page_rows=100_000):
+    ndjson_path = directory / f"{name}.ndjson"
+    with NDJSONPageWriter(ndjson_path) as writer:
+        for start in range(0, len(records), page_rows):
+            writer.write_page(records[start:start + page_rows])
+    fields = sorted(writer.fieldnames)
+    csv_path = directory / f"{name}.csv"
+    rows, min_time, max_time = ndjson_to_csv(ndjson_path, csv_path, fields, time_column(fields))
+    catalog.record(csv_path, rows, fields, min_time, max_time, time_column(fields))
+    ndjson_path.unlink()
+    return csv_path
+
+
+def scan_status(paths):
+    """What check_data_status used to do: read every line to count records"""
+    status = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            headers = next(reader)
+            status[path.name] = (sum(1 for _ in reader), len(headers))
+    return status
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        catalog = DataCatalog(directory)
+        paths = [
+            write_dataset(directory, catalog, "stations", [make_station(i) for i in range(args.stations)]),
+            write_dataset(directory, catalog, "readings",
+                          [make_reading(i, args.stations) for i in range(args.readings)]),
+            write_dataset(directory, catalog, "flood_warnings", [make_flood(i) for i in range(200)]),
+        ]
+
+        scanned, scan_time = timed(lambda: scan_status(paths))
+        entries, catalog_time = timed(lambda: {p.name: DataCatalog(directory).describe(p) for p in paths})
+        for name, (rows, columns) in scanned.items():
+            assert entries[name]['rows'] == rows and len(entries[name]['columns']) == columns, name
+        readings = entries["readings.csv"]
+        assert readings['min_time'] == make_reading(0)['dateTime']
+        assert readings['max_time'] == make_reading(args.readings - 1, args.stations)['dateTime']
+
+        os.remove(catalog.path)
+        rebuilt, rebuild_time = timed(lambda: DataCatalog(directory).rebuild())
+        for name, entry in entries.items():
+            for key in ('rows', 'md5', 'bytes'):
+                assert rebuilt[name][key] == entry[key], (name, key)
+            assert list(rebuilt[name]['columns']) == list(entry['columns'])
+            # The rebuild parses times, so compare them as instants
+            if entry['min_time']:
+                assert rebuilt[name]['min_time'][:19] == entry['min_time'][:19]
+
+        with open(paths[1], 'a', encoding='utf-8') as f:
+            f.write(",".join([""] * len(readings['columns'])) + "\n")
+        changed = DataCatalog(directory).describe(paths[1])
+        assert changed['rows'] == readings['rows'] + 1, "changed file was not rescanned"
+
+    print(f"scan status:     {scan_time * 1e3:9.1f} ms ({args.readings:,} readings)")
+    print(f"catalog status:  {catalog_time * 1e3:9.1f} ms ({scan_time / catalog_time:,.0f}x faster)")
+    print(f"rebuild catalog: {rebuild_time * 1e3:9.1f} ms")
+    print("catalog: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Startup time and imports of the light cli.py subcommands
+
+Builds a small flood_data directory (catalogued CSVs and a readings store)
+in a temporary directory, then runs ``cli.py --help``, ``status`` and
+``latest`` there in fresh interpreters. Reports the best wall time of
+each against a bare ``python -c pass`` and against reaching the status
+through full_load (which still imports the extraction stack), checks with
+``python -X importtime`` that none of cli.HEAVY_MODULES is imported,
+checks ``status`` in an empty directory creates nothing, and fails if a
+command's overhead over bare startup exceeds the budget. Run from the
+repository root:
+
+    python -m benchmarks.bench_cli_startup --budget-ms 150
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from catalog import DataCatalog
+from cli import HEAVY_MODULES
+from readings_store import ReadingsStore
+from benchmarks.bench_catalog import write_dataset
+from benchmarks.stub_server import make_flood, make_reading, make_station
+
+ROOT = Path(__file__).resolve().parent.parent
+CLI = str(ROOT / "cli.py")
+
+
+def run(command, cwd, env):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def best_of(command, cwd, env, repeat):
+    return min(run(command, cwd, env) for _ in range(repeat))
+
+
+def imported_modules(command, cwd, env):
+    """Top-level package names a command imports, from -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime"] + command[1:], cwd=cwd, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    names = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            names.add(name.split(".")[0])
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "flood_data"
+        data_dir.mkdir()
+        catalog = DataCatalog(data_dir)
+        write_dataset(data_dir, catalog, "stations", [make_station(i) for i in range(args.stations)])
+        readings = [make_reading(i, args.stations) for i in range(args.readings)]
+        write_dataset(data_dir, catalog, "readings", readings)
+        write_dataset(data_dir, catalog, "flood_warnings", [make_flood(i) for i in range(50)])
+        ReadingsStore(data_dir / "readings_store").append(readings)
+
+        env = dict(os.environ, PYTHONPATH=str(ROOT), PYTHONDONTWRITEBYTECODE="1")
+        # Warm the OS page cache and compile the modules once
+        subprocess.run([sys.executable, CLI, "status"], cwd=tmp, env=env, check=True, capture_output=True)
+
+        # A status query in a directory with no data must not create any
+        empty = Path(tmp) / "empty"
+        empty.mkdir()
+        subprocess.run([sys.executable, CLI, "status"], cwd=empty, env=env, check=True, capture_output=True)
+        assert not any(empty.iterdir()), f"status created {sorted(p.name for p in empty.iterdir())}"
+
+        station = f"S{args.stations - 1:05d}"
+        latest = subprocess.run([sys.executable, CLI, "latest", station], cwd=tmp, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        assert make_reading(args.readings - 1, args.stations)['dateTime'] in latest, latest
+
+        bare = best_of([sys.executable, "-c", "pass"], tmp, env, args.repeat)
+        old = best_of([sys.executable, "-c", "from full_load import check_data_status; check_data_status()"],
+                      tmp, env, args.repeat)
+        print(f"python -c pass:       {bare * 1e3:7.1f} ms")
+        print(f"status via full_load: {old * 1e3:7.1f} ms (+{(old - bare) * 1e3:.1f} ms)")
+
+        failures = []
+        for name, command in (("cli.py --help", ["--help"]), ("cli.py status", ["status"]),
+                              ("cli.py latest", ["latest", station])):
+            command = [sys.executable, CLI] + command
+            seconds = best_of(command, tmp, env, args.repeat)
+            overhead = (seconds - bare) * 1e3
+            heavy = sorted(imported_modules(command, tmp, env) & set(HEAVY_MODULES))
+            print(f"{name + ':':<21} {seconds * 1e3:7.1f} ms (+{overhead:.1f} ms, "
+                  f"{old / seconds:.1f}x faster than via full_load), heavy imports: {heavy or 'none'}")
+            if heavy:
+                failures.append(f"{name} imports {', '.join(heavy)}")
+            if overhead > args.budget_ms:
+                failures.append(f"{name} takes {overhead:.0f} ms over bare startup (budget {args.budget_ms:.0f} ms)")
+
+    assert not failures, "; ".join(failures)
+    print(f"startup budget of {args.budget_ms:.0f} ms: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compare decoding raw readings with json.load against the streaming column decoder
+
+Writes a raw readings snapshot as extract does (an indented JSON array,
+or NDJSON with --format ndjson), then loads and transforms it with
+json.load + transform_readings and with load_raw_columns +
+transform_readings. Each mode runs in a fresh subprocess so peak RSS is
+measured separately; both must produce the same table. Also times decoding one API
+page from response bytes with Response.json() and decoding.loads. Run
+from the repository root:
+
+    python -m benchmarks.bench_decoding --readings 1000000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+import decoding
+from decoding import load_raw_columns
+from storage import JSONBackend, NDJSONBackend
+from transforms import INTERN_FIELDS, READING_FIELDS, transform_readings
+from benchmarks.stub_server import make_reading
+
+EXTRACTED_AT = datetime(2024, 1, 1)
+
+
+def status_mb(field):
+    """A memory field of /proc/self/status in MB
+
+    Used instead of ru_maxrss, which on Linux keeps the high-water mark of
+    the parent forked before exec and so would count the parent's memory.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_mode(mode, path):
+    """Decode and transform ``path`` one way; prints one JSON line of results"""
+    backend = NDJSONBackend() if path.endswith(".ndjson") else JSONBackend()
+    baseline = status_mb("VmRSS")
+    start = time.perf_counter()
+    raw = backend.load(path) if mode == "json" else load_raw_columns(path, READING_FIELDS, INTERN_FIELDS['readings'])
+    decoded = time.perf_counter()
+    decode_peak = status_mb("VmHWM")
+    df = transform_readings(raw, EXTRACTED_AT)
+    done = time.perf_counter()
+    peak = status_mb("VmHWM")
+    print(json.dumps({
+        'mode': mode,
+        'rows': len(df),
+        'decode_s': decoded - start,
+        'transform_s': done - decoded,
+        'decode_peak_mb': decode_peak - baseline,
+        'peak_mb': peak - baseline,
+        'digest': int(pd.util.hash_pandas_object(df, index=True).sum()),
+    }))
+
+
+def time_page_decode(page_rows, repeat):
+    body = json.dumps({'meta': {'limit': page_rows}, 'items': [make_reading(i) for i in range(page_rows)]}).encode()
+    response = requests.models.Response()
+    response._content = body
+    response.status_code = 200
+    results = {}
+    for name, decode in (("Response.json()", response.json), ("decoding.loads", lambda: decoding.loads(body))):
+        assert decode() == json.loads(body)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decode()
+        results[name] = (time.perf_counter() - start) / repeat
+    return len(body), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=500_000)
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json")
+    parser.add_argument("--page-rows", type=int, default=10_000)
+    parser.add_argument("--mode", choices=["json", "columns"])
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = NDJSONBackend() if args.format == "ndjson" else JSONBackend()
+        path = Path(tmp) / f"readings{backend.extension}"
+        backend.save([make_reading(i, args.stations) for i in range(args.readings)], path)
+        size_mb = path.stat().st_size / 1e6
+        print(f"input: {args.readings:,} readings, {size_mb:,.0f} MB {args.format}")
+
+        results = {}
+        for mode in ("json", "columns"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_decoding", "--mode", mode, "--path", str(path)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    assert results['json']['digest'] == results['columns']['digest'], "decoders produced different tables"
+    for mode, label in (("json", "json.load"), ("columns", "load_raw_columns")):
+        r = results[mode]
+        print(f"{label:>17}: decode {r['decode_s']:6.2f}s ({args.readings / r['decode_s']:>9,.0f} rows/s, "
+              f"{size_mb / r['decode_s']:5.0f} MB/s, peak +{r['decode_peak_mb']:,.0f} MB), "
+              f"with transform {r['decode_s'] + r['transform_s']:5.2f}s, peak +{r['peak_mb']:,.0f} MB")
+    print("same transformed table: ok")
+
+    body_bytes, page = time_page_decode(args.page_rows, repeat=20)
+    orjson_note = "orjson" if decoding.orjson is not None else "json, orjson not installed"
+    print(f"page of {args.page_rows:,} items ({body_bytes / 1e6:.1f} MB), decoding.loads uses {orjson_note}:")
+    for name, seconds in page.items():
+        print(f"{name:>17}: {seconds * 1e3:7.1f} ms ({body_bytes / 1e6 / seconds:5.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark paginated extraction against a local stub server
+
+Compares the old one-page-at-a-time ``requests.get`` loop with the shared
+``ExtractionEngine``. Run from the repository root:
+
+    python -m benchmarks.bench_extraction
+"""
+import argparse
+import time
+
+import requests
+
+from extraction import ExtractionEngine
+from benchmarks.stub_server import StubFloodServer
+
+
+def serial_extract(base_url, endpoint, limit):
+    """Baseline: bare requests.get per page, no pooling, no concurrency"""
+    all_items = []
+    offset = 0
+    while True:
+        response = requests.get(
+            f"{base_url}/{endpoint}",
+            params={"_limit": limit, "_offset": offset},
+            timeout=30
+        )
+        items = response.json().get('items', [])
+        if not items:
+            break
+        all_items.extend(items)
+        offset += limit
+    return all_items
+
+
+def engine_extract(base_url, endpoint, limit, workers, rate_limit):
+    engine = ExtractionEngine(base_url, max_workers=workers, rate_limit=rate_limit)
+    try:
+        all_items = []
+        for items in engine.iter_pages(endpoint, limit=limit):
+            all_items.extend(items)
+        return all_items
+    finally:
+        engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated server latency per page (s)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests/s, 0 disables")
+    args = parser.parse_args()
+
+    with StubFloodServer(n_stations=100, n_readings=args.readings, latency=args.latency) as stub:
+        start = time.perf_counter()
+        baseline = serial_extract(stub.base_url, "readings", args.limit)
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pooled = engine_extract(stub.base_url, "readings", args.limit, args.workers, args.rate_limit)
+        engine_time = time.perf_counter() - start
+
+    assert pooled == baseline, "engine returned pages out of order"
+
+    print(f"readings: {len(baseline)}  pages: {len(baseline) // args.limit}")
+    print(f"serial:   {serial_time:.3f}s  ({len(baseline) / serial_time:,.0f} rows/s)")
+    print(f"engine:   {engine_time:.3f}s  ({len(pooled) / engine_time:,.0f} rows/s)  workers={args.workers}")
+    print(f"speedup:  {serial_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
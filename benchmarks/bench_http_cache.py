@@ -0,0 +1,81 @@
+"""Check the HTTP cache against the stub API and count requests saved
+
+Pulls stations and floods three times: cold, within the TTL, and after the
+TTL with unchanged data (304s). Then changes a station and checks the next
+pull returns the new data. Finally runs with a size bound of half the
+pulled bytes to check LRU eviction. Run from the repository root:
+
+    python -m benchmarks.bench_http_cache --stations 5000 --latency 0.02
+"""
+import argparse
+import tempfile
+import time
+
+from extraction import ExtractionEngine
+from http_cache import HTTPCache
+from benchmarks.stub_server import StubFloodServer
+
+
+def pull(engine, endpoint):
+    # One page at a time: prefetched pages past the end are cached or not
+    # depending on whether they were cancelled, so repeat pulls could differ
+    return [item for page in engine.iter_pages(endpoint, limit=500, prefetch=1) for item in page]
+
+
+def timed_pull(stub, engine, label):
+    requests_before, not_modified_before = stub.request_count, stub.not_modified_count
+    start = time.perf_counter()
+    stations, floods = pull(engine, "stations"), pull(engine, "floods")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:6.2f}s  {stub.request_count - requests_before:4d} requests "
+          f"({stub.not_modified_count - not_modified_before} x 304)  cache {engine.cache.stats()}")
+    return stations, floods
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=5000)
+    parser.add_argument("--floods", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with StubFloodServer(args.stations, 0, args.floods, latency=args.latency) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        cache = HTTPCache(tmp, ttls={"stations": 3600, "floods": 3600})
+        engine = ExtractionEngine(stub.base_url, rate_limit=0, cache=cache)
+
+        cold = timed_pull(stub, engine, "cold")
+        requests_before = stub.request_count
+        assert timed_pull(stub, engine, "fresh") == cold
+        assert stub.request_count == requests_before, "fresh entries went to the network"
+
+        cache.ttls = {"stations": 0, "floods": 0}
+        not_modified_before = stub.not_modified_count
+        assert timed_pull(stub, engine, "revalidated") == cold
+        assert stub.not_modified_count > not_modified_before, "stale entries were not revalidated"
+
+        stub.datasets["stations"][0]["label"] = "Renamed station"
+        stub.touch("stations")
+        stations, _ = timed_pull(stub, engine, "changed")
+        assert stations[0]["label"] == "Renamed station", "changed data served from cache"
+
+        # Reopen from disk to check the index persists
+        engine.close()
+        reopened = HTTPCache(tmp, ttls={"stations": 3600, "floods": 3600})
+        assert len(reopened.index) == len(cache.index)
+
+    with StubFloodServer(args.stations, 0, args.floods) as stub, tempfile.TemporaryDirectory() as tmp:
+        # Bound the cache at half of what the pull stores, whatever its size
+        unbounded = HTTPCache(f"{tmp}/unbounded")
+        pull(ExtractionEngine(stub.base_url, rate_limit=0, cache=unbounded), "stations")
+        cache = HTTPCache(f"{tmp}/bounded", max_bytes=unbounded.size // 2)
+        engine = ExtractionEngine(stub.base_url, rate_limit=0, cache=cache)
+        pull(engine, "stations")
+        assert cache.size <= cache.max_bytes and cache.evictions > 0, "size bound not enforced"
+        print(f"size bound: {cache.size:,} bytes kept, {cache.evictions} evictions")
+
+    print("http cache: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Run the ingest service against a stub API that keeps publishing readings
+
+A publisher thread adds one new reading per measure every --publish-every
+seconds while the service polls. The script checks every published reading
+reaches the store and the feature parts exactly once, and reports
+publish-to-commit latency and poll fetch times. Run from the repository
+root:
+
+    python -m benchmarks.bench_ingest --stations 2000 --duration 10 --interval 0.5
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from extraction import ExtractionEngine
+from features import IncrementalFeatureStore
+from ingest_service import IngestService
+from readings_store import ReadingsStore
+from storage import ParquetBackend
+from transforms import transform_stations
+from benchmarks.stub_server import StubFloodServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=6.0)
+    parser.add_argument("--interval", type=float, default=0.25, help="readings poll interval")
+    parser.add_argument("--publish-every", type=float, default=1.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with StubFloodServer(args.stations, args.stations, 20) as stub, tempfile.TemporaryDirectory() as tmp:
+        engine = ExtractionEngine(stub.base_url, rate_limit=0)
+        stations_df = transform_stations(stub.datasets["stations"])
+        service = IngestService(
+            engine,
+            ReadingsStore(Path(tmp) / "store"),
+            IncrementalFeatureStore(Path(tmp) / "features", ParquetBackend()),
+            stations_df,
+            floods_path=Path(tmp) / "floods.ndjson",
+            readings_interval=args.interval,
+            floods_interval=args.interval * 4
+        )
+
+        published = []
+        latencies = []
+        commit_readings = service.commit_readings
+
+        def timed_commit(readings):
+            commit_readings(readings)
+            now = time.monotonic()
+            # Latency from the publish that produced the newest reading in the batch
+            newest = max(reading['dateTime'] for reading in readings)
+            for published_at, date_time in published:
+                if date_time == newest:
+                    latencies.append(now - published_at)
+
+        service.commit_readings = timed_commit
+        stop_publishing = threading.Event()
+
+        def publisher():
+            while not stop_publishing.wait(args.publish_every):
+                stub.add_readings(args.stations)
+                published.append((time.monotonic(), stub.datasets["readings"][-1]['dateTime']))
+
+        async def run_for(seconds):
+            task = asyncio.create_task(service.run(install_signal_handlers=False))
+            await asyncio.sleep(seconds)
+            service.stop()
+            await task
+
+        thread = threading.Thread(target=publisher, daemon=True)
+        thread.start()
+        asyncio.run(run_for(args.duration))
+        stop_publishing.set()
+        thread.join()
+
+        # Catch up on anything published after the last poll, then check totals
+        asyncio.run(run_for(args.interval * 2))
+        expected = len(stub.datasets["readings"])
+        stored = len(service.store)
+        featurized = len(service.feature_store.load(columns=['station_id']))
+        assert stored == expected, f"store has {stored} readings, expected {expected}"
+        assert featurized == expected, f"features have {featurized} rows, expected {expected}"
+
+    stats = service.stats()['readings']
+    print(f"{len(published)} publishes of {args.stations} readings; {stats['polls']} polls, "
+          f"{stats['changed']:,} changed of {stats['items']:,} polled")
+    print(f"publish-to-commit latency: p50 {np.percentile(latencies, 50):.2f}s, "
+          f"max {max(latencies):.2f}s (poll interval {args.interval}s)")
+    print(f"fetch: last {stats['last_fetch']:.3f}s, max {stats['max_fetch']:.3f}s; errors {stats['errors']}")
+    print(f"ingest: ok ({stored:,} readings stored and featurized once)")
+
+
+if __name__ == "__main__":
+    main()
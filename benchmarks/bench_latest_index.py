@@ -0,0 +1,107 @@
+"""Query latency and memory of LatestIndex against pandas filtering
+
+Fills the index with synthetic readings, checks its answers against a
+pandas groupby over the same data, then times latest and lookback queries
+in-process and over the HTTP API (missing values are served as null). Run from the repository root:
+
+    python -m benchmarks.bench_latest_index --stations 5000 --readings 500
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from latest_index import LatestIndex, make_index_server
+from benchmarks.bench_window_features import synthetic_series
+
+
+def time_queries(fn, keys, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for key in keys:
+            fn(*key)
+    return (time.perf_counter() - start) / (repeat * len(keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=300, help="readings per series")
+    parser.add_argument("--depth", type=int, default=96)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    df = synthetic_series(args.stations, args.readings).sort_values('datetime', kind='mergesort')
+    index = LatestIndex(args.depth)
+    start = time.perf_counter()
+    for batch in np.array_split(np.arange(len(df)), args.batches):
+        index.update(df.iloc[batch])
+    load_time = time.perf_counter() - start
+
+    # Reference answers from pandas
+    ordered = df.sort_values(['station_id', 'measure_id', 'datetime'])
+    expected_latest = ordered.groupby(['station_id', 'measure_id']).tail(1).set_index(['station_id', 'measure_id'])
+    snapshot = index.snapshot().set_index(['station_id', 'measure_id']).loc[expected_latest.index]
+    assert (snapshot['datetime'].to_numpy() == expected_latest['datetime'].to_numpy()).all()
+    assert np.array_equal(snapshot['value'].to_numpy(), expected_latest['value'].to_numpy())
+    expected_tail = ordered.groupby(['station_id', 'measure_id']).tail(args.depth)
+    for key, group in list(expected_tail.groupby(['station_id', 'measure_id']))[:50]:
+        times, values = index.lookback(*key)
+        assert np.array_equal(values, group['value'].to_numpy()), key
+
+    rng = np.random.default_rng(1)
+    keys = [index.series[i] for i in rng.integers(0, len(index), args.queries)]
+    latest_time = time_queries(lambda station, measure: index.latest(station, measure), keys, repeat=5)
+    lookback_time = time_queries(lambda station, measure: index.lookback(station, measure, 24), keys, repeat=5)
+    pandas_keys = keys[:50]
+    pandas_time = time_queries(
+        lambda station, measure: df[(df['station_id'] == station) & (df['measure_id'] == measure)]
+        .sort_values('datetime').tail(1),
+        pandas_keys
+    )
+
+    server = make_index_server(index, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+
+    def http_latest(station, measure):
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/stations/{station}/latest?measure={measure}") as r:
+            return json.load(r)
+
+    assert http_latest(*keys[0])[keys[0][1]]['value'] == index.latest(*keys[0])[keys[0][1]][1]
+    for bad_n in ("abc", "-1"):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stations/{keys[0][0]}/readings"
+                                   f"?measure={keys[0][1]}&n={bad_n}")
+            raise AssertionError(f"n={bad_n} was accepted")
+        except urllib.error.HTTPError as e:
+            assert e.code == 400, e.code
+    # A missing value is served as null, not as a bare NaN
+    missing = df.iloc[:1].assign(station_id='missing-value', value=np.nan)
+    index.update(missing)
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stations/missing-value/latest") as r:
+        body = json.load(r)
+    assert body[missing['measure_id'].iloc[0]]['value'] is None, body
+    http_time = time_queries(http_latest, keys[:500])
+    server.shutdown()
+    server.server_close()
+
+    print(f"{len(df):,} readings into {len(index):,} series in {load_time:.2f}s "
+          f"({len(df) / load_time:,.0f} rows/s, {args.batches} batches)")
+    print(f"memory: {index.nbytes / 2**20:.1f} MB arrays, {index.nbytes / len(index):,.0f} bytes per series "
+          f"(depth {args.depth}, capacity {len(index.heads):,})")
+    print(f"latest:   {latest_time * 1e6:8.1f} us/query")
+    print(f"lookback: {lookback_time * 1e6:8.1f} us/query (24 readings)")
+    print(f"http:     {http_time * 1e6:8.1f} us/query")
+    print(f"pandas:   {pandas_time * 1e6:8.1f} us/query (filter + sort over {len(df):,} rows)")
+    print("matches pandas latest and lookback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Pipeline metrics and profiling hooks against the stub API
+
+Runs FloodETL.run_pipeline in a scratch directory with no profiler, with
+the sampling profiler and with cProfile, checks the JSON and Prometheus
+metrics agree with what the stub served, and reports the wall time of
+each mode as the instrumentation overhead. Two overlapping stages in
+threads, as run_dag runs them, must both be reported as "concurrent" with
+a peak covering the larger one's allocation. Run from the repository root:
+
+    python -m benchmarks.bench_metrics --readings 100000 --latency 0.005
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from metrics import PipelineMetrics, _reset_peak_rss
+from run_etl import FloodETL
+from benchmarks.stub_server import READING_STEP, StubFloodServer
+
+
+def run(stub, profile):
+    etl = FloodETL(stub.base_url, rate_limit=0, use_cache=False, profile=profile)
+    requests_before, bytes_before = stub.request_count, stub.bytes_sent
+    start = time.perf_counter()
+    etl.run_pipeline()
+    elapsed = time.perf_counter() - start
+
+    with open(etl.metrics_dir / "pipeline_metrics.json") as f:
+        metrics = json.load(f)
+    prometheus = (etl.metrics_dir / "pipeline_metrics.prom").read_text()
+
+    endpoints = metrics['endpoints']
+    pages = sum(e['pages'] for e in endpoints.values())
+    downloaded = sum(e['bytes'] for e in endpoints.values())
+    assert [s['stage'] for s in metrics['stages']] == ["extract", "transform", "create_features"]
+    assert downloaded == stub.bytes_sent - bytes_before, "bytes downloaded differ from bytes served"
+    # Every request is a page; pages past the end of a collection come back empty but are counted
+    assert pages == stub.request_count - requests_before
+    assert all(e['page_latency']['count'] == e['pages'] for e in endpoints.values())
+    assert 'flood_etl_page_latency_seconds_bucket{endpoint="readings",le="+Inf"}' in prometheus
+    if profile:
+        assert all(os.path.getsize(s['profile']) for s in metrics['stages']), "empty profile"
+    return elapsed, metrics
+
+
+def check_concurrent_stages(mb=200):
+    """A stage starting inside another must not reset the other's peak RSS"""
+    metrics = PipelineMetrics()
+    started, allocated = threading.Event(), threading.Event()
+
+    def big():
+        with metrics.stage("big"):
+            started.set()
+            block = np.ones(mb * 2**20 // 8)
+            allocated.set()
+            time.sleep(0.2)
+            del block
+
+    def small():
+        started.wait()
+        with metrics.stage("small"):
+            allocated.wait()
+
+    threads = [threading.Thread(target=big), threading.Thread(target=small)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with metrics.stage("alone"):
+        pass
+
+    stages = {stage['stage']: stage for stage in metrics.stages}
+    assert stages['big']['peak_rss_scope'] == stages['small']['peak_rss_scope'] == "concurrent", stages
+    assert stages['alone']['peak_rss_scope'] == ("stage" if _reset_peak_rss() else "process"), stages
+    baseline = stages['alone']['peak_rss_mb']
+    assert stages['big']['peak_rss_mb'] >= baseline + 0.9 * mb, stages
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--readings", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    steps = -(-args.readings // args.stations)
+    reading_start = int(time.time()) // READING_STEP * READING_STEP - steps * READING_STEP
+    cwd = os.getcwd()
+    with StubFloodServer(args.stations, args.readings, latency=args.latency,
+                         reading_start=reading_start) as stub, tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            timings = {}
+            for profile in (None, "sample", "cprofile"):
+                timings[profile], metrics = run(stub, profile)
+        finally:
+            os.chdir(cwd)
+
+    for stage in metrics['stages']:
+        print(f"{stage['stage']:<16} {stage['seconds']:7.2f}s {stage['rows']:>9,} rows "
+              f"{stage['bytes_downloaded']:>12,} bytes  peak RSS {stage['peak_rss_mb']} MB")
+    readings = metrics['endpoints']['readings']
+    print(f"readings pages: {readings['pages']}, latency p50 <= {readings['page_latency']['p50']}s, "
+          f"p99 <= {readings['page_latency']['p99']}s")
+    stages = check_concurrent_stages()
+    print(f"overlapping stages: peak RSS {stages['big']['peak_rss_mb']} MB (concurrent), "
+          f"then {stages['alone']['peak_rss_mb']} MB for a stage alone ({stages['alone']['peak_rss_scope']})")
+    base = timings[None]
+    for profile, elapsed in timings.items():
+        print(f"{profile or 'metrics only':<13} {elapsed:6.2f}s ({elapsed / base - 1:+.0%} vs metrics only)")
+    print("metrics: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark the out-of-core feature pipeline against the in-memory build
+
+Writes a synthetic processed readings table, runs
+build_features_out_of_core over it in chunks, checks the result matches
+build_features and reports wall time and peak RSS of the parent and the
+worker processes. Run from the repository root:
+
+    python -m benchmarks.bench_out_of_core --rows 2000000 --chunk-rows 250000
+"""
+import argparse
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from features import build_features, build_features_out_of_core
+from storage import ParquetBackend
+from benchmarks.bench_window_features import synthetic_series
+from benchmarks.stub_server import make_station
+from transforms import transform_stations
+
+
+def peak_rss_mb(who):
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--readings", type=int, default=500, help="readings per series")
+    parser.add_argument("--chunk-rows", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--check", action="store_true", help="compare with the in-memory build")
+    args = parser.parse_args()
+
+    readings_df = synthetic_series(args.stations, args.readings)
+    # Match the zero-padded ids of the synthetic stations table
+    readings_df['station_id'] = 'S' + readings_df['station_id'].str[1:].str.zfill(5)
+    stations_df = transform_stations([make_station(i) for i in range(args.stations)])
+    backend = ParquetBackend()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        readings_path = Path(tmp) / "readings.parquet"
+        backend.save(readings_df, readings_path)
+        del readings_df
+        print(f"input: {args.stations * 2 * args.readings:,} readings, chunk_rows={args.chunk_rows:,}")
+
+        start = time.perf_counter()
+        parts = build_features_out_of_core(
+            backend.iter_chunks(readings_path, args.chunk_rows),
+            stations_df,
+            Path(tmp) / "features",
+            chunk_rows=args.chunk_rows,
+            workers=args.workers
+        )
+        elapsed = time.perf_counter() - start
+        rows = sum(n for _, n in parts)
+        print(f"out-of-core: {elapsed:.2f}s, {rows:,} rows in {len(parts)} parts ({rows / elapsed:,.0f} rows/s)")
+        print(f"peak RSS: parent {peak_rss_mb(resource.RUSAGE_SELF):.0f} MB, "
+              f"largest worker {peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB")
+
+        if args.check:
+            out_of_core = pd.concat([backend.load(path) for path, _ in parts], ignore_index=True)
+            in_memory = build_features(backend.load(readings_path), stations_df)
+            key = ['station_id', 'measure_id', 'datetime']
+            left = in_memory.sort_values(key).reset_index(drop=True)
+            right = out_of_core.sort_values(key).reset_index(drop=True)
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, check_categorical=False)
+            print("matches in-memory build_features")
+
+
+if __name__ == "__main__":
+    main()
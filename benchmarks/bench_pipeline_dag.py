@@ -0,0 +1,140 @@
+"""Sequential run_pipeline against the DAG runner, including skipped reruns
+
+Against the stub API, times FloodETL.run_pipeline and then FloodETL.run_dag
+in fresh directories and checks both produce the same tables. The DAG is
+then rerun with no upstream change (only the API pulls should run) and
+after new readings are published (only the readings branch should rerun).
+Each run that rebuilds features must ``dvc add`` data/features, and the
+unchanged rerun must not; without dvc installed, a stand-in that records
+its calls and writes the .dvc file is put on PATH. Run from the
+repository root:
+
+    python -m benchmarks.bench_pipeline_dag --readings 100000 --latency 0.02
+"""
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from run_etl import FloodETL
+from benchmarks.stub_server import READING_STEP, StubFloodServer
+
+# Extraction timestamps differ between runs
+STAMP_COLUMNS = ['extracted_at', 'last_updated']
+
+
+# Records "dvc <args>" to $DVC_CALLS and writes the .dvc file of "dvc add <path>"
+DVC_STAND_IN = """\
+import os, sys
+with open(os.environ["DVC_CALLS"], "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+if sys.argv[1:2] == ["add"]:
+    path = sys.argv[2].rstrip("/")
+    with open(path + ".dvc", "w") as f:
+        f.write("outs:\\n- path: " + os.path.basename(path) + "\\n")
+"""
+
+
+def setup_dvc(directory, calls_path):
+    """Make ``directory`` a DVC repo, or put a recording dvc stand-in on PATH"""
+    if shutil.which("dvc") is not None:
+        subprocess.run(["dvc", "init", "--no-scm", "-q"], cwd=directory, check=True)
+        return "dvc"
+    bin_dir = Path(directory, ".bin")
+    bin_dir.mkdir()
+    script = bin_dir / "dvc"
+    script.write_text(f"#!{sys.executable}\n" + DVC_STAND_IN)
+    script.chmod(0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    os.environ["DVC_CALLS"] = str(calls_path)
+    Path(calls_path).touch()
+    return "stand-in"
+
+
+def dvc_refreshed(calls_path, dvc_file, before):
+    """Whether data/features was dvc-added since ``before`` (call count or .dvc mtime)"""
+    if calls_path.exists():
+        calls = calls_path.read_text().splitlines()
+        return calls[before:] == ["add data/features"], len(calls)
+    mtime = dvc_file.stat().st_mtime_ns if dvc_file.exists() else 0
+    return mtime != before, mtime
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--readings", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # End the readings a day ago so newly published ones still fall before the enddate
+    steps = -(-args.readings // args.stations)
+    reading_start = int(time.time()) // READING_STEP * READING_STEP - steps * READING_STEP - 86400
+    cwd = os.getcwd()
+
+    with StubFloodServer(args.stations, args.readings, latency=args.latency,
+                         reading_start=reading_start) as stub, tempfile.TemporaryDirectory() as tmp:
+        try:
+            Path(tmp, "sequential").mkdir()
+            os.chdir(Path(tmp, "sequential"))
+            etl = FloodETL(stub.base_url, max_workers=args.workers, rate_limit=0, use_cache=False)
+            _, sequential_time = timed(etl.run_pipeline)
+            expected = {name: pd.read_csv(etl.processed_dir / f"{name}.csv").drop(columns=STAMP_COLUMNS, errors='ignore')
+                        for name in ("stations", "readings", "floods")}
+            expected_features = len(pd.read_csv(etl.features_dir / "features.csv"))
+
+            Path(tmp, "dag").mkdir()
+            os.chdir(Path(tmp, "dag"))
+            calls_path = Path(tmp, "dvc_calls.txt")
+            dvc = setup_dvc(Path(tmp, "dag"), calls_path)
+            dvc_file = Path("data/features.dvc")
+            etl = FloodETL(stub.base_url, max_workers=args.workers, rate_limit=0, use_cache=False)
+            status, dag_time = timed(lambda: etl.run_dag(max_workers=args.workers))
+            assert set(status.values()) == {"ran"}, status
+            for name, df in expected.items():
+                got = pd.read_csv(etl.processed_dir / f"{name}.csv").drop(columns=STAMP_COLUMNS, errors='ignore')
+                pd.testing.assert_frame_equal(got, df, check_like=True)
+            assert len(pd.read_csv(etl.features_dir / "features.csv")) == expected_features
+            refreshed, mark = dvc_refreshed(calls_path, dvc_file, 0)
+            assert refreshed and dvc_file.exists(), "first run did not dvc add data/features"
+
+            status, unchanged_time = timed(lambda: etl.run_dag(max_workers=args.workers))
+            skipped = sorted(name for name, result in status.items() if result == "skipped")
+            assert skipped == ["create_features", "transform_floods", "transform_readings", "transform_stations"], status
+            refreshed, mark = dvc_refreshed(calls_path, dvc_file, mark)
+            assert not refreshed, "unchanged features were dvc-added again"
+
+            stub.add_readings(args.stations * 4)
+            status, changed_time = timed(lambda: etl.run_dag(max_workers=args.workers))
+            rerun = sorted(name for name, result in status.items() if result == "ran" and name.startswith(("t", "c")))
+            assert rerun == ["create_features", "transform_readings"], status
+            refreshed, mark = dvc_refreshed(calls_path, dvc_file, mark)
+            assert refreshed, "rebuilt features were not dvc-added"
+        finally:
+            os.chdir(cwd)
+
+    print(f"sequential run_pipeline:   {sequential_time:6.2f}s")
+    print(f"DAG, first run:            {dag_time:6.2f}s ({sequential_time / dag_time:.2f}x)")
+    print(f"DAG, nothing changed:      {unchanged_time:6.2f}s (pulls only, 4 tasks skipped)")
+    print(f"DAG, new readings:         {changed_time:6.2f}s (transform_readings and create_features rerun)")
+    print(f"DVC ({dvc}): data/features.dvc created on the first run, refreshed after new readings only")
+    print("pipeline dag: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Bytes per reading as a list of dicts against a ReadingBatch
+
+Spools synthetic readings to NDJSON as extraction does, then loads them
+as ``list(NDJSONDataset)`` (what full_load used to hold) and as
+``ReadingBatch.from_records``, measuring the memory each holds with
+tracemalloc (which also slows both builds). Checks that the batch
+transforms to the same table (also when optional fields are missing), converts to and from DataFrames without
+copying its arrays, and commits the same records to a ReadingsStore. Run
+from the repository root:
+
+    python -m benchmarks.bench_reading_batch --readings 500000
+"""
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from reading_batch import ReadingBatch
+from readings_store import ReadingsStore
+from streaming import NDJSONDataset, NDJSONPageWriter
+from transforms import transform_readings
+from benchmarks.stub_server import make_reading
+
+EXTRACTED_AT = datetime(2024, 1, 1)
+
+
+def measured(build):
+    """(result, bytes still allocated by ``build``, seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=500_000)
+    parser.add_argument("--stations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = Path(tmp) / "readings.ndjson"
+        with NDJSONPageWriter(spool) as writer:
+            for start in range(0, args.readings, 100_000):
+                stop = min(args.readings, start + 100_000)
+                writer.write_page([make_reading(i, args.stations) for i in range(start, stop)])
+
+        records, list_bytes, list_time = measured(lambda: list(NDJSONDataset(spool)))
+        batch, batch_bytes, batch_time = measured(lambda: ReadingBatch.from_records(NDJSONDataset(spool)))
+        float32, float32_bytes, _ = measured(
+            lambda: ReadingBatch.from_records(NDJSONDataset(spool), value_dtype=np.float32))
+        n = args.readings
+        print(f"list of dicts: {list_bytes / n:6.0f} B/reading ({list_bytes / 1e6:7.1f} MB), built in {list_time:.2f}s")
+        print(f"ReadingBatch:  {batch_bytes / n:6.1f} B/reading ({batch_bytes / 1e6:7.1f} MB), built in {batch_time:.2f}s"
+              f" ({list_bytes / batch_bytes:.0f}x smaller)")
+        print(f"  float32:     {float32_bytes / n:6.1f} B/reading")
+
+        # Same processed table from either form
+        start = time.perf_counter()
+        expected = transform_readings(records, EXTRACTED_AT)
+        records_time = time.perf_counter() - start
+        start = time.perf_counter()
+        transformed = transform_readings(batch, EXTRACTED_AT)
+        batch_time = time.perf_counter() - start
+        pd.testing.assert_frame_equal(transformed, expected)
+        print(f"transform_readings: same table, {records_time:.2f}s from dicts, {batch_time:.2f}s from the batch")
+        assert batch.to_records() == records
+
+        # Missing optional fields stay NaN with the records path's dtypes
+        sparse = [make_reading(i, args.stations) for i in range(10)]
+        for i, record in enumerate(sparse):
+            del record['parameter']
+            if i % 3 == 0:
+                del record['qualifier']
+        pd.testing.assert_frame_equal(transform_readings(ReadingBatch.from_records(sparse), EXTRACTED_AT),
+                                      transform_readings(sparse, EXTRACTED_AT))
+        print("transform_readings: same table with missing parameter and qualifier")
+
+        # DataFrame round trip shares the arrays
+        frame = batch.to_frame()
+        assert np.shares_memory(frame['value'].to_numpy(), batch.values)
+        for column, name in (('station_id', 'station'), ('measure_id', 'measure'), ('unit', 'unit')):
+            assert np.shares_memory(frame[column].array.codes, getattr(batch, name).codes), column
+        back = ReadingBatch.from_frame(frame)
+        assert np.shares_memory(back.times, frame['datetime'].array.asi8)
+        assert np.shares_memory(back.values, batch.values)
+        assert back.to_records() == records
+        print("to_frame/from_frame: zero-copy")
+
+        # The batch stands in for the list when committing to the store
+        store_list = ReadingsStore(Path(tmp) / "store_list")
+        store_batch = ReadingsStore(Path(tmp) / "store_batch")
+        assert store_list.append(records) == store_batch.append(batch) == n
+        assert list(store_list.iter_records()) == list(store_batch.iter_records())
+        print("ReadingsStore.append: same records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Throughput and batch latency of the anomaly scoring engine
+
+Builds features for synthetic series, trains AnomalyModel, checks that the
+process-pool scorer returns exactly the in-process scores (and nothing
+for no rows), and reports rows/s for serial and parallel scoring plus
+latency per batch size. Run from the repository root:
+
+    python -m benchmarks.bench_scoring --stations 500 --readings 2000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from features import build_features
+from train_model import AnomalyModel, score_parallel
+from transforms import transform_stations
+from benchmarks.bench_window_features import synthetic_series
+from benchmarks.stub_server import make_station
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=1500, help="readings per series")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pooled", action="store_true", help="one pooled model instead of one per station")
+    args = parser.parse_args()
+
+    readings_df = synthetic_series(args.stations, args.readings)
+    readings_df['station_id'] = 'S' + readings_df['station_id'].str[1:].str.zfill(5)
+    stations_df = transform_stations([make_station(i) for i in range(args.stations)])
+    features_df = build_features(readings_df, stations_df).reset_index(drop=True)
+    print(f"{len(features_df):,} feature rows across {args.stations} stations")
+
+    start = time.perf_counter()
+    model = AnomalyModel(per_station=not args.pooled).fit(features_df)
+    print(f"fit: {time.perf_counter() - start:.2f}s ({len(model.models) - 1} station models)")
+
+    start = time.perf_counter()
+    serial = model.score(features_df)
+    serial_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = model.save(Path(tmp) / "model.joblib")
+        start = time.perf_counter()
+        parallel = score_parallel(path, features_df, workers=args.workers)
+        parallel_time = time.perf_counter() - start
+        assert len(score_parallel(path, features_df.iloc[:0], workers=args.workers)) == 0
+
+    assert np.array_equal(serial, parallel), "parallel scores differ from in-process scores"
+    print(f"serial:   {serial_time:.2f}s ({len(features_df) / serial_time:,.0f} rows/s)")
+    print(f"parallel: {parallel_time:.2f}s ({len(features_df) / parallel_time:,.0f} rows/s, "
+          f"{args.workers} workers on {os.cpu_count()} CPUs, including pool start-up)")
+    print(f"anomaly rate: {(serial < 0).mean():.2%}")
+
+    rng = np.random.default_rng(0)
+    for batch_rows in (100, 1_000, 10_000, 100_000):
+        if batch_rows > len(features_df):
+            break
+        latencies = []
+        for _ in range(5):
+            batch = features_df.iloc[np.sort(rng.choice(len(features_df), batch_rows, replace=False))]
+            start = time.perf_counter()
+            model.score(batch)
+            latencies.append(time.perf_counter() - start)
+        print(f"batch {batch_rows:>7,}: {np.median(latencies) * 1e3:8.1f} ms median "
+              f"({batch_rows / np.median(latencies):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
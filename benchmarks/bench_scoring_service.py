@@ -0,0 +1,75 @@
+"""Request latency of the online scoring service under concurrent clients
+
+Trains AnomalyModel on synthetic features, saves per-station model files
+and replays small requests from concurrent client threads against
+ScoringService, with and without micro-batching. Checks the service's
+scores equal AnomalyModel.score and reports p50/p99 request latency,
+throughput and model cache behaviour. Run from the repository root:
+
+    python -m benchmarks.bench_scoring_service --stations 300 --clients 16 --max-models 64
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from features import build_features
+from scoring_service import ScoringService
+from train_model import AnomalyModel
+from transforms import transform_stations
+from benchmarks.bench_window_features import synthetic_series
+from benchmarks.stub_server import make_station
+
+
+def replay(service, requests, clients):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(service.score, requests))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=600, help="readings per series")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=4, help="feature rows per request")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--max-models", type=int, default=64)
+    args = parser.parse_args()
+
+    readings_df = synthetic_series(args.stations, args.readings)
+    readings_df['station_id'] = 'S' + readings_df['station_id'].str[1:].str.zfill(5)
+    stations_df = transform_stations([make_station(i) for i in range(args.stations)])
+    features_df = build_features(readings_df, stations_df).reset_index(drop=True)
+    model = AnomalyModel().fit(features_df)
+    print(f"{len(features_df):,} feature rows, {len(model.models) - 1} station models")
+
+    # Each request carries a few consecutive rows of one station, like a poller update
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, len(features_df) - args.rows, args.requests)
+    requests = [features_df.iloc[s:s + args.rows] for s in starts]
+    expected = [-model.score(request) for request in requests]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model.save_station_models(tmp)
+        for label, max_wait_ms in (("unbatched", 0.0), ("micro-batched", 5.0)):
+            service = ScoringService(tmp, max_models=args.max_models, max_wait_ms=max_wait_ms)
+            try:
+                replay(service, requests[:args.clients], args.clients)  # warm up
+                service.latencies.clear()
+                results, elapsed = replay(service, requests, args.clients)
+                for got, want in zip(results, expected):
+                    assert np.allclose(got, want), "service scores differ from AnomalyModel.score"
+                stats = service.stats()
+            finally:
+                service.close()
+            print(f"{label:>13}: p50 {stats['p50_ms']:6.2f} ms, p99 {stats['p99_ms']:6.2f} ms, "
+                  f"{args.requests / elapsed:,.0f} req/s, {stats['mean_batch_rows']:.1f} rows/batch, "
+                  f"models {stats['models']}")
+
+
+if __name__ == "__main__":
+    main()
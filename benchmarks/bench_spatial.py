@@ -0,0 +1,97 @@
+"""Check the station spatial index against brute force and time its queries
+
+Scatters stations and flood areas over a UK-sized box, compares k-nearest,
+radius, bounding-box and neighbour results with an exhaustive haversine
+scan, and reports per-query latency. Run from the repository root:
+
+    python -m benchmarks.bench_spatial --stations 10000 --areas 5000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from spatial import EARTH_RADIUS_KM, StationIndex
+
+
+def haversine_km(lat, long, lats, longs):
+    lat, long, lats, longs = map(np.radians, (lat, long, lats, longs))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((longs - long) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def per_query(fn, points):
+    start = time.perf_counter()
+    for lat, long in points:
+        fn(lat, long)
+    return (time.perf_counter() - start) / len(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=5000)
+    parser.add_argument("--areas", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    stations_df = pd.DataFrame({
+        'station_id': [f"S{i:05d}" for i in range(args.stations)],
+        'lat': rng.uniform(50.0, 55.8, args.stations),
+        'long': rng.uniform(-5.7, 1.7, args.stations),
+        'river_name': rng.choice([f"River {i}" for i in range(200)], args.stations),
+    })
+    areas_df = pd.DataFrame({
+        'area_id': [f"A{i:05d}" for i in range(args.areas)],
+        'lat': rng.uniform(50.0, 55.8, args.areas),
+        'long': rng.uniform(-5.7, 1.7, args.areas),
+    })
+
+    start = time.perf_counter()
+    index = StationIndex(stations_df)
+    build_time = time.perf_counter() - start
+
+    points = np.column_stack([rng.uniform(50.5, 55.0, args.queries), rng.uniform(-5.0, 1.0, args.queries)])
+    lats, longs = stations_df['lat'].to_numpy(), stations_df['long'].to_numpy()
+    ids = stations_df['station_id'].to_numpy()
+    for lat, long in points[:100]:
+        distances = haversine_km(lat, long, lats, longs)
+        found, found_km = index.nearest(lat, long, k=5)
+        assert np.allclose(found_km, np.sort(distances)[:5])
+        found, _ = index.within(lat, long, 20.0)
+        assert set(found) == set(ids[distances <= 20.0])
+        box = (lat - 0.2, long - 0.3, lat + 0.2, long + 0.3)
+        expected = ids[(lats >= box[0]) & (lats <= box[2]) & (longs >= box[1]) & (longs <= box[3])]
+        assert set(index.bbox(*box)) == set(expected)
+
+    start = time.perf_counter()
+    neighbours = index.neighbours(k=5)
+    neighbour_time = time.perf_counter() - start
+    for station in rng.choice(args.stations, 50, replace=False):
+        distances = haversine_km(lats[station], longs[station], lats, longs)
+        distances[station] = np.inf
+        mine = neighbours[neighbours['station_id'] == ids[station]]['distance_km'].to_numpy()
+        assert np.allclose(mine, np.sort(distances)[:5])
+
+    start = time.perf_counter()
+    station_areas = index.flood_areas(areas_df, k=3, max_km=10.0)
+    areas_time = time.perf_counter() - start
+
+    nearest_time = per_query(lambda lat, long: index.nearest(lat, long, 5), points)
+    radius_time = per_query(lambda lat, long: index.within(lat, long, 10.0), points)
+    bbox_time = per_query(lambda lat, long: index.bbox(lat - 0.1, long - 0.15, lat + 0.1, long + 0.15), points)
+    scan_time = per_query(lambda lat, long: np.argsort(haversine_km(lat, long, lats, longs))[:5], points[:200])
+
+    print(f"index over {len(index):,} stations built in {build_time * 1e3:.1f} ms")
+    print(f"k-nearest (5):  {nearest_time * 1e6:7.1f} us/query")
+    print(f"radius (10 km): {radius_time * 1e6:7.1f} us/query")
+    print(f"bounding box:   {bbox_time * 1e6:7.1f} us/query")
+    print(f"linear scan:    {scan_time * 1e6:7.1f} us/query (k-nearest by brute force)")
+    print(f"neighbours (k=5) for all stations: {neighbour_time * 1e3:.1f} ms, {len(neighbours):,} pairs")
+    print(f"station -> flood area (k=3, 10 km): {areas_time * 1e3:.1f} ms, {len(station_areas):,} pairs")
+    print("matches brute force")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare on-disk size and load time of the storage backends
+
+Builds a synthetic processed readings table and raw readings records, then
+writes and reads them through each backend in ``storage.py``. Run from the
+repository root:
+
+    python -m benchmarks.bench_storage --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage import RAW_BACKENDS, TABLE_BACKENDS
+from benchmarks.stub_server import make_reading
+
+
+def synthetic_readings(n_rows, n_stations=1000):
+    """Processed readings table shaped like FloodETL._transform_readings output"""
+    rng = np.random.default_rng(0)
+    station_idx = np.arange(n_rows) % n_stations
+    times = pd.Timestamp("2025-01-01", tz="UTC") + pd.to_timedelta((np.arange(n_rows) // n_stations) * 15, unit="min")
+    station_ids = np.array([f"S{i:05d}" for i in range(n_stations)], dtype=object)[station_idx]
+    return pd.DataFrame({
+        'reading_id': [f"{s}-level-stage-i-15_min-m" for s in station_ids],
+        'station_id': station_ids,
+        'datetime': times,
+        'value': rng.normal(1.0, 0.3, n_rows).round(3),
+        'unit': np.where(station_idx % 10 == 0, "mAOD", "m"),
+        'parameter': np.where(station_idx % 7 == 0, "flow", "level"),
+        'qualifier': np.where(station_idx % 3 == 0, "Downstream Stage", "Stage"),
+        'extracted_at': pd.Timestamp.now(tz="UTC"),
+    })
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--raw-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    df = synthetic_readings(args.rows)
+    subset = ['station_id', 'datetime', 'value']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"processed readings: {args.rows} rows")
+        print(f"{'backend':<10}{'size MB':>10}{'write s':>10}{'load s':>10}{'3 cols s':>10}")
+        for name, backend_cls in TABLE_BACKENDS.items():
+            backend = backend_cls()
+            path = os.path.join(tmp, f"readings{backend.extension}")
+            _, write_time = timed(backend.save, df, path)
+            loaded, load_time = timed(backend.load, path)
+            _, subset_time = timed(backend.load, path, columns=subset)
+            size_mb = os.path.getsize(path) / 1e6
+            print(f"{name:<10}{size_mb:>10.1f}{write_time:>10.2f}{load_time:>10.2f}{subset_time:>10.2f}")
+
+            # CSV loses the datetime dtype; Parquet must keep it
+            if name == "parquet":
+                assert isinstance(loaded['datetime'].dtype, pd.DatetimeTZDtype)
+                assert isinstance(loaded['station_id'].dtype, pd.CategoricalDtype)
+
+        records = [make_reading(i) for i in range(args.raw_rows)]
+        print(f"\nraw readings: {args.raw_rows} records")
+        print(f"{'backend':<10}{'size MB':>10}{'write s':>10}{'load s':>10}")
+        for name, backend_cls in RAW_BACKENDS.items():
+            backend = backend_cls()
+            path = os.path.join(tmp, f"readings{backend.extension}")
+            _, write_time = timed(backend.save, records, path)
+            _, load_time = timed(backend.load, path)
+            size_mb = os.path.getsize(path) / 1e6
+            print(f"{name:<10}{size_mb:>10.1f}{write_time:>10.2f}{load_time:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
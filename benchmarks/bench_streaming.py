@@ -0,0 +1,56 @@
+"""Compare peak RSS of streamed vs in-memory readings extraction
+
+Each mode runs in a fresh subprocess so ``ru_maxrss`` is not shared.
+Run from the repository root:
+
+    python -m benchmarks.bench_streaming --readings 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+
+def run_mode(mode, n_readings):
+    from benchmarks.stub_server import StubFloodServer
+    from full_load import FloodDataExtractor
+
+    with StubFloodServer(n_stations=100, n_readings=n_readings) as stub:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            extractor = FloodDataExtractor(stub.base_url, rate_limit=0)
+            with contextlib.redirect_stdout(io.StringIO()):
+                if mode == "stream":
+                    count = len(extractor.stream_historical_readings())
+                else:
+                    count = len(extractor.extract_historical_readings())
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:>6}: {count} readings, peak RSS {peak_mb:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--mode", choices=["stream", "list"])
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.readings)
+        return
+
+    # The stub server holds the synthetic dataset in-process, so compare the
+    # difference between modes rather than absolute numbers
+    for mode in ("stream", "list"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_streaming", "--mode", mode, "--readings", str(args.readings)],
+            check=True
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Parity check and rows-per-second benchmark for the vectorized transforms
+
+The legacy per-record loops from FloodETL are kept here as the reference.
+The script fails if the vectorized output differs from the reference on
+anything other than the documented datetime parsing and the added
+measure_id column. Run from the repository root:
+
+    python -m benchmarks.bench_transform --rows 500000
+"""
+import argparse
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from transforms import transform_floods, transform_readings, transform_stations
+from benchmarks.stub_server import make_flood, make_reading, make_station
+
+
+def legacy_transform_stations(raw_stations):
+    transformed = []
+    for station in raw_stations:
+        transformed.append({
+            'station_id': station.get('@id', '').split('/')[-1],
+            'label': station.get('label'),
+            'river_name': station.get('riverName'),
+            'town': station.get('town'),
+            'lat': station.get('lat'),
+            'long': station.get('long'),
+            'status': station.get('status'),
+            'last_updated': datetime.now()
+        })
+    return pd.DataFrame(transformed)
+
+
+def legacy_transform_readings(raw_readings):
+    transformed = []
+    for reading in raw_readings:
+        transformed.append({
+            'reading_id': reading.get('@id', '').split('/')[-1],
+            'station_id': reading.get('station', '').split('/')[-1],
+            'datetime': reading.get('dateTime'),
+            'value': reading.get('value'),
+            'unit': reading.get('unit'),
+            'parameter': reading.get('parameter'),
+            'qualifier': reading.get('qualifier'),
+            'extracted_at': datetime.now()
+        })
+    return pd.DataFrame(transformed)
+
+
+def legacy_transform_floods(raw_floods):
+    transformed = []
+    for flood in raw_floods:
+        transformed.append({
+            'flood_id': flood.get('@id', '').split('/')[-1],
+            'severity': flood.get('severity'),
+            'description': flood.get('description'),
+            'is_active': flood.get('isActive', False),
+            'area_name': flood.get('floodArea', {}).get('name'),
+            'time_changed': flood.get('timeMessageChanged'),
+            'extracted_at': datetime.now()
+        })
+    return pd.DataFrame(transformed)
+
+
+def assert_parity(name, legacy, vectorized, stamp_column, parsed_columns=(), added_columns=()):
+    """Same columns in the same order and the same values, ignoring timestamps"""
+    vectorized = vectorized.drop(columns=list(added_columns))
+    assert list(legacy.columns) == list(vectorized.columns), f"{name}: column mismatch"
+    assert len(legacy) == len(vectorized), f"{name}: row count mismatch"
+    assert vectorized[stamp_column].nunique() == 1, f"{name}: more than one extraction timestamp"
+
+    for column in parsed_columns:
+        expected = pd.to_datetime(legacy[column], utc=True, format='ISO8601')
+        pd.testing.assert_series_equal(expected, vectorized[column], check_names=False)
+
+    skip = {stamp_column, *parsed_columns}
+    compare = [c for c in legacy.columns if c not in skip]
+    pd.testing.assert_frame_equal(
+        legacy[compare].astype(object).where(legacy[compare].notna(), None),
+        vectorized[compare].astype(object).where(vectorized[compare].notna(), None),
+        check_dtype=False
+    )
+
+
+def edge_case_records():
+    """Records with missing keys and nested gaps the transforms must tolerate"""
+    stations = [make_station(0), {'label': 'no id'}, {'@id': 'x/y/Z1', 'lat': 51.0}]
+    readings = [make_reading(0), {'@id': 'r/1', 'dateTime': '2025-10-02T17:00:00Z', 'value': 1.5}]
+    floods = [make_flood(0), {'@id': 'f/1', 'isActive': True, 'floodArea': {'name': 'Area'}}, {'@id': 'f/2'}]
+    return stations, readings, floods
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    # Parity on edge cases first, then on the benchmark data
+    stations, readings, floods = edge_case_records()
+    assert_parity("stations", legacy_transform_stations(stations), transform_stations(stations), 'last_updated')
+    assert_parity("readings", legacy_transform_readings(readings), transform_readings(readings), 'extracted_at', ['datetime'], ['measure_id'])
+    assert_parity("floods", legacy_transform_floods(floods), transform_floods(floods), 'extracted_at', (), ['area_id', 'time_raised'])
+
+    raw_readings = [make_reading(i) for i in range(args.rows)]
+
+    start = time.perf_counter()
+    legacy = legacy_transform_readings(raw_readings)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = transform_readings(raw_readings)
+    vectorized_time = time.perf_counter() - start
+
+    assert_parity("readings", legacy, vectorized, 'extracted_at', ['datetime'], ['measure_id'])
+
+    print(f"parity: ok ({args.rows} readings)")
+    print(f"legacy:     {legacy_time:.2f}s  ({args.rows / legacy_time:,.0f} rows/s)")
+    print(f"vectorized: {vectorized_time:.2f}s  ({args.rows / vectorized_time:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Flood warning pre-event windows: interval index against a cross join
+
+Builds synthetic 15-minute readings for a set of stations, links each
+flood area to a few stations and raises warnings at random times. A
+subset of warnings is aggregated both by joining warnings x stations x
+readings and filtering on time (the naive way) and with
+aggregate_warnings; the results must match. The full warning history is
+then aggregated in this process and across a process pool. Run from the
+repository root:
+
+    python -m benchmarks.bench_warning_aggregation --warnings 50000 --workers 8
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from warning_aggregation import DEFAULT_WINDOWS, STATISTICS, aggregate_warnings, warning_events
+
+START = pd.Timestamp("2024-01-01", tz="UTC")
+STEP = pd.Timedelta(minutes=15)
+
+
+def make_readings(stations, days, seed=0):
+    """Processed-style readings: a level series per station and rainfall at every fifth"""
+    rng = np.random.default_rng(seed)
+    steps = days * 96
+    times = START + STEP * np.arange(steps)
+    frames = []
+    for parameter, measure_suffix, station_step in (("level", "level-stage-i-15_min-m", 1),
+                                                    ("rainfall", "rainfall-t-15_min-mm", 5)):
+        station_ids = [f"S{i:05d}" for i in range(0, stations, station_step)]
+        n = len(station_ids)
+        phase = rng.uniform(0, 2 * np.pi, n)
+        level = 1.0 + 0.5 * np.sin(np.arange(steps)[None, :] / 96 * 2 * np.pi / 7 + phase[:, None])
+        values = level + rng.normal(0, 0.02, (n, steps))
+        # A few gaps, as real series have
+        values[rng.random((n, steps)) < 0.01] = np.nan
+        frames.append(pd.DataFrame({
+            'station_id': np.repeat(station_ids, steps),
+            'measure_id': np.repeat([f"{s}-{measure_suffix}" for s in station_ids], steps),
+            'datetime': np.tile(times, n),
+            'value': values.ravel(),
+            'parameter': parameter,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_station_areas(stations, areas, per_area=3, seed=1):
+    rng = np.random.default_rng(seed)
+    station_ids = np.concatenate([rng.choice(stations, per_area, replace=False) for _ in range(areas)])
+    return pd.DataFrame({
+        'area_id': np.repeat([f"A{j:05d}" for j in range(areas)], per_area),
+        'station_id': [f"S{i:05d}" for i in station_ids],
+        'rank': np.tile(np.arange(1, per_area + 1), areas),
+        'distance_km': rng.uniform(0, 10, areas * per_area).round(3),
+    })
+
+
+def make_floods(warnings, areas, days, seed=2):
+    """Processed-style flood warnings raised at random times over the readings' range"""
+    rng = np.random.default_rng(seed)
+    raised = START + pd.to_timedelta(rng.integers(0, days * 86400, warnings), unit='s')
+    return pd.DataFrame({
+        'flood_id': [f"F{i:06d}" for i in range(warnings)],
+        'severity': rng.choice(["Flood alert", "Flood warning", "Severe flood warning"], warnings),
+        'area_id': [f"A{j:05d}" for j in rng.integers(0, areas, warnings)],
+        'time_raised': raised.strftime('%Y-%m-%dT%H:%M:%S'),
+        'time_changed': raised.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+
+
+def cross_join(floods_df, station_areas_df, readings_df, windows=DEFAULT_WINDOWS):
+    """The naive join: every reading of every linked station, then a time filter"""
+    events = warning_events(floods_df)
+    pairs = events.merge(station_areas_df[['area_id', 'station_id', 'distance_km']], on='area_id')
+    joined = pairs.merge(readings_df, on='station_id')
+    key = ['flood_id', 'event_time', 'station_id', 'measure_id']
+    result = None
+    for name in windows:
+        inside = joined[(joined['datetime'] >= joined['event_time'] - pd.Timedelta(name))
+                        & (joined['datetime'] < joined['event_time'])].sort_values(key + ['datetime'])
+        grouped = inside.groupby(key)['value']
+        stats = pd.DataFrame({
+            f'value_count_{name}': grouped.count(),
+            f'value_mean_{name}': grouped.mean(),
+            f'value_std_{name}': grouped.std(),
+            f'value_min_{name}': grouped.min(),
+            f'value_max_{name}': grouped.max(),
+            f'value_change_{name}': grouped.last() - grouped.first(),
+        })
+        result = stats if result is None else result.join(stats, how='outer')
+    return result
+
+
+def compare(expected, actual, windows=DEFAULT_WINDOWS):
+    key = ['flood_id', 'event_time', 'station_id', 'measure_id']
+    columns = [f'value_{statistic}_{name}' for name in windows for statistic in STATISTICS]
+    actual = actual.set_index(key)[columns]
+    # Series with no readings in any window are missing from the join; the index keeps them, as count 0
+    expected = expected.reindex(actual.index)[columns]
+    counts = [f'value_count_{name}' for name in windows]
+    expected[counts] = expected[counts].fillna(0)
+    # groupby first/last skip NaN; the index takes the values at the window edges
+    for name in windows:
+        column = f'value_change_{name}'
+        expected.loc[actual[column].isna().to_numpy(), column] = np.nan
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-7, atol=1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--areas", type=int, default=2000)
+    parser.add_argument("--warnings", type=int, default=50_000)
+    parser.add_argument("--check-warnings", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    readings = make_readings(args.stations, args.days)
+    station_areas = make_station_areas(args.stations, args.areas)
+    floods = make_floods(args.warnings, args.areas, args.days)
+    print(f"{len(readings):,} readings, {args.warnings:,} warnings over {args.days} days, "
+          f"{len(station_areas):,} station-area links")
+
+    subset = floods.iloc[:args.check_warnings]
+    start = time.perf_counter()
+    expected = cross_join(subset, station_areas, readings)
+    join_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = aggregate_warnings(subset, station_areas, readings, workers=1)
+    index_time = time.perf_counter() - start
+    compare(expected, actual)
+    print(f"{args.check_warnings} warnings: cross join {join_time:.2f}s, interval index {index_time:.2f}s "
+          f"(including indexing the readings); same statistics")
+
+    start = time.perf_counter()
+    serial = aggregate_warnings(floods, station_areas, readings, workers=1)
+    serial_time = time.perf_counter() - start
+    start = time.perf_counter()
+    parallel = aggregate_warnings(floods, station_areas, readings, workers=args.workers)
+    parallel_time = time.perf_counter() - start
+    pd.testing.assert_frame_equal(serial, parallel)
+    print(f"all {args.warnings:,} warnings ({len(serial):,} rows): 1 process {serial_time:.2f}s, "
+          f"{args.workers} processes {parallel_time:.2f}s ({serial_time / parallel_time:.1f}x)")
+    print(f"cross join estimate for all warnings: {join_time * args.warnings / args.check_warnings:,.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import calendar
+import hashlib
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_ROOT = "http://environment.data.gov.uk/flood-monitoring/id"
+
+
+def make_station(i):
+    """Build a synthetic station record shaped like the real API"""
+    station_id = f"S{i:05d}"
+    return {
+        "@id": f"{API_ROOT}/stations/{station_id}",
+        "label": f"Station {i}",
+        "riverName": f"River {i % 97}",
+        "town": f"Town {i % 311}",
+        "lat": 50.0 + (i % 500) * 0.01,
+        "long": -5.0 + (i // 500) * 0.01,
+        "status": "http://environment.data.gov.uk/flood-monitoring/def/core/statusActive",
+        "stationReference": station_id,
+    }
+
+
+READING_START = 1700000000
+READING_STEP = 900
+
+
+def make_reading(i, n_stations=100, start=READING_START):
+    """Build a synthetic 15-minute reading record"""
+    station_id = f"S{i % n_stations:05d}"
+    step = i // n_stations
+    ts = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start + step * READING_STEP))
+    measure = f"{API_ROOT}/measures/{station_id}-level-stage-i-15_min-m"
+    return {
+        "@id": f"http://environment.data.gov.uk/flood-monitoring/data/readings/{station_id}-level-stage-i-15_min-m/{ts}",
+        "dateTime": ts,
+        "measure": measure,
+        "station": f"{API_ROOT}/stations/{station_id}",
+        "value": round(0.5 + (i % 37) * 0.01, 3),
+        "unit": "m",
+        "parameter": "level",
+        "qualifier": "Stage",
+    }
+
+
+def make_flood(i):
+    """Build a synthetic flood warning record"""
+    area_id = f"A{i:05d}"
+    return {
+        "@id": f"{API_ROOT}/floods/{area_id}",
+        "description": f"Flood area {i}",
+        "floodArea": {"@id": f"{API_ROOT}/floodAreas/{area_id}", "notation": area_id},
+        "floodAreaID": area_id,
+        "isTidal": False,
+        "severity": "Flood alert",
+        "severityLevel": 3,
+        "timeMessageChanged": "2025-10-02T17:02:00",
+    }
+
+
+def make_flood_area(i):
+    """Build a synthetic flood area record with a reference point"""
+    area_id = f"A{i:05d}"
+    return {
+        "@id": f"{API_ROOT}/floodAreas/{area_id}",
+        "notation": area_id,
+        "label": f"Flood area {i}",
+        "riverOrSea": f"River {i % 40}",
+        "lat": 50.0 + (i % 250) * 0.02,
+        "long": -5.0 + (i // 250) * 0.02,
+    }
+
+
+class ReadingSequence:
+    """Readings built on demand from their index, so large volumes cost no memory
+
+    Reading ``i`` is ``make_reading(i, n_stations, start)``: station
+    ``i % n_stations`` at step ``i // n_stations``. Station and date filters
+    narrow the underlying range arithmetically instead of scanning.
+    """
+
+    def __init__(self, count, n_stations, start=READING_START, indices=None):
+        self.n_stations = n_stations
+        self.start = start
+        self.indices = range(count) if indices is None else indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [make_reading(i, self.n_stations, self.start) for i in self.indices[key]]
+        return make_reading(self.indices[key], self.n_stations, self.start)
+
+    def __iter__(self):
+        for i in self.indices:
+            yield make_reading(i, self.n_stations, self.start)
+
+    def extend(self, count):
+        self.indices = range(self.indices.start, self.indices.stop + count * self.indices.step,
+                             self.indices.step)
+
+    def _step_of(self, date, end=False):
+        seconds = calendar.timegm(time.strptime(date[:10], '%Y-%m-%d')) - self.start
+        if end:
+            return (seconds + 86400 - 1) // READING_STEP
+        return -(-seconds // READING_STEP)
+
+    def where(self, station=None, start_date=None, end_date=None):
+        """Readings of one station and/or between two dates (inclusive)"""
+        n = self.n_stations
+        first = self._step_of(start_date) * n if start_date else 0
+        stop = (self._step_of(end_date, end=True) + 1) * n if end_date else self.indices.stop
+        step = 1
+        if station is not None:
+            code = int(station.lstrip('S'))
+            first = max(first, 0)
+            first += (code - first) % n
+            step = n
+        first = max(first, self.indices.start)
+        stop = max(first, min(stop, self.indices.stop))
+        return ReadingSequence(0, n, self.start, range(first, stop, step))
+
+    def latest(self):
+        """Newest reading of each station's measure"""
+        stop = self.indices.stop
+        return [make_reading(i, self.n_stations, self.start)
+                for i in sorted(range(max(self.indices.start, stop - self.n_stations), stop),
+                                key=lambda i: i % self.n_stations)]
+
+
+class StubFloodServer:
+    """Local stand-in for the flood-monitoring API, serving paginated synthetic data
+
+    Use as a context manager; ``base_url`` can be handed to ``ExtractionEngine``
+    or ``FloodETL`` in place of the live API. ``offset_cost`` adds that many
+    seconds per 10,000 rows skipped, like a server scanning to a deep offset.
+    ``latency_jitter`` adds up to that many seconds at random per request.
+    ``max_limit`` caps the page size whatever ``_limit`` asks for, as the
+    live API does. ``error_rate`` answers that fraction of requests with
+    ``error_status`` (a 429 carries ``Retry-After: retry_after``), and
+    setting ``outage_offset`` fails every page at or beyond that offset
+    until it is reset to None. Readings start at ``reading_start`` (epoch
+    seconds) every 15 minutes and are generated on demand. Responses carry
+    an ETag and Last-Modified and conditional requests are answered with
+    304; call ``touch`` after changing a dataset.
+    """
+
+    def __init__(self, n_stations=1000, n_readings=10000, n_floods=50, latency=0.0, port=0,
+                 error_rate=0.0, seed=0, offset_cost=0.0, latency_jitter=0.0, max_limit=None,
+                 error_status=503, retry_after=0, reading_start=READING_START):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.offset_cost = offset_cost
+        self.max_limit = max_limit
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.outage_offset = None
+        self.random = random.Random(seed)
+        self.n_stations = max(1, n_stations)
+        self.datasets = {
+            "stations": [make_station(i) for i in range(n_stations)],
+            "readings": ReadingSequence(n_readings, self.n_stations, reading_start),
+            "floods": [make_flood(i) for i in range(n_floods)],
+            "floodAreas": [make_flood_area(i) for i in range(n_floods)],
+        }
+        self.modified = dict.fromkeys(self.datasets, formatdate(usegmt=True))
+        self.request_count = 0
+        self.error_count = 0
+        self.not_modified_count = 0
+        self.bytes_sent = 0
+        self.max_offset = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def add_readings(self, count):
+        """Publish ``count`` more readings continuing each station's series"""
+        self.datasets["readings"].extend(count)
+        self.touch("readings")
+
+    def touch(self, endpoint):
+        """Record that a dataset changed, for Last-Modified"""
+        self.modified[endpoint] = formatdate(usegmt=True)
+
+    def select(self, path, query):
+        """Items of an endpoint after the station and date filters, or None if unknown
+
+        Supports ``stations/{id}/readings`` and ``startdate``/``enddate`` on
+        readings, the filters used by the backfill planner, and ``latest``,
+        which returns the newest reading of each measure.
+        """
+        parts = path.rstrip('/').split('/')
+        endpoint = parts[-1]
+        if endpoint not in self.datasets:
+            return None
+        if endpoint != "readings":
+            return self.datasets[endpoint]
+
+        readings = self.datasets[endpoint]
+        if "latest" in query:
+            return readings.latest()
+
+        station = parts[-2] if len(parts) >= 3 and parts[-3] == "stations" else None
+        if (station, query.get("startdate"), query.get("enddate")) == (None, None, None):
+            return readings
+        return readings.where(station, query.get("startdate"), query.get("enddate"))
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/id"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.request_count += 1
+                url = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+                selected = stub.select(url.path, query)
+
+                if selected is None:
+                    self.send_error(404)
+                    return
+
+                limit = int(query.get("_limit", 500))
+                if stub.max_limit:
+                    limit = min(limit, stub.max_limit)
+                offset = int(query.get("_offset", 0))
+                stub.max_offset = max(stub.max_offset, offset)
+
+                delay = stub.latency + stub.offset_cost * offset / 10000
+                if stub.latency_jitter:
+                    delay += stub.random.random() * stub.latency_jitter
+                if delay:
+                    time.sleep(delay)
+
+                outage = stub.outage_offset is not None and offset >= stub.outage_offset
+                if outage or (stub.error_rate and stub.random.random() < stub.error_rate):
+                    stub.error_count += 1
+                    status = 503 if outage else stub.error_status
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header("Retry-After", str(stub.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                items = selected[offset:offset + limit]
+                body = json.dumps({"items": items}).encode()
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                last_modified = stub.modified[url.path.rstrip('/').split('/')[-1]]
+
+                if_none_match = self.headers.get("If-None-Match")
+                if if_none_match is not None:
+                    not_modified = if_none_match == etag
+                else:
+                    not_modified = self.headers.get("If-Modified-Since") == last_modified
+
+                if not_modified:
+                    stub.not_modified_count += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+                stub.bytes_sent += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,213 @@
+"""End-to-end pipeline benchmark against a local stand-in for the API
+
+Starts StubFloodServer and times each stage of FloodETL.run_pipeline
+(extract, transform, create_features), optionally run_full_extraction,
+then storage save/load per table backend and, with --scale-readings, the
+out-of-core feature build over a synthetic readings table of that many
+rows. Results are written as JSON so runs can be compared. Run from the
+repository root:
+
+    python -m benchmarks.suite --stations 1000 --readings 200000 --latency 0.01
+    python -m benchmarks.suite --scale-readings 10000000 --compare benchmarks/results/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from features import build_features_out_of_core
+from full_load import run_full_extraction
+from run_etl import FloodETL
+from storage import get_backend
+from benchmarks.stub_server import READING_STEP, StubFloodServer
+from benchmarks.synthetic import synthetic_stations, write_readings_table
+
+RESULTS_DIR = Path("benchmarks") / "results"
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def disk_bytes(*paths):
+    total = 0
+    for path in map(Path, paths):
+        if path.is_dir():
+            total += sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+        elif path.exists():
+            total += path.stat().st_size
+    return total
+
+
+class Stages:
+    """Collects one result per timed stage"""
+
+    def __init__(self):
+        self.results = []
+
+    @contextlib.contextmanager
+    def time(self, name, **fields):
+        result = {'stage': name, **fields}
+        start = time.perf_counter()
+        yield result
+        result['seconds'] = round(time.perf_counter() - start, 4)
+        if result.get('rows'):
+            result['rows_per_s'] = round(result['rows'] / result['seconds'])
+        result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        self.results.append(result)
+        extra = ", ".join(f"{k}={v}" for k, v in result.items() if k not in ('stage', 'seconds'))
+        print(f"{name:<28} {result['seconds']:9.3f}s  {extra}")
+
+
+def run_pipeline_stages(stages, args, stub):
+    etl = FloodETL(stub.base_url, max_workers=args.workers, rate_limit=args.rate_limit, use_cache=False)
+
+    with stages.time("extract") as result:
+        stations, readings, floods = etl.extract()
+        result.update(rows=len(stations) + len(readings) + len(floods), requests=stub.request_count,
+                      http_bytes=stub.bytes_sent, http_errors=stub.error_count, retries=etl.engine.retries)
+
+    with stages.time("transform") as result:
+        _, readings_df, _ = etl.transform()
+        result.update(rows=len(readings_df), bytes=disk_bytes(etl.processed_dir))
+
+    with stages.time("create_features") as result:
+        features_df = etl.create_features()
+        result.update(rows=len(features_df), bytes=disk_bytes(etl.features_dir))
+
+    for name in args.storage:
+        backend = get_backend("processed", name)
+        path = Path(f"storage_bench{backend.extension}")
+        with stages.time(f"storage:{name}:save") as result:
+            backend.save(readings_df, path)
+            result.update(rows=len(readings_df), bytes=path.stat().st_size)
+        with stages.time(f"storage:{name}:load") as result:
+            result.update(rows=len(backend.load(path)))
+        path.unlink()
+
+
+def run_full_load_stage(stages, args, stub):
+    requests_before, bytes_before = stub.request_count, stub.bytes_sent
+    with stages.time("full_load") as result, contextlib.redirect_stdout(io.StringIO()):
+        stations, readings, floods = run_full_extraction(stub.base_url, rate_limit=args.rate_limit)
+        result.update(rows=len(stations) + len(readings) + len(floods),
+                      requests=stub.request_count - requests_before,
+                      http_bytes=stub.bytes_sent - bytes_before, bytes=disk_bytes("flood_data"))
+
+
+def run_scale_stages(stages, args):
+    stations_df = synthetic_stations(args.stations)
+    backend = get_backend("processed", args.scale_format)
+    path = Path(f"scale_readings{backend.extension}")
+
+    with stages.time("scale:write_readings") as result:
+        rows = write_readings_table(path, args.scale_format, args.stations, args.scale_readings, args.chunk_rows)
+        result.update(rows=rows, bytes=path.stat().st_size)
+
+    with stages.time("scale:features_out_of_core") as result:
+        parts = build_features_out_of_core(
+            backend.iter_chunks(path, args.chunk_rows), stations_df, Path("scale_features"),
+            backend_name=args.scale_format, chunk_rows=args.chunk_rows, workers=args.workers
+        )
+        result.update(rows=sum(n for _, n in parts), parts=len(parts), bytes=disk_bytes("scale_features"))
+
+
+def compare(results, baseline_path):
+    """Print each stage's time against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {stage['stage']: stage for stage in json.load(f)['stages']}
+    print(f"\ncompared with {baseline_path}:")
+    for stage in results['stages']:
+        before = baseline.get(stage['stage'])
+        if before is None or not before['seconds']:
+            continue
+        ratio = stage['seconds'] / before['seconds']
+        print(f"{stage['stage']:<28} {before['seconds']:9.3f}s -> {stage['seconds']:9.3f}s  ({ratio:.2f}x time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--readings", type=int, default=100_000, help="readings served by the stub API")
+    parser.add_argument("--floods", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds per response")
+    parser.add_argument("--max-limit", type=int, default=None, help="largest page the stub serves")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/s, 0 for unthrottled")
+    parser.add_argument("--storage", nargs="*", default=["csv", "parquet"])
+    parser.add_argument("--full-load", action="store_true", help="also time run_full_extraction")
+    parser.add_argument("--scale-readings", type=int, default=0,
+                        help="synthetic readings for the out-of-core stages, e.g. 1000000 to 100000000")
+    parser.add_argument("--scale-format", choices=["csv", "parquet"], default="parquet")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--output", type=Path, default=None, help="results JSON (default benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results JSON to compare with")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    started_at = datetime.now(timezone.utc)
+    results = {
+        'started_at': started_at.isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        'stages': [],
+    }
+    stages = Stages()
+    output = args.output or RESULTS_DIR / f"suite-{started_at:%Y%m%d-%H%M%S}.json"
+    output = output.resolve()
+    cwd = os.getcwd()
+
+    # End the readings now so they fall inside FloodETL's 90-day window
+    steps = -(-args.readings // max(1, args.stations))
+    reading_start = int(time.time()) // READING_STEP * READING_STEP - steps * READING_STEP
+
+    with tempfile.TemporaryDirectory() as tmp, StubFloodServer(
+            args.stations, args.readings, args.floods, latency=args.latency, latency_jitter=args.jitter,
+            max_limit=args.max_limit, error_rate=args.error_rate, error_status=args.error_status,
+            reading_start=reading_start) as stub:
+        # FloodETL and FloodDataExtractor write relative to the working directory
+        os.chdir(tmp)
+        try:
+            run_pipeline_stages(stages, args, stub)
+            if args.full_load:
+                run_full_load_stage(stages, args, stub)
+            if args.scale_readings:
+                run_scale_stages(stages, args)
+        finally:
+            os.chdir(cwd)
+
+    results['stages'] = stages.results
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
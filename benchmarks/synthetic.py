@@ -0,0 +1,84 @@
+"""Synthetic processed datasets at benchmark scale
+
+Stations come from the stub server's records; readings are generated
+directly in the processed schema (the output of transform_readings), in
+chunks, so tables of 1M to 100M rows can be written without holding them
+in memory. Reading ``i`` belongs to station ``i % n_stations`` at 15-minute
+step ``i // n_stations``, the same layout the stub server serves.
+"""
+import numpy as np
+import pandas as pd
+
+from transforms import transform_stations
+from benchmarks.stub_server import READING_START, READING_STEP, make_station
+
+# Station and reading volumes the suite is meant to cover
+STATION_SCALES = (1_000, 2_000, 5_000)
+READING_SCALES = (1_000_000, 10_000_000, 100_000_000)
+
+
+def synthetic_stations(n_stations):
+    """Processed stations table for ``n_stations`` stub stations"""
+    return transform_stations([make_station(i) for i in range(n_stations)])
+
+
+def iter_reading_chunks(n_stations, n_readings, chunk_rows=1_000_000, start=READING_START, seed=0):
+    """Yield processed readings DataFrames of at most chunk_rows rows, in time order
+
+    Values follow a daily cycle with a per-station phase and level plus noise.
+    """
+    rng = np.random.default_rng(seed)
+    phase = rng.uniform(0, 2 * np.pi, n_stations)
+    level = rng.uniform(0.2, 3.0, n_stations)
+    station_ids = np.array([f"S{i:05d}" for i in range(n_stations)], dtype=object)
+    measure_ids = np.array([f"{s}-level-stage-i-15_min-m" for s in station_ids], dtype=object)
+    extracted_at = pd.Timestamp.now().isoformat()
+
+    for first in range(0, n_readings, chunk_rows):
+        index = np.arange(first, min(first + chunk_rows, n_readings))
+        codes = index % n_stations
+        steps = index // n_stations
+        seconds = (start + steps * READING_STEP).astype('datetime64[s]')
+        values = level[codes] + 0.3 * np.sin(steps * (2 * np.pi / 96) + phase[codes])
+        values += rng.normal(0, 0.02, len(index))
+        yield pd.DataFrame({
+            'reading_id': np.char.add(np.datetime_as_string(seconds, unit='s'), 'Z').astype(object),
+            'station_id': station_ids[codes],
+            'measure_id': measure_ids[codes],
+            'datetime': pd.to_datetime(seconds).tz_localize('UTC'),
+            'value': values.round(3),
+            'unit': 'm',
+            'parameter': 'level',
+            'qualifier': 'Stage',
+            'extracted_at': extracted_at,
+        })
+
+
+def write_readings_table(path, backend_name, n_stations, n_readings, chunk_rows=1_000_000, start=READING_START):
+    """Write a synthetic readings table chunk by chunk; returns the row count
+
+    ``backend_name`` is "csv" or "parquet", matching the table backends in
+    storage, so the file can be read back with their ``iter_chunks``.
+    """
+    rows = 0
+    writer = None
+    chunks = iter_reading_chunks(n_stations, n_readings, chunk_rows, start)
+    try:
+        for chunk in chunks:
+            if backend_name == "csv":
+                chunk.to_csv(path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+            elif backend_name == "parquet":
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+                writer.write_table(table)
+            else:
+                raise ValueError(f"Unknown table backend '{backend_name}', expected 'csv' or 'parquet'")
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
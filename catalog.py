@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from streaming import iter_ndjson
+
+# pandas is imported where files are scanned, so status queries that only
+# read the catalog start without it
+
+CATALOG_NAME = "_catalog.json"
+
+# Columns holding a reading or message time, in order of preference
+TIME_COLUMNS = ['datetime', 'dateTime', 'time_changed', 'timeMessageChanged']
+
+DATA_SUFFIXES = {".csv", ".parquet", ".ndjson", ".json"}
+
+# Directories with their own bookkeeping, or none worth cataloguing
+SKIP_DIRS = {"cache", "metrics", "readings_store", "backfill"}
+
+
+def file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def time_column(columns):
+    """The first of TIME_COLUMNS among ``columns``, or None"""
+    return next((c for c in TIME_COLUMNS if c in columns), None)
+
+
+def _iso_range(values):
+    """(min, max) of timestamps or ISO strings as ISO strings, ignoring unparseable values"""
+    import pandas as pd
+
+    times = values if pd.api.types.is_datetime64_any_dtype(values) else \
+        pd.to_datetime(values, utc=True, format='ISO8601', errors='coerce')
+    times = times.dropna()
+    if not len(times):
+        return None, None
+    return times.min().isoformat(), times.max().isoformat()
+
+
+def summarize_records(records):
+    """Columns (first-seen order) and dateTime range of raw API records, in one pass"""
+    fields = {}
+    first = last = None
+    for record in records:
+        fields.update(dict.fromkeys(record))
+        value = record.get('dateTime')
+        if value:
+            if first is None or value < first:
+                first = value
+            if last is None or value > last:
+                last = value
+    return list(fields), first, last
+
+
+class DataCatalog:
+    """Manifest of the datasets under a data directory
+
+    Each file has an entry (keyed by its path relative to ``root``) with its
+    row count, columns and dtypes, time column and min/max time, size, MD5
+    and mtime. Writers call ``record``/``record_frame`` right after saving,
+    so status and schema queries read ``_catalog.json`` instead of the data.
+    ``describe`` trusts an entry only while the file's size and mtime still
+    match it; otherwise, or if there is no entry, it rescans the file and
+    stores the result, so a lost or outdated catalog heals itself. Time
+    ranges compare ISO strings for raw records, which share one format.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.path = self.root / CATALOG_NAME
+        self.lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+
+    def _key(self, path):
+        path = Path(path)
+        try:
+            return path.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def _write(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def record(self, path, rows, columns, min_time=None, max_time=None, time_col=None):
+        """Catalog a file just written; ``columns`` is a list of names or a {name: dtype} dict"""
+        stat = os.stat(path)
+        if not isinstance(columns, dict):
+            columns = dict.fromkeys(columns)
+        entry = {
+            'rows': int(rows),
+            'columns': {name: (str(dtype) if dtype is not None else None) for name, dtype in columns.items()},
+            'time_column': time_col,
+            'min_time': min_time,
+            'max_time': max_time,
+            'bytes': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'md5': file_md5(path),
+            'cataloged_at': datetime.now().isoformat(),
+        }
+        with self.lock:
+            self.entries[self._key(path)] = entry
+            self._write()
+        return entry
+
+    def record_frame(self, path, df):
+        """Catalog a table written from ``df``"""
+        column = time_column(df.columns)
+        min_time, max_time = _iso_range(df[column]) if column else (None, None)
+        return self.record(path, len(df), df.dtypes.astype(str).to_dict(), min_time, max_time, column)
+
+    def record_records(self, path, records):
+        """Catalog a raw file written from a list of API records"""
+        fields, min_time, max_time = summarize_records(records)
+        return self.record(path, len(records), fields, min_time, max_time, 'dateTime' if min_time else None)
+
+    def _fresh(self, entry, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return entry['bytes'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def describe(self, path):
+        """Catalog entry of a file, rescanning it only if it changed; None if it does not exist"""
+        key = self._key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and self._fresh(entry, path):
+            return entry
+        if not os.path.exists(path):
+            if entry is not None:
+                with self.lock:
+                    self.entries.pop(key, None)
+                    self._write()
+            return None
+        return self.scan(path)
+
+    def columns(self, path):
+        """Column names of a file, from the catalog"""
+        entry = self.describe(path)
+        return list(entry['columns']) if entry else None
+
+    def scan(self, path, chunk_rows=500_000):
+        """Read a file to build and store its entry"""
+        import pandas as pd
+
+        path = Path(path)
+        suffix = path.suffix
+        if suffix == ".csv":
+            header = pd.read_csv(path, nrows=0).columns
+            column = time_column(header)
+            rows, min_time, max_time = 0, None, None
+            for chunk in pd.read_csv(path, usecols=[column] if column else [0], chunksize=chunk_rows):
+                rows += len(chunk)
+                if column:
+                    low, high = _iso_range(chunk[column])
+                    if low is not None:
+                        min_time = low if min_time is None else min(min_time, low)
+                        max_time = high if max_time is None else max(max_time, high)
+            return self.record(path, rows, list(header), min_time, max_time, column)
+
+        if suffix == ".parquet":
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(path)
+            schema = parquet_file.schema_arrow
+            column = time_column(schema.names)
+            min_time = max_time = None
+            if column:
+                low, high = _iso_range(pd.read_parquet(path, columns=[column])[column])
+                min_time, max_time = low, high
+            columns = {field.name: str(field.type) for field in schema}
+            return self.record(path, parquet_file.metadata.num_rows, columns, min_time, max_time, column)
+
+        if suffix == ".ndjson":
+            counter = [0]
+            fields, min_time, max_time = summarize_records(_counting(iter_ndjson(path), counter))
+            return self.record(path, counter[0], fields, min_time, max_time, 'dateTime' if min_time else None)
+
+        if suffix == ".json":
+            with open(path, 'r') as f:
+                records = json.load(f)
+            return self.record_records(path, records)
+
+        raise ValueError(f"Cannot catalog '{path}': unsupported file type")
+
+    def rebuild(self):
+        """Rescan every data file under the root and replace the catalog"""
+        with self.lock:
+            self.entries = {}
+        for path in sorted(self.root.rglob('*')):
+            parts = path.relative_to(self.root).parts
+            if (path.suffix not in DATA_SUFFIXES or not path.is_file()
+                    or any(part.startswith(('_', '.')) or part in SKIP_DIRS for part in parts)
+                    or path.name.endswith('.schema.json')):
+                continue
+            self.scan(path)
+        with self.lock:
+            self._write()
+        return dict(self.entries)
+
+
+def _counting(records, counter):
+    for record in records:
+        counter[0] += 1
+        yield record
@@ -0,0 +1,226 @@
+"""Flood monitoring pipeline: one command line for extraction, ETL, status and models
+
+    python cli.py status
+    python cli.py incremental
+    python cli.py etl --dag
+    python cli.py latest S00001
+
+Every subcommand imports what it needs when it runs, so the light ones
+(status, latest) start without pandas, requests, scikit-learn or mlflow.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Modules the light subcommands (status, latest) must not import;
+# benchmarks/bench_cli_startup.py checks them and the startup budget
+HEAVY_MODULES = ('pandas', 'numpy', 'requests', 'sklearn', 'mlflow', 'pyarrow', 'joblib')
+
+
+def cmd_full(args):
+    from full_load import run_full_extraction
+
+    run_full_extraction(rate_limit=args.rate_limit, profile=args.profile)
+
+
+def cmd_incremental(args):
+    from full_load import run_incremental_extraction
+
+    run_incremental_extraction(lookback_hours=args.lookback_hours)
+
+
+def cmd_backfill(args):
+    from full_load import run_backfill_extraction
+
+    run_backfill_extraction(args.start, args.end, args.window_days, args.per_station, args.workers)
+
+
+def cmd_daily(args):
+    from extract_daily_data import display_flood_data
+
+    display_flood_data()
+
+
+def cmd_etl(args):
+    from run_etl import FloodETL
+
+    etl = FloodETL(streaming=args.streaming, profile=args.profile)
+    if args.dag:
+        etl.run_dag(force=args.force, max_workers=args.workers)
+    else:
+        etl.run_pipeline()
+
+
+def cmd_transform(args):
+    from run_etl import FloodETL
+
+    FloodETL(streaming=args.streaming).transform()
+
+
+def cmd_features(args):
+    from run_etl import FloodETL
+
+    etl = FloodETL()
+    if args.out_of_core:
+        etl.create_features_out_of_core(args.chunk_rows, args.workers)
+    else:
+        etl.create_features(incremental=args.incremental, neighbours=args.neighbours)
+
+
+def cmd_warnings(args):
+    from run_etl import FloodETL
+
+    FloodETL().aggregate_warnings(windows=args.windows, max_km=args.max_km, workers=args.workers)
+
+
+def cmd_status(args):
+    from data_status import check_data_status
+
+    check_data_status()
+
+
+def cmd_latest(args):
+    if args.serve:
+        from data_status import READINGS_STORE_DIR
+        from latest_index import LatestIndex, serve_index
+        from readings_store import ReadingsStore
+
+        index = LatestIndex.from_store(ReadingsStore(READINGS_STORE_DIR))
+        print(f"Serving latest readings for {len(index)} series on http://{args.host}:{args.port}")
+        serve_index(index, args.host, args.port)
+        return
+
+    if args.url:
+        from urllib.error import HTTPError
+        from urllib.parse import quote, urlencode
+        from urllib.request import urlopen
+
+        url = f"{args.url.rstrip('/')}/stations/{quote(args.station, safe='')}/latest"
+        if args.measure:
+            url += "?" + urlencode({'measure': args.measure})
+        try:
+            with urlopen(url, timeout=10) as response:
+                latest = json.load(response)
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+            latest = {}
+    else:
+        from data_status import READINGS_STORE_DIR
+        from readings_store import ReadingsStore
+
+        # Opening a store creates its directory, so only open one that exists
+        latest = {}
+        if os.path.exists(f"{READINGS_STORE_DIR}/_manifest.json"):
+            latest = ReadingsStore(READINGS_STORE_DIR).latest(args.station, args.measure)
+
+    if not latest:
+        print(f"No readings for station {args.station}", file=sys.stderr)
+        return 1
+    for measure, reading in sorted(latest.items()):
+        print(f"{measure}: {reading.get('value')} at {reading.get('dateTime')}")
+
+
+def cmd_train(args):
+    from train_model import train_and_score
+
+    train_and_score(per_station=not args.pooled, workers=args.workers, use_mlflow=not args.no_mlflow)
+
+
+def cmd_score(args):
+    from scoring_service import serve_scoring
+    from train_model import STATION_MODEL_DIR
+
+    serve_scoring(args.model_dir or STATION_MODEL_DIR, args.host, args.port)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    full = commands.add_parser("full", help="full load of stations, readings and floods to flood_data")
+    full.add_argument("--rate-limit", type=float, default=10.0, help="requests per second")
+    full.add_argument("--profile", choices=["cprofile", "sample"])
+    full.set_defaults(func=cmd_full)
+
+    incremental = commands.add_parser("incremental", help="readings since the last extraction, into the store")
+    incremental.add_argument("--lookback-hours", type=float, default=6.0,
+                             help="overlap with the last run, for late and revised readings")
+    incremental.set_defaults(func=cmd_incremental)
+
+    backfill = commands.add_parser("backfill", help="historical readings in parallel date-window shards")
+    backfill.add_argument("--start", default="2010-01-01")
+    backfill.add_argument("--end")
+    backfill.add_argument("--window-days", type=int, default=7)
+    backfill.add_argument("--per-station", action="store_true")
+    backfill.add_argument("--workers", type=int)
+    backfill.set_defaults(func=cmd_backfill)
+
+    daily = commands.add_parser("daily", help="print a few live stations, readings and flood warnings")
+    daily.set_defaults(func=cmd_daily)
+
+    etl = commands.add_parser("etl", help="extract, transform and create features into data/")
+    etl.add_argument("--dag", action="store_true", help="run as a DAG, skipping tasks whose inputs are unchanged")
+    etl.add_argument("--force", action="store_true", help="with --dag, rerun every task")
+    etl.add_argument("--workers", type=int, default=4, help="with --dag, tasks run concurrently")
+    etl.add_argument("--streaming", action="store_true", help="stream raw pages to NDJSON")
+    etl.add_argument("--profile", choices=["cprofile", "sample"])
+    etl.set_defaults(func=cmd_etl)
+
+    transform = commands.add_parser("transform", help="transform raw data into data/processed")
+    transform.add_argument("--streaming", action="store_true", help="raw data was extracted as NDJSON")
+    transform.set_defaults(func=cmd_transform)
+
+    features = commands.add_parser("features", help="create model features into data/features")
+    features.add_argument("--incremental", action="store_true", help="only readings newer than the last run")
+    features.add_argument("--neighbours", action="store_true", help="add features of nearby stations")
+    features.add_argument("--out-of-core", action="store_true", help="partition by partition, for large data")
+    features.add_argument("--chunk-rows", type=int, default=1_000_000)
+    features.add_argument("--workers", type=int)
+    features.set_defaults(func=cmd_features)
+
+    warnings = commands.add_parser("warnings", help="readings before each flood warning, into data/features")
+    warnings.add_argument("--windows", nargs="+", default=["6h", "24h", "72h"], help="pre-event windows")
+    warnings.add_argument("--max-km", type=float, help="only stations this close to the flood area")
+    warnings.add_argument("--workers", type=int)
+    warnings.set_defaults(func=cmd_warnings)
+
+    status = commands.add_parser("status", help="row counts and time ranges of the extracted data")
+    status.set_defaults(func=cmd_status)
+
+    latest = commands.add_parser("latest", help="latest reading of each measure of a station")
+    latest.add_argument("station", nargs="?")
+    latest.add_argument("--measure")
+    latest.add_argument("--url", help="query a running index server instead of the readings store")
+    latest.add_argument("--serve", action="store_true", help="serve a latest-readings index built from the store")
+    latest.add_argument("--host", default="127.0.0.1")
+    latest.add_argument("--port", type=int, default=8765)
+    latest.set_defaults(func=cmd_latest)
+
+    train = commands.add_parser("train", help="train the anomaly model on the features and score them")
+    train.add_argument("--pooled", action="store_true", help="one model for all stations")
+    train.add_argument("--workers", type=int)
+    train.add_argument("--no-mlflow", action="store_true")
+    train.set_defaults(func=cmd_train)
+
+    score = commands.add_parser("score", help="serve the online scoring API")
+    score.add_argument("--model-dir")
+    score.add_argument("--host", default="127.0.0.1")
+    score.add_argument("--port", type=int, default=8766)
+    score.set_defaults(func=cmd_score)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "latest" and not args.serve and not args.station:
+        parser.error("latest needs a station id (or --serve)")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import os
+
+from catalog import DataCatalog
+from readings_store import ReadingsStore
+
+DATA_DIR = "flood_data"
+# Append-only readings store shared by extraction, ingest and the latest-readings index
+READINGS_STORE_DIR = f"{DATA_DIR}/readings_store"
+
+# CSVs written by the full load, listed by check_data_status
+DATA_FILES = ['stations.csv', 'readings.csv', 'flood_warnings.csv']
+
+
+def check_data_status():
+    """Check what data we have available
+    
+    Counts and schemas come from the data catalog; a file is only scanned
+    if it changed since it was catalogued (or has no entry yet).
+    """
+    catalog = DataCatalog(DATA_DIR)
+    
+    print("📊 Data Status:")
+    print("=" * 30)
+    
+    for file in DATA_FILES:
+        entry = catalog.describe(f"{DATA_DIR}/{file}")
+        if entry is not None:
+            time_range = f", {entry['min_time']} to {entry['max_time']}" if entry['min_time'] else ""
+            print(f"{file}: {entry['rows']} records, {len(entry['columns'])} columns, "
+                  f"{entry['bytes'] / 1e6:.1f} MB{time_range}")
+        else:
+            print(f"{file}: Not found")
+    
+    # Opening a store creates its directory, so only open one that exists
+    if os.path.exists(f"{READINGS_STORE_DIR}/_manifest.json"):
+        store = ReadingsStore(READINGS_STORE_DIR)
+        print(f"readings_store: {len(store)} records, {len(store.fields)} columns, {len(store.partitions)} partitions")
+    else:
+        print("readings_store: Not found")
+    
+    # Check last extraction time
+    last_extraction_file = f"{DATA_DIR}/last_extraction.txt"
+    if os.path.exists(last_extraction_file):
+        with open(last_extraction_file, 'r') as f:
+            last_time = f.read().strip()
+        print(f"Last extraction: {last_time}")
@@ -0,0 +1,200 @@
+import json
+import re
+from itertools import repeat
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Whitespace skipped between array elements and around object keys
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# What follows an array element: a separator or the closing bracket
+_SEPARATOR = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+
+
+def loads(data):
+    """Decode a JSON document from bytes or str, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Columns:
+    """Records held column-wise: one list of values per field
+
+    Produced by ``decode_columns``; the transforms accept it wherever they
+    accept a list of records.
+    """
+
+    def __init__(self, fields):
+        self.data = {field: [] for field in fields}
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, field):
+        return self.data[field]
+
+    @property
+    def fields(self):
+        return list(self.data)
+
+
+def decode_columns(items, fields, intern=(), batch_rows=10_000):
+    """Collect only ``fields`` of each item into columns
+
+    Values of the ``intern`` fields, which must hold strings or None, are
+    deduplicated so repeated station and measure URLs, units and timestamps
+    share one object each. Items are consumed one at a time, so only the
+    kept values stay in memory.
+    """
+    fields = list(fields)
+    columns = Columns(fields)
+    memos = {field: {} for field in intern}
+
+    def flush(batch):
+        for field in fields:
+            values = list(map(dict.get, batch, repeat(field)))
+            memo = memos.get(field)
+            if memo is not None:
+                values = map(memo.setdefault, values, values)
+            columns.data[field].extend(values)
+        columns.rows += len(batch)
+
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_rows:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return columns
+
+
+class _Reader:
+    """Text buffer over a file that refills as a decoder consumes it"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, dropping consumed text; False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip(self):
+        """Advance past whitespace and return the next character ('' at end of file)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.skip() != char:
+            raise ValueError(f"Expected '{char}' in JSON stream at offset {self.pos}")
+        self.pos += 1
+
+    def decode(self, scan_once):
+        """Decode one value at the current position, reading more input as needed"""
+        while True:
+            try:
+                value, end = scan_once(self.buf, self.pos)
+                # A value ending exactly at the buffer end may be a truncated number
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except StopIteration:
+                if self.eof:
+                    raise ValueError(f"Expected a JSON value at offset {self.pos}") from None
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_items(f, chunk_size=1 << 20):
+    """Yield the elements of a JSON array one at a time from a text stream
+
+    The stream holds either a top-level array (a raw snapshot written by
+    JSONBackend) or an API page object, whose ``items`` array is streamed
+    while its other keys are decoded and discarded. Memory use is one chunk
+    plus one item, whatever the document size.
+    """
+    scan_once = json.JSONDecoder().scan_once
+    reader = _Reader(f, chunk_size)
+    first = reader.skip()
+    if first == "{":
+        reader.pos += 1
+        while True:
+            if reader.skip() == "}":
+                return
+            key = reader.decode(scan_once)
+            reader.expect(":")
+            reader.skip()
+            if key == "items":
+                break
+            reader.decode(scan_once)
+            if reader.skip() == ",":
+                reader.pos += 1
+    elif first != "[":
+        raise ValueError("Expected a JSON array or an object with an 'items' array")
+
+    reader.expect("[")
+    if reader.skip() == "]":
+        return
+    # Hot loop: one scan and one separator match per item. An item counts as
+    # complete only once its separator is in the buffer, so a number cut off
+    # at the end of a chunk is never taken for a whole one.
+    buf, pos = reader.buf, reader.pos
+    while True:
+        try:
+            item, end = scan_once(buf, pos)
+            match = _SEPARATOR.match(buf, end)
+        except (StopIteration, json.JSONDecodeError):
+            match = None
+        if match is None:
+            # Whitespace at the end of one chunk may continue into the next
+            reader.pos = _WHITESPACE.match(buf, pos).end()
+            if reader.eof:
+                reader.decode(scan_once)
+                raise ValueError(f"Expected ',' or ']' after array item at offset {reader.pos}")
+            reader.fill()
+            buf, pos = reader.buf, reader.pos
+            continue
+        yield item
+        if match.group(1) == "]":
+            return
+        pos = match.end()
+
+
+def iter_raw_records(path, chunk_size=1 << 20):
+    """Yield records from a raw JSON array or NDJSON file one at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if Path(path).suffix == ".ndjson":
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+        else:
+            yield from iter_items(f, chunk_size)
+
+
+def load_raw_columns(path, fields, intern=()):
+    """Stream a raw JSON or NDJSON file into Columns holding only ``fields``"""
+    return decode_columns(iter_raw_records(path), fields, intern)
@@ -0,0 +1,190 @@
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Fields whose change makes a re-pulled reading a revision of the stored one
+REVISION_FIELDS = ['value', 'qualifier']
+
+
+def _hash(strings):
+    """Stable 64-bit hashes of a list of strings (the same in every process)"""
+    return pd.util.hash_array(np.asarray(strings, dtype=object), categorize=False)
+
+
+def _normalized(value):
+    # 1 and 1.0 are the same reading whether it came from JSON or a ReadingBatch
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def reading_keys(records):
+    """(keys, fingerprints, keyed) arrays for a list of reading records
+
+    A reading's key hashes its measure URL and dateTime; records missing
+    either fall back to their '@id', and records with neither are not
+    keyed (``keyed`` is False and the key is meaningless). The fingerprint
+    hashes REVISION_FIELDS, so the same key with another fingerprint is a
+    revised value.
+    """
+    names, stamps = [], []
+    keyed = np.ones(len(records), dtype=bool)
+    for i, record in enumerate(records):
+        measure, date_time = record.get('measure'), record.get('dateTime')
+        if measure and date_time:
+            names.append(f"{measure}\x00{date_time}")
+        else:
+            reading_id = record.get('@id')
+            keyed[i] = reading_id is not None
+            names.append(f"\x01{reading_id}")
+        stamps.append("\x00".join(repr(_normalized(record.get(field))) for field in REVISION_FIELDS))
+    return _hash(names), _hash(stamps), keyed
+
+
+class DedupIndex:
+    """Persistent per-partition index of the reading keys a ReadingsStore holds
+
+    Each ``date=`` partition has a sorted uint64 array of reading keys and
+    an aligned array of value fingerprints (see ``reading_keys``), saved
+    under ``directory`` as ``<partition>.npz``. Looking up a batch is one
+    vectorized binary search, so a commit no longer rereads the segments of
+    every partition it touches. An index file records how many rows its
+    partition had; if that disagrees with the store (a crash between the
+    manifest swap and the index save, or a store from before the index)
+    the partition is rebuilt from its records. At most ``max_partitions``
+    are held in memory; changed ones are saved when evicted.
+    """
+
+    def __init__(self, directory, max_partitions=64):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_partitions = max_partitions
+        # partition -> {'keys', 'fingerprints', 'rows', 'dirty'}
+        self.entries = OrderedDict()
+
+    def path(self, partition):
+        return self.directory / f"{partition}.npz"
+
+    def load(self, partition, rows, records):
+        """Make a partition's index current for a store partition of ``rows`` rows
+
+        ``records`` is a zero-argument callable returning the partition's
+        records, read only when the index has to be rebuilt.
+        """
+        entry = self.entries.get(partition)
+        if entry is not None and entry['rows'] == rows:
+            self.entries.move_to_end(partition)
+            return
+        entry = self._read(partition)
+        if entry is None or entry['rows'] != rows:
+            entry = self._rebuild(records())
+        self.entries[partition] = entry
+        self.entries.move_to_end(partition)
+        while len(self.entries) > self.max_partitions:
+            evicted, old = self.entries.popitem(last=False)
+            if old['dirty']:
+                self._write(evicted, old)
+
+    def _read(self, partition):
+        path = self.path(partition)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            return {
+                'keys': data['keys'],
+                'fingerprints': data['fingerprints'],
+                'rows': int(data['rows']),
+                'dirty': False
+            }
+
+    def _rebuild(self, records, chunk_rows=100_000):
+        keys, fingerprints, rows = [], [], 0
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                rows += self._collect(chunk, keys, fingerprints)
+                chunk = []
+        rows += self._collect(chunk, keys, fingerprints)
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+        fingerprints = np.concatenate(fingerprints) if fingerprints else np.empty(0, dtype=np.uint64)
+        last = _last_occurrences(keys)
+        return {'keys': keys[last], 'fingerprints': fingerprints[last], 'rows': rows, 'dirty': True}
+
+    @staticmethod
+    def _collect(chunk, keys, fingerprints):
+        if chunk:
+            chunk_keys, chunk_fingerprints, keyed = reading_keys(chunk)
+            keys.append(chunk_keys[keyed])
+            fingerprints.append(chunk_fingerprints[keyed])
+        return len(chunk)
+
+    def merge(self, partition, keys, fingerprints, unkeyed=0):
+        """Add a batch of keys to a loaded partition; returns (new, revised) masks over ``keys``
+
+        A key is new when the partition does not hold it and revised when it
+        does with another fingerprint; anything else is a duplicate. When a
+        key repeats within the batch only its last occurrence can be new or
+        revised. The partition's row count grows by the new keys plus the
+        ``unkeyed`` records written alongside them.
+        """
+        entry = self.entries[partition]
+        new_mask = np.zeros(len(keys), dtype=bool)
+        revised_mask = np.zeros(len(keys), dtype=bool)
+        last = _last_occurrences(keys)
+        batch_keys, batch_fingerprints = keys[last], fingerprints[last]
+
+        stored = entry['keys']
+        positions = np.searchsorted(stored, batch_keys)
+        found = positions < len(stored)
+        found[found] = stored[positions[found]] == batch_keys[found]
+        revised = found.copy()
+        revised[found] = entry['fingerprints'][positions[found]] != batch_fingerprints[found]
+        new = ~found
+
+        if revised.any():
+            entry['fingerprints'] = entry['fingerprints'].copy()
+            entry['fingerprints'][positions[revised]] = batch_fingerprints[revised]
+        if new.any():
+            # batch_keys is sorted, so the insert keeps the arrays sorted
+            entry['keys'] = np.insert(stored, positions[new], batch_keys[new])
+            entry['fingerprints'] = np.insert(entry['fingerprints'], positions[new], batch_fingerprints[new])
+        if new.any() or revised.any() or unkeyed:
+            entry['rows'] += int(new.sum()) + unkeyed
+            entry['dirty'] = True
+
+        new_mask[last[new]] = True
+        revised_mask[last[revised]] = True
+        return new_mask, revised_mask
+
+    def _write(self, partition, entry):
+        path = self.path(partition)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=entry['keys'], fingerprints=entry['fingerprints'], rows=entry['rows'])
+        os.replace(tmp_path, path)
+        entry['dirty'] = False
+
+    def flush(self):
+        """Save every changed partition; call once the store's manifest is written"""
+        for partition, entry in self.entries.items():
+            if entry['dirty']:
+                self._write(partition, entry)
+
+    def discard(self):
+        """Forget unsaved changes, e.g. after a failed commit"""
+        for partition in [p for p, entry in self.entries.items() if entry['dirty']]:
+            del self.entries[partition]
+
+
+def _last_occurrences(keys):
+    """Positions of the last occurrence of each distinct key, in key order"""
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = ordered[1:] != ordered[:-1]
+    return order[last]
+
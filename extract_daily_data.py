@@ -1,9 +1,15 @@
-import requests
 from datetime import datetime
 
-def display_flood_data():
+from extraction import ExtractionEngine
+from http_cache import HTTPCache
+
+def display_flood_data(engine=None):
     """Display flood monitoring data from the UK Environment Agency"""
     
+    # Stations and floods come from the local HTTP cache while unchanged
+    if engine is None:
+        engine = ExtractionEngine(timeout=10, max_retries=2, cache=HTTPCache("flood_data/cache"))
+    
     print("UK Environment Agency Flood Monitoring Data")
     print("=" * 50)
     print(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
@@ -13,22 +19,17 @@ def display_flood_data():
         # Get monitoring stations
         print("🏞️  MONITORING STATIONS:")
         print("-" * 30)
-        response = requests.get("https://environment.data.gov.uk/flood-monitoring/id/stations?&_limit=8", timeout=10)
+        data = engine.get_json("stations", {"_limit": 8})
+        stations = data.get('items', [])
         
-        if response.status_code == 200:
-            data = response.json()
-            stations = data.get('items', [])
-            
-            for station in stations:
-                name = station.get('label', 'Unknown')
-                river = station.get('riverName', 'Unknown')
-                town = station.get('town', '')
-                status = station.get('status', 'Unknown')
-                print(f"• {name}")
-                print(f"  River: {river}, Town: {town}, Status: {status}")
-                print()
-        else:
-            print("Could not fetch stations data")
+        for station in stations:
+            name = station.get('label', 'Unknown')
+            river = station.get('riverName', 'Unknown')
+            town = station.get('town', '')
+            status = station.get('status', 'Unknown')
+            print(f"• {name}")
+            print(f"  River: {river}, Town: {town}, Status: {status}")
+            print()
             
     except Exception as e:
         print(f"Error fetching stations: {e}")
@@ -37,23 +38,18 @@ def display_flood_data():
         # Get latest readings
         print("📊 LATEST READINGS:")
         print("-" * 30)
-        response = requests.get("https://environment.data.gov.uk/flood-monitoring/id/readings?&_limit=10", timeout=10)
+        data = engine.get_json("readings", {"_limit": 10})
+        readings = data.get('items', [])
         
-        if response.status_code == 200:
-            data = response.json()
-            readings = data.get('items', [])
-            
-            for reading in readings:
-                station_id = reading.get('station', '').split('/')[-1]
-                value = reading.get('value', 'N/A')
-                unit = reading.get('unit', '')
-                param = reading.get('parameterName', reading.get('parameter', 'Unknown'))
-                time = reading.get('dateTime', '')[:16].replace('T', ' ') if reading.get('dateTime') else 'Unknown'
-                print(f"• {station_id}: {value} {unit} ({param})")
-                print(f"  Time: {time}")
-                print()
-        else:
-            print("Could not fetch readings data")
+        for reading in readings:
+            station_id = reading.get('station', '').split('/')[-1]
+            value = reading.get('value', 'N/A')
+            unit = reading.get('unit', '')
+            param = reading.get('parameterName', reading.get('parameter', 'Unknown'))
+            time = reading.get('dateTime', '')[:16].replace('T', ' ') if reading.get('dateTime') else 'Unknown'
+            print(f"• {station_id}: {value} {unit} ({param})")
+            print(f"  Time: {time}")
+            print()
             
     except Exception as e:
         print(f"Error fetching readings: {e}")
@@ -62,26 +58,24 @@ def display_flood_data():
         # Get flood warnings
         print("⚠️  FLOOD WARNINGS:")
         print("-" * 30)
-        response = requests.get("https://environment.data.gov.uk/flood-monitoring/id/floods?&_limit=5", timeout=10)
+        data = engine.get_json("floods", {"_limit": 5})
+        floods = data.get('items', [])
         
-        if response.status_code == 200:
-            data = response.json()
-            floods = data.get('items', [])
-            
-            active_floods = [f for f in floods if f.get('isActive', False)]
-            
-            if not active_floods:
-                print("No active flood warnings")
-            else:
-                for flood in active_floods:
-                    severity = flood.get('severity', 'Unknown')
-                    area = flood.get('floodArea', {}).get('name', 'Unknown area')
-                    print(f"• {severity}: {area}")
+        active_floods = [f for f in floods if f.get('isActive', False)]
+        
+        if not active_floods:
+            print("No active flood warnings")
         else:
-            print("Could not fetch flood warnings")
+            for flood in active_floods:
+                severity = flood.get('severity', 'Unknown')
+                area = flood.get('floodArea', {}).get('name', 'Unknown area')
+                print(f"• {severity}: {area}")
             
     except Exception as e:
         print(f"Error fetching flood warnings: {e}")
+    
+    if engine.cache is not None:
+        engine.cache.flush()
 
-# Run the function
-display_flood_data()
\ No newline at end of file
+if __name__ == "__main__":
+    display_flood_data()
@@ -0,0 +1,188 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from decoding import loads
+
+BASE_URL = "https://environment.data.gov.uk/flood-monitoring/id"
+
+# Responses worth retrying; anything else is raised immediately
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token-bucket rate limiter shared by every request an engine makes"""
+
+    def __init__(self, rate=10.0, burst=None):
+        # rate is requests per second; 0 or None disables limiting
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ExtractionEngine:
+    """Pooled, rate-limited, concurrent page fetcher for the flood-monitoring API"""
+
+    def __init__(self, base_url=BASE_URL, max_workers=4, rate_limit=10.0, burst=None, timeout=30,
+                 max_retries=5, backoff=1.0, max_backoff=60.0, cache=None, metrics=None, pool_size=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate_limit, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self.retry_lock = threading.Lock()
+        # Optional HTTPCache for reference endpoints such as stations and floods
+        self.cache = cache
+        # Optional PipelineMetrics told about every page, download and retry
+        self.metrics = metrics
+
+        # One keep-alive pool sized for the number of in-flight pages; raise
+        # pool_size when several pulls share the engine concurrently
+        self.pool_size = pool_size or self.max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, attempt, response=None):
+        """Exponential backoff with jitter, or the server's Retry-After if given"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def get_json(self, endpoint, params=None):
+        """Fetch a single endpoint and return the decoded JSON body
+
+        Endpoints with a TTL in the engine's cache are served from disk while
+        fresh and revalidated with a conditional request once stale.
+        """
+        url = f"{self.base_url}/{endpoint}"
+        ttl = self.cache.ttl_for(endpoint) if self.cache is not None else None
+        if ttl is None:
+            return loads(self._request(endpoint, url, params).content)
+
+        key = self.cache.key(url, params)
+        entry, body = self.cache.lookup(key, ttl)
+        if body is not None:
+            return loads(body)
+
+        response = self._request(endpoint, url, params, self.cache.conditional_headers(entry))
+        if response.status_code == 304:
+            body = self.cache.refresh(key)
+            if body is not None:
+                return loads(body)
+            # The cached body disappeared; fetch it again unconditionally
+            response = self._request(endpoint, url, params)
+
+        self.cache.store(key, url, response)
+        return loads(response.content)
+
+    def _request(self, endpoint, url, params=None, headers=None):
+        """GET with retries
+
+        Connection errors, timeouts and 429/5xx responses are retried up to
+        ``max_retries`` times with exponential backoff; the last error is
+        raised once retries are exhausted.
+        """
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire()
+            response = None
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
+                if self.metrics is not None:
+                    self.metrics.add_bytes(endpoint, len(response.content))
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                retryable = response is None or response.status_code in RETRY_STATUSES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                delay = self._retry_delay(attempt, response)
+                with self.retry_lock:
+                    self.retries += 1
+                if self.metrics is not None:
+                    self.metrics.add_retry(endpoint)
+                logging.warning(f"Retrying {endpoint} in {delay:.1f}s after attempt {attempt + 1} failed: {e}")
+                time.sleep(delay)
+                attempt += 1
+
+    def _fetch_page(self, endpoint, params, limit, offset):
+        """Fetch the items of one page"""
+        page_params = dict(params or {})
+        page_params.update({"_limit": limit, "_offset": offset})
+        start = time.perf_counter()
+        items = self.get_json(endpoint, page_params).get('items', [])
+        if self.metrics is not None:
+            self.metrics.observe_page(endpoint, time.perf_counter() - start, len(items))
+        return items
+
+    def iter_pages(self, endpoint, params=None, limit=500, start_offset=0, prefetch=None):
+        """Yield pages of items in offset order until an empty page is returned
+
+        Up to ``prefetch`` pages (``max_workers`` by default) are fetched ahead
+        of the consumer; pages fetched past the end of the collection are
+        discarded. ``start_offset`` resumes a pull part-way through the
+        collection.
+        """
+        prefetch = max(1, prefetch or self.max_workers)
+        pool = ThreadPoolExecutor(max_workers=prefetch)
+        pending = deque()
+        next_offset = start_offset
+
+        try:
+            for _ in range(prefetch):
+                pending.append(pool.submit(self._fetch_page, endpoint, params, limit, next_offset))
+                next_offset += limit
+
+            while pending:
+                items = pending.popleft().result()
+                if not items:
+                    break
+
+                yield items
+
+                pending.append(pool.submit(self._fetch_page, endpoint, params, limit, next_offset))
+                next_offset += limit
+        finally:
+            # Don't wait on prefetched pages past the end; queued ones are cancelled
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """Release pooled connections and persist cache bookkeeping"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.flush()
@@ -0,0 +1,433 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend
+
+# Longest row lag computed; the per-series tail must cover it
+MAX_LAG = 24
+
+# Time-based features are computed per (station, measure) series
+SERIES_KEY = ['station_id', 'measure_id']
+DEFAULT_LAGS = ['1h', '6h', '24h', '72h']
+DEFAULT_WINDOWS = ['1h', '6h', '24h', '72h']
+# A lagged value older than lag + tolerance counts as missing (gap in the series)
+DEFAULT_TOLERANCE = '1h'
+
+
+def add_time_features(df):
+    """Add calendar features derived from the datetime column"""
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df['hour'] = df['datetime'].dt.hour
+    df['day_of_week'] = df['datetime'].dt.dayofweek
+    df['month'] = df['datetime'].dt.month
+    df['year'] = df['datetime'].dt.year
+    return df
+
+
+def _to_ms(span):
+    return pd.Timedelta(span) // pd.Timedelta(milliseconds=1)
+
+
+def _sparse_table(values, levels, combine):
+    """table[k, j] combines values[j:j + 2**k]; entries running past the end are unused"""
+    n = len(values)
+    table = np.empty((levels, n), dtype=values.dtype)
+    table[0] = values
+    for k in range(1, levels):
+        step = 1 << (k - 1)
+        table[k] = table[k - 1]
+        table[k, :n - step] = combine(table[k - 1, :n - step], table[k - 1, step:])
+    return table
+
+
+def _range_max(table, starts, ends):
+    """NaN-ignoring max of values[starts[i]:ends[i] + 1] from an fmax sparse table"""
+    k = np.log2(ends - starts + 1).astype(np.int64)
+    return np.fmax(table[k, starts], table[k, ends - (1 << k) + 1])
+
+
+def _combine_moments(a, b):
+    """Merge (count, mean, M2) of two adjacent blocks (Chan et al.)
+
+    Empty blocks carry mean 0, so merging with one returns the other exactly.
+    """
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    count = count_a + count_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(count > 0, count_b / count, 0)
+    delta = mean_b - mean_a
+    return count, mean_a + delta * weight, m2_a + m2_b + delta * delta * count_a * weight
+
+
+def _moment_table(values, levels):
+    """table[:, k, j] holds (count, mean, M2) of the non-NaN values in values[j:j + 2**k]"""
+    n = len(values)
+    valid = ~np.isnan(values)
+    table = np.empty((3, levels, n))
+    table[0, 0] = valid
+    table[1, 0] = np.where(valid, values, 0)
+    table[2, 0] = 0
+    for k in range(1, levels):
+        step = 1 << (k - 1)
+        table[:, k] = table[:, k - 1]
+        table[:, k, :n - step] = _combine_moments(table[:, k - 1, :n - step], table[:, k - 1, step:])
+    return table
+
+
+def _range_moments(table, starts, ends):
+    """(count, mean, M2) of values[starts[i]:ends[i] + 1] from a moment table
+
+    Ranges are decomposed into power-of-two blocks, so each result depends
+    only on the values inside its own range, not on what precedes it. Unlike
+    differences of running sums, this is bit-for-bit reproducible whatever
+    history is loaded, and it stays accurate when the variance is tiny
+    relative to the level.
+    """
+    lengths = ends - starts + 1
+    moments = np.zeros((3, len(starts)))
+    position = starts.copy()
+    for k in range(table.shape[1] - 1, -1, -1):
+        rows = np.flatnonzero((lengths >> k) & 1)
+        moments[:, rows] = _combine_moments(moments[:, rows], table[:, k, position[rows]])
+        position[rows] += 1 << k
+    return moments
+
+
+def _window_chunk(codes, times, values, lags, windows, tolerance):
+    """Time-window features for rows sorted by (series code, time)"""
+    n = len(values)
+    rows = np.arange(n)
+    codes = codes - codes[0]
+    group_start = np.searchsorted(codes, codes, side='left')
+
+    # One monotonic key across all series; span keeps windows from crossing series
+    horizon = max(list(lags.values()) + list(windows.values())) + tolerance
+    origin = times.min()
+    span = times.max() - origin + horizon + 1
+    composite = codes * span + (times - origin)
+
+    def as_of(offset):
+        """Value at or before t - offset in the same series, within tolerance"""
+        j = np.searchsorted(composite, composite - offset, side='right') - 1
+        safe = j.clip(0)
+        ok = (j >= group_start) & (times[safe] >= times - offset - tolerance)
+        return np.where(ok, values[safe], np.nan)
+
+    out = {}
+    for name, lag in lags.items():
+        out[f'value_lag_{name}'] = as_of(lag)
+
+    # Window is (t - window, t], matching pandas time-based rolling
+    starts = {
+        name: np.searchsorted(composite, composite - window, side='right')
+        for name, window in windows.items()
+    }
+    longest = max(int((rows - start).max()) + 1 for start in starts.values())
+    levels = int(np.log2(longest)) + 1
+    max_table = _sparse_table(values, levels, np.fmax)
+    moment_table = _moment_table(values, levels)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name, window in windows.items():
+            start = starts[name]
+            count, mean, m2 = _range_moments(moment_table, start, rows)
+
+            out[f'value_mean_{name}'] = np.where(count > 0, mean, np.nan)
+            out[f'value_std_{name}'] = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+            out[f'value_max_{name}'] = _range_max(max_table, start, rows)
+            out[f'rate_of_rise_{name}'] = (values - as_of(window)) / (window / 3_600_000)
+
+    return out
+
+
+def window_horizon(lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS, tolerance=DEFAULT_TOLERANCE):
+    """How far back the time-based features look"""
+    return max(pd.Timedelta(span) for span in list(lags) + list(windows)) + pd.Timedelta(tolerance)
+
+
+def add_window_features(df, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS,
+                        tolerance=DEFAULT_TOLERANCE, chunk_rows=500_000):
+    """Add time-based lag, rolling mean/max/std and rate-of-rise features
+
+    Series are keyed by (station_id, measure_id). All series are handled in
+    one sorted pass with searchsorted/cumsum kernels, processed in chunks of
+    roughly ``chunk_rows`` rows split on series boundaries. Rate of rise is
+    in value units per hour.
+    """
+    key = [column for column in SERIES_KEY if column in df.columns]
+    lags = {name: _to_ms(name) for name in lags}
+    windows = {name: _to_ms(name) for name in windows}
+    tolerance = _to_ms(tolerance)
+
+    columns = [f'value_lag_{name}' for name in lags]
+    for name in windows:
+        columns += [f'value_mean_{name}', f'value_std_{name}', f'value_max_{name}', f'rate_of_rise_{name}']
+    result = {column: np.full(len(df), np.nan) for column in columns}
+
+    datetimes = pd.to_datetime(df['datetime'], utc=True)
+    present = datetimes.notna().to_numpy()
+    codes = df.groupby(key, sort=True, dropna=False).ngroup().to_numpy()[present]
+    times = datetimes[present].dt.as_unit('ms').astype('int64').to_numpy()
+    values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=float)[present]
+    positions = np.flatnonzero(present)
+
+    order = np.lexsort((times, codes))
+    codes, times, values, positions = codes[order], times[order], values[order], positions[order]
+
+    # Chunk on series boundaries so every window sees its full series
+    boundaries = np.append(np.flatnonzero(np.diff(codes)) + 1, len(codes))
+    lo = 0
+    while lo < len(codes):
+        # End the chunk at the first series boundary past lo + chunk_rows
+        hi = boundaries[min(np.searchsorted(boundaries, lo + chunk_rows), len(boundaries) - 1)]
+        chunk = _window_chunk(codes[lo:hi], times[lo:hi], values[lo:hi], lags, windows, tolerance)
+        for column, chunk_values in chunk.items():
+            result[column][positions[lo:hi]] = chunk_values
+        lo = hi
+
+    for column in columns:
+        df[column] = result[column]
+    return df
+
+
+def _add_lag_features(df):
+    """Row lags and time-window features per series
+
+    ``df`` must already be sorted by station and time. Row lags are taken
+    within each (station_id, measure_id) series, so they do not depend on
+    how the measures of a station interleave.
+    """
+    key = [column for column in SERIES_KEY if column in df.columns]
+    grouped = df.groupby(key, sort=False, dropna=False)['value']
+    df['value_lag_1'] = grouped.shift(1)
+    df['value_lag_24'] = grouped.shift(MAX_LAG)
+    return add_window_features(df)
+
+
+def build_features(readings_df, stations_df):
+    """Full recompute: merge readings with stations, add time and lag features"""
+    # Merge data
+    merged = pd.merge(readings_df, stations_df, on='station_id', how='left')
+
+    # Create time features
+    add_time_features(merged)
+
+    # Create lag features; a stable sort keeps duplicate timestamps in input order
+    merged.sort_values(['station_id', 'datetime'], inplace=True, kind='mergesort')
+    return _add_lag_features(merged)
+
+
+def add_neighbour_features(df, neighbours_df, k=3, tolerance=DEFAULT_TOLERANCE):
+    """Mean, max and count of the k nearest stations' readings as of each row
+
+    ``neighbours_df`` is the station_id/neighbour_id/rank table from
+    ``spatial.StationIndex.neighbours``. Each row is joined to at most k
+    neighbours, and each neighbour's latest reading of the same parameter
+    within ``tolerance`` is taken with an as-of merge, so the cost is linear
+    in rows times k rather than quadratic in stations.
+    """
+    by = ['neighbour_id'] + (['parameter'] if 'parameter' in df.columns else [])
+    # Match the id dtype of the readings, which may differ after a storage round trip
+    pairs = neighbours_df.loc[neighbours_df['rank'] <= k, ['station_id', 'neighbour_id']].astype(df['station_id'].dtype)
+
+    left = df[['station_id', 'datetime'] + by[1:]].assign(_row=np.arange(len(df))).merge(pairs, on='station_id')
+    right = df[['station_id', 'datetime', 'value'] + by[1:]].rename(
+        columns={'station_id': 'neighbour_id', 'value': '_neighbour_value'}
+    )
+    right = right[right['datetime'].notna()]
+    joined = pd.merge_asof(
+        left[left['datetime'].notna()].sort_values('datetime', kind='mergesort'),
+        right.sort_values('datetime', kind='mergesort'),
+        on='datetime',
+        by=by,
+        tolerance=pd.Timedelta(tolerance)
+    )
+
+    stats = joined.groupby('_row')['_neighbour_value'].agg(['mean', 'max', 'count'])
+    rows = np.arange(len(df))
+    df['neighbour_mean'] = stats['mean'].reindex(rows).to_numpy()
+    df['neighbour_max'] = stats['max'].reindex(rows).to_numpy()
+    df['neighbour_count'] = stats['count'].reindex(rows).fillna(0).astype(int).to_numpy()
+    return df
+
+
+def build_features_incremental(readings_df, stations_df, tail, tail_size=MAX_LAG):
+    """Compute features only for readings newer than each series' tail
+
+    ``tail`` holds, from previous runs, the last ``tail_size`` rows of each
+    (station_id, measure_id) series plus every row within its time-window
+    horizon. A series is watermarked on its own latest time, so a measure
+    that publishes later than another at the same station keeps its rows.
+    Returns the features for the new rows, in the same column layout and
+    order as ``build_features``, and the updated tail.
+    """
+    readings_df = readings_df.copy()
+    readings_df['datetime'] = pd.to_datetime(readings_df['datetime'])
+
+    # Only rows after the last one seen for their series are new
+    key = [column for column in SERIES_KEY if column in readings_df.columns]
+    new_rows = readings_df
+    if len(tail):
+        watermark = tail.groupby(key, dropna=False)['datetime'].max().rename('_last_seen')
+        last_seen = readings_df[key].join(watermark, on=key)['_last_seen']
+        new_rows = readings_df[last_seen.isna() | (readings_df['datetime'] > last_seen)]
+
+    merged = pd.merge(new_rows, stations_df, on='station_id', how='left')
+    add_time_features(merged)
+    merged.sort_values(['station_id', 'datetime'], inplace=True, kind='mergesort')
+
+    # Compute over tail + new rows so lags and windows reach into previous runs
+    series_columns = key + ['datetime', 'value']
+    history = tail.reindex(columns=series_columns).assign(_row=-1)
+    current = merged[series_columns].assign(_row=np.arange(len(merged)))
+    combined = pd.concat([history, current], ignore_index=True)
+    combined.sort_values(['station_id', 'datetime'], inplace=True, kind='mergesort')
+    _add_lag_features(combined)
+
+    computed = combined[combined['_row'] >= 0].sort_values('_row')
+    for column in combined.columns:
+        if column not in series_columns and column != '_row':
+            merged[column] = computed[column].to_numpy()
+
+    # Carry the last rows and the window horizon of each series
+    keep = combined.groupby(key, dropna=False).cumcount(ascending=False) < tail_size
+    latest = combined.groupby(key, dropna=False)['datetime'].transform('max')
+    keep |= combined['datetime'] >= latest - window_horizon()
+    return merged, combined.loc[keep, series_columns].reset_index(drop=True)
+
+
+class IncrementalFeatureStore:
+    """Feature parts appended run by run, with per-series tail state carried over
+
+    Each run writes one part through the features-layer backend and then
+    atomically replaces ``_state.pkl``, which lists the committed parts and
+    holds the tail buffer. Station attributes on a row are those current
+    when the row was first computed.
+    """
+
+    def __init__(self, root, backend, tail_size=MAX_LAG):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.backend = backend
+        self.tail_size = tail_size
+        self.state_path = self.root / "_state.pkl"
+        self.state = self._load_state()
+
+    def _load_state(self):
+        if self.state_path.exists():
+            return pd.read_pickle(self.state_path)
+        empty_tail = pd.DataFrame({
+            'station_id': pd.Series(dtype=object),
+            'measure_id': pd.Series(dtype=object),
+            'datetime': pd.Series(dtype='datetime64[ns, UTC]'),
+            'value': pd.Series(dtype=float)
+        })
+        return {'tail': empty_tail, 'parts': []}
+
+    def _write_state(self, state):
+        tmp_path = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        pd.to_pickle(state, tmp_path)
+        os.replace(tmp_path, self.state_path)
+        self.state = state
+
+    def update(self, readings_df, stations_df):
+        """Compute and append features for newly arrived readings"""
+        new_features, tail = build_features_incremental(
+            readings_df, stations_df, self.state['tail'], self.tail_size
+        )
+        if len(new_features):
+            parts = self.state['parts']
+            part = f"part-{len(parts):06d}{self.backend.extension}"
+            self.backend.save(new_features, self.root / part)
+            self._write_state({'tail': tail, 'parts': parts + [part]})
+        return new_features
+
+    def load(self, columns=None):
+        """Load every committed part"""
+        frames = [self.backend.load(self.root / part, columns=columns) for part in self.state['parts']]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+# Set in each out-of-core worker process by _init_partition_worker
+_worker_state = {}
+
+
+def _init_partition_worker(stations_df, backend_name):
+    """Receive the broadcast stations table once per worker process"""
+    _worker_state['stations'] = stations_df
+    _worker_state['backend'] = get_backend("features", backend_name)
+
+
+def _featurize_partition(paths, output_path):
+    """Build features for one partition of spilled readings"""
+    backend = _worker_state['backend']
+    readings_df = pd.concat([backend.load(path) for path in paths], ignore_index=True)
+    features_df = build_features(readings_df, _worker_state['stations'])
+    backend.save(features_df, output_path)
+    return str(output_path), len(features_df)
+
+
+def build_features_out_of_core(reading_chunks, stations_df, output_dir, backend_name="parquet",
+                               chunk_rows=1_000_000, buckets=64, workers=None):
+    """Build features for readings that do not fit in memory
+
+    ``reading_chunks`` is an iterable of processed-readings DataFrames, for
+    example ``backend.iter_chunks(path, chunk_rows)`` or
+    ``(transform_readings(batch) for batch in store.iter_batches(n))``.
+    Chunks are spilled into station-hash buckets, buckets are packed into
+    partitions of about ``chunk_rows`` rows, and each partition runs
+    build_features in a process pool with the stations table broadcast to
+    every worker. A station always lands in a single partition, so lags are
+    exact at partition edges. Returns (path, rows) for each output part.
+    """
+    output_dir = Path(output_dir)
+    spill_dir = output_dir / "_spill"
+    backend = get_backend("features", backend_name)
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    spill_dir.mkdir(parents=True)
+
+    # Spill each chunk into station-hash buckets
+    bucket_rows = np.zeros(buckets, dtype=np.int64)
+    bucket_paths = [[] for _ in range(buckets)]
+    for chunk_number, chunk in enumerate(reading_chunks):
+        bucket_of_row = pd.util.hash_pandas_object(chunk['station_id'].astype(str), index=False) % buckets
+        for bucket, part in chunk.groupby(bucket_of_row.to_numpy(), sort=False):
+            path = spill_dir / f"bucket-{bucket:04d}-{chunk_number:06d}{backend.extension}"
+            backend.save(part, path)
+            bucket_paths[bucket].append(path)
+            bucket_rows[bucket] += len(part)
+
+    # Pack buckets into partitions of roughly chunk_rows rows
+    partitions = []
+    current, current_rows = [], 0
+    for bucket in np.flatnonzero(bucket_rows):
+        if current and current_rows + bucket_rows[bucket] > chunk_rows:
+            partitions.append(current)
+            current, current_rows = [], 0
+        current += bucket_paths[bucket]
+        current_rows += bucket_rows[bucket]
+    if current:
+        partitions.append(current)
+
+    for old_part in output_dir.glob(f"part-*{backend.extension}"):
+        old_part.unlink()
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_partition_worker,
+        initargs=(stations_df, backend_name)
+    ) as pool:
+        futures = [
+            pool.submit(_featurize_partition, paths, output_dir / f"part-{number:05d}{backend.extension}")
+            for number, paths in enumerate(partitions)
+        ]
+        written = [future.result() for future in futures]
+
+    shutil.rmtree(spill_dir)
+    return written
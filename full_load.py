@@ -1,189 +1,139 @@
-import requests
-import pandas as pd
-import time
 from datetime import datetime, timedelta
-import csv
 import os
 import json
 
+from backfill import plan_shards, run_backfill
+from catalog import DataCatalog, time_column
+from checkpoint import discard_partial, extract_to_ndjson
+from extraction import BASE_URL, ExtractionEngine
+from http_cache import HTTPCache
+from data_status import DATA_DIR, check_data_status
+from metrics import PipelineMetrics
+from readings_store import ReadingsStore
+from streaming import NDJSONDataset, ndjson_to_csv, read_schema
+
+# Readings re-pulled before the last incremental run, for late and revised values
+LATE_DATA_HOURS = 6
+
 class FloodDataExtractor:
-    def __init__(self):
-        self.base_url = "https://environment.data.gov.uk/flood-monitoring/id"
-        self.data_dir = "flood_data"
+    def __init__(self, base_url=BASE_URL, max_workers=4, rate_limit=10.0, use_cache=True, profile=None):
+        self.base_url = base_url
+        self.data_dir = DATA_DIR
         os.makedirs(self.data_dir, exist_ok=True)
+        # Row counts, schema and time ranges of saved files, for instant status queries
+        self.catalog = DataCatalog(self.data_dir)
+        # Per-stage and per-page metrics; profile="cprofile" or "sample" also profiles each stage
+        self.metrics = PipelineMetrics(profile, f"{self.data_dir}/metrics")
+        # Stations and floods are revalidated against the cache instead of re-downloaded
+        self.cache = HTTPCache(f"{self.data_dir}/cache") if use_cache else None
+        self.engine = ExtractionEngine(base_url, max_workers=max_workers, rate_limit=rate_limit, cache=self.cache,
+                                       metrics=self.metrics)
+        self.readings_store = ReadingsStore(f"{self.data_dir}/readings_store")
     
-    def extract_all_stations(self):
-        """Extract all monitoring stations to CSV"""
-        print("Extracting all monitoring stations...")
-        all_stations = []
-        offset = 0
-        limit = 500
+    def _stream_to_csv(self, endpoint, name, label, params=None, limit=500):
+        """Write each page to NDJSON as it arrives, then convert to CSV with dynamic headers
         
-        while True:
+        Progress is checkpointed after every page; a rerun after a failure
+        resumes where the failed run stopped.
+        """
+        ndjson_path = f"{self.data_dir}/{name}.ndjson"
+        
+        with self.metrics.stage(name) as stage:
             try:
-                response = requests.get(
-                    f"{self.base_url}/stations",
-                    params={"_limit": limit, "_offset": offset},
-                    timeout=30
+                dataset = extract_to_ndjson(
+                    self.engine, endpoint, ndjson_path, params, limit,
+                    on_page=lambda items: print(f"Extracted {len(items)} {label}...")
                 )
-                response.raise_for_status()
-                data = response.json()
-                
-                stations = data.get('items', [])
-                if not stations:
-                    break
-                
-                all_stations.extend(stations)
-                offset += limit
-                print(f"Extracted {len(stations)} stations...")
-                
-                time.sleep(0.1)
-                
             except Exception as e:
-                print(f"Error extracting stations: {e}")
-                break
-        
-        # Save to CSV with dynamic headers
-        if all_stations:
-            # Get all unique fieldnames from all records
-            all_fieldnames = set()
-            for station in all_stations:
-                all_fieldnames.update(station.keys())
+                print(f"Error extracting {label}: {e}")
+                print(f"Progress is checkpointed; rerun to resume {label} extraction")
+                raise
             
-            stations_csv_path = f"{self.data_dir}/stations.csv"
-            with open(stations_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=sorted(all_fieldnames))
-                writer.writeheader()
-                writer.writerows(all_stations)
-            
-            print(f"Saved {len(all_stations)} stations to {stations_csv_path}")
+            # Header is the union of every key seen across pages
+            if len(dataset):
+                csv_path = f"{self.data_dir}/{name}.csv"
+                fields = sorted(read_schema(ndjson_path)['fields'])
+                time_field = time_column(fields)
+                rows, min_time, max_time = ndjson_to_csv(ndjson_path, csv_path, fields, time_field)
+                self.catalog.record(csv_path, rows, fields, min_time, max_time, time_field)
+                print(f"Saved {len(dataset)} {label} to {csv_path}")
+            stage['rows'] = len(dataset)
         
-        return all_stations
+        return dataset
     
-    def extract_historical_readings(self, start_date="2010-01-01", end_date=None):
-        """Extract historical readings to CSV"""
+    def stream_all_stations(self):
+        """Stream all monitoring stations to disk, returning a lazy NDJSONDataset"""
+        print("Extracting all monitoring stations...")
+        return self._stream_to_csv("stations", "stations", "stations", limit=500)
+    
+    def stream_historical_readings(self, start_date="2010-01-01", end_date=None):
+        """Stream historical readings to disk, returning a lazy NDJSONDataset"""
         if end_date is None:
             end_date = datetime.now().strftime('%Y-%m-%d')
         
         print(f"Extracting historical readings from {start_date} to {end_date}...")
         
-        all_readings = []
-        offset = 0
-        limit = 1000
-        
-        while True:
-            try:
-                response = requests.get(
-                    f"{self.base_url}/readings",
-                    params={
-                        "startdate": start_date,
-                        "enddate": end_date,
-                        "_limit": limit,
-                        "_offset": offset,
-                        "_sorted": "asc"
-                    },
-                    timeout=30
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                readings = data.get('items', [])
-                if not readings:
-                    break
-                
-                all_readings.extend(readings)
-                offset += limit
-                print(f"Extracted {len(readings)} readings...")
-                
-                time.sleep(0.2)
-                
-            except Exception as e:
-                print(f"Error extracting readings: {e}")
-                break
-        
-        # Save to CSV with dynamic headers
-        if all_readings:
-            # Get all unique fieldnames from all records
-            all_fieldnames = set()
-            for reading in all_readings:
-                all_fieldnames.update(reading.keys())
-            
-            readings_csv_path = f"{self.data_dir}/readings.csv"
-            with open(readings_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=sorted(all_fieldnames))
-                writer.writeheader()
-                writer.writerows(all_readings)
-            
-            print(f"Saved {len(all_readings)} readings to {readings_csv_path}")
+        params = {
+            "startdate": start_date,
+            "enddate": end_date,
+            "_sorted": "asc"
+        }
+        return self._stream_to_csv("readings", "readings", "readings", params, limit=1000)
+    
+    def stream_flood_warnings(self):
+        """Stream all flood warnings to disk, returning a lazy NDJSONDataset"""
+        print("Extracting flood warnings...")
+        return self._stream_to_csv("floods", "flood_warnings", "flood warnings", limit=500)
+    
+    def extract_all_stations(self):
+        """Extract all monitoring stations to CSV"""
+        return list(self.stream_all_stations())
+    
+    def extract_historical_readings(self, start_date="2010-01-01", end_date=None):
+        """Extract historical readings to CSV, returning them as a compact ReadingBatch"""
+        # Imported here (numpy and pandas) so the extraction commands start without pandas
+        from reading_batch import ReadingBatch
         
-        return all_readings
+        return ReadingBatch.from_records(self.stream_historical_readings(start_date, end_date))
     
     def extract_flood_warnings(self):
         """Extract all flood warnings to CSV"""
-        print("Extracting flood warnings...")
-        
-        all_floods = []
-        offset = 0
-        limit = 500
-        
-        while True:
-            try:
-                response = requests.get(
-                    f"{self.base_url}/floods",
-                    params={"_limit": limit, "_offset": offset},
-                    timeout=30
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                floods = data.get('items', [])
-                if not floods:
-                    break
-                
-                all_floods.extend(floods)
-                offset += limit
-                print(f"Extracted {len(floods)} flood warnings...")
-                
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error extracting flood warnings: {e}")
-                break
-        
-        # Save to CSV with dynamic headers
-        if all_floods:
-            # Get all unique fieldnames from all records
-            all_fieldnames = set()
-            for flood in all_floods:
-                all_fieldnames.update(flood.keys())
-            
-            floods_csv_path = f"{self.data_dir}/flood_warnings.csv"
-            with open(floods_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=sorted(all_fieldnames))
-                writer.writeheader()
-                writer.writerows(all_floods)
-            
-            print(f"Saved {len(all_floods)} flood warnings to {floods_csv_path}")
-        
-        return all_floods
+        return list(self.stream_flood_warnings())
 
-def run_full_extraction():
-    """Run complete full load extraction"""
+def run_full_extraction(base_url=BASE_URL, rate_limit=10.0, profile=None):
+    """Run complete full load extraction
+    
+    Stage and page metrics are written to flood_data/metrics; ``profile``
+    ("cprofile" or "sample") also profiles each stage there.
+    """
     print("🚀 Starting FULL LOAD extraction...")
     print("=" * 50)
     
-    extractor = FloodDataExtractor()
+    extractor = FloodDataExtractor(base_url, rate_limit=rate_limit, profile=profile)
+    
+    # Extract all data, streaming pages to disk
+    stations = extractor.stream_all_stations()
+    readings = extractor.stream_historical_readings()
+    floods = extractor.stream_flood_warnings()
     
-    # Extract all data
-    stations = extractor.extract_all_stations()
-    readings = extractor.extract_historical_readings()
-    floods = extractor.extract_flood_warnings()
+    # Seed the append-only store; readings already present are skipped
+    with extractor.metrics.stage("readings_store") as stage:
+        stored = stage['rows'] = extractor.readings_store.append(readings)
+    print(f"Committed {stored} readings to {extractor.readings_store.root}")
     
     print("=" * 50)
     print("✅ Full load extraction complete!")
     print(f"🏞️  Stations: {len(stations)}")
     print(f"📊 Readings: {len(readings)}")
     print(f"⚠️   Flood warnings: {len(floods)}")
+    stats = extractor.cache.stats() if extractor.cache is not None else None
+    if stats:
+        print(f"🗄️  HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} misses")
+    for stage in extractor.metrics.stages:
+        print(f"⏱️  {stage['stage']}: {stage['seconds']:.2f}s, {stage['rows'] or 0} rows, "
+              f"{stage['bytes_downloaded']} bytes, {stage['retries']} retries, peak RSS {stage['peak_rss_mb']} MB")
+    extractor.metrics.write(extractor.metrics.profile_dir)
+    extractor.engine.close()
     
     # Save extraction timestamp
     with open(f"{extractor.data_dir}/last_full_extraction.txt", 'w') as f:
@@ -191,8 +141,52 @@ def run_full_extraction():
     
     return stations, readings, floods
 
-def run_incremental_extraction():
-    """Run incremental extraction since last run"""
+def run_backfill_extraction(start_date="2010-01-01", end_date=None, window_days=7, per_station=False, workers=None):
+    """Backfill historical readings as parallel date-window shards
+    
+    Instead of one deep-offset query, the range is split into windows of
+    ``window_days`` (and per station with ``per_station=True``) fetched in
+    parallel under the shared rate limit. Finished shards are recorded in
+    flood_data/backfill/_manifest.json and skipped on rerun.
+    """
+    print("🗂️  Starting BACKFILL extraction...")
+    print("=" * 50)
+    
+    # One pooled connection per shard worker
+    extractor = FloodDataExtractor(max_workers=workers) if workers else FloodDataExtractor()
+    if end_date is None:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+    
+    station_ids = None
+    if per_station:
+        stations_path = f"{extractor.data_dir}/stations.ndjson"
+        stations = NDJSONDataset(stations_path) if os.path.exists(stations_path) else extractor.stream_all_stations()
+        station_ids = [station['@id'].split('/')[-1] for station in stations if station.get('@id')]
+    
+    shards = plan_shards(start_date, end_date, window_days, station_ids)
+    print(f"Planned {len(shards)} shards from {start_date} to {end_date}")
+    
+    fetched, added = run_backfill(
+        extractor.engine,
+        shards,
+        f"{extractor.data_dir}/backfill",
+        extractor.readings_store,
+        workers=workers
+    )
+    
+    print("=" * 50)
+    print(f"✅ Backfill complete! Fetched {fetched} shards, added {added} new readings")
+    print(f"📊 Store now holds {len(extractor.readings_store)} readings")
+    
+    return fetched, added
+
+def run_incremental_extraction(lookback_hours=LATE_DATA_HOURS):
+    """Run incremental extraction since last run
+    
+    The pull starts ``lookback_hours`` before the last run, so readings that
+    reached the API late, or were revised, are picked up too; the store
+    skips the ones it already holds and applies the revisions.
+    """
     print("🔄 Starting INCREMENTAL extraction...")
     print("=" * 50)
     
@@ -207,109 +201,49 @@ def run_incremental_extraction():
         print("No previous extraction found. Running full load first...")
         return run_full_extraction()
     
-    print(f"Extracting data since: {last_extraction}")
-    
-    # Extract new readings since last extraction
-    new_readings = []
-    offset = 0
-    limit = 1000
-    
-    while True:
-        try:
-            response = requests.get(
-                f"{extractor.base_url}/readings",
-                params={
-                    "since": last_extraction,
-                    "_limit": limit,
-                    "_offset": offset,
-                    "_sorted": "asc"
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            readings = data.get('items', [])
-            if not readings:
-                break
-            
-            new_readings.extend(readings)
-            offset += limit
-            print(f"Extracted {len(readings)} new readings...")
-            
-            time.sleep(0.2)
-            
-        except Exception as e:
-            print(f"Error extracting incremental readings: {e}")
-            break
+    since = (datetime.fromisoformat(last_extraction) - timedelta(hours=lookback_hours)).isoformat()
+    print(f"Extracting data since: {last_extraction} (from {since}, {lookback_hours}h overlap)")
+    run_started = datetime.now().isoformat()
     
-    # Append to existing CSV with dynamic headers
-    if new_readings:
-        readings_csv_path = f"{extractor.data_dir}/readings.csv"
-        
-        # Read existing headers if file exists
-        existing_headers = set()
-        if os.path.exists(readings_csv_path):
-            with open(readings_csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                existing_headers = set(next(reader))
-        
-        # Get all fieldnames from new records
-        new_fieldnames = set()
-        for reading in new_readings:
-            new_fieldnames.update(reading.keys())
-        
-        # Combine all fieldnames
-        all_fieldnames = sorted(existing_headers.union(new_fieldnames))
-        
-        # Read existing data if any
-        existing_data = []
-        if os.path.exists(readings_csv_path):
-            with open(readings_csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                existing_data = list(reader)
-        
-        # Write all data with updated headers
-        with open(readings_csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=all_fieldnames)
-            writer.writeheader()
-            writer.writerows(existing_data + new_readings)
+    # Extract new readings since last extraction into a checkpointed spool
+    spool_path = f"{extractor.data_dir}/incremental_readings.ndjson"
+    params = {
+        "since": since,
+        "_sorted": "asc"
+    }
+    
+    try:
+        spool = extract_to_ndjson(
+            extractor.engine, "readings", spool_path, params, limit=1000,
+            on_page=lambda items: print(f"Extracted {len(items)} new readings...")
+        )
+    except Exception as e:
+        # Leave the timestamp alone so no readings are skipped on the rerun
+        print(f"Error extracting incremental readings: {e}")
+        print("Progress is checkpointed; rerun to resume")
+        raise
+    
+    # Commit the raw records, every field kept as the full load and backfill
+    # commit them; cost depends only on the batch
+    added = extractor.readings_store.append(spool) if len(spool) else 0
+    
+    # Returned compact, for the transform step
+    from reading_batch import ReadingBatch
     
-    # Update extraction timestamp
+    new_readings = ReadingBatch.from_records(spool)
+    discard_partial(spool_path)
+    
+    # Update extraction timestamp to when this run started
     with open(last_extraction_file, 'w') as f:
-        f.write(datetime.now().isoformat())
+        f.write(run_started)
     
     print("=" * 50)
-    print(f"✅ Incremental extraction complete! Added {len(new_readings)} new readings")
+    stats = extractor.readings_store.last_append
+    revised = f", revised {stats['revised']}, skipped {stats['duplicates']} already stored" if stats else ""
+    print(f"✅ Incremental extraction complete! Added {added} new readings{revised}")
     
     return new_readings
 
-def check_data_status():
-    """Check what data we have available"""
-    extractor = FloodDataExtractor()
-    
-    print("📊 Data Status:")
-    print("=" * 30)
-    
-    files = ['stations.csv', 'readings.csv', 'flood_warnings.csv']
-    for file in files:
-        filepath = f"{extractor.data_dir}/{file}"
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                headers = next(reader)
-                line_count = sum(1 for line in reader)
-            print(f"{file}: {line_count} records, {len(headers)} columns")
-        else:
-            print(f"{file}: Not found")
-    
-    # Check last extraction time
-    last_extraction_file = f"{extractor.data_dir}/last_extraction.txt"
-    if os.path.exists(last_extraction_file):
-        with open(last_extraction_file, 'r') as f:
-            last_time = f.read().strip()
-        print(f"Last extraction: {last_time}")
-
 # Simple usage functions
 def extract_data_once():
     """One-time function to extract all data (full load)"""
@@ -319,6 +253,10 @@ def extract_new_data():
     """Function to extract only new data (incremental)"""
     return run_incremental_extraction()
 
+def backfill_data(start_date="2010-01-01", end_date=None):
+    """Function to backfill historical readings in parallel shards"""
+    return run_backfill_extraction(start_date, end_date)
+
 # Main execution
 if __name__ == "__main__":
     # Run full extraction (do this once)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Seconds a cached response is served without contacting the API. Endpoints
+# not listed here are never cached; once the TTL has passed the entry is
+# revalidated with If-None-Match / If-Modified-Since.
+DEFAULT_TTLS = {
+    "stations": 24 * 3600,
+    "floods": 60,
+    "floodAreas": 7 * 24 * 3600,
+}
+
+
+class HTTPCache:
+    """On-disk LRU cache of JSON API responses with conditional revalidation
+
+    Bodies are stored one file per request under ``root`` and described by
+    ``_index.json`` (URL, validators, size, last use). When the total size
+    passes ``max_bytes`` the least recently used entries are evicted.
+    ``hits`` counts responses served without a request, ``revalidated``
+    those confirmed by a 304 and ``misses`` those downloaded in full.
+    """
+
+    def __init__(self, root, ttls=None, max_bytes=256 * 1024 * 1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "_index.json"
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.index = {}
+        if self.index_path.exists():
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+
+    def ttl_for(self, endpoint):
+        """TTL in seconds for an endpoint, or None if it is not cached"""
+        return self.ttls.get(endpoint.strip('/'))
+
+    @staticmethod
+    def key(url, params=None):
+        canonical = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(canonical.encode()).hexdigest()
+
+    def lookup(self, key, ttl):
+        """Return (entry, body) if the entry is fresh, (entry, None) if stale, or (None, None)"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None, None
+            if time.time() - entry['stored_at'] >= ttl:
+                return entry, None
+            body = self._read_body(key)
+            if body is None:
+                return None, None
+            entry['last_used'] = time.time()
+            self.hits += 1
+            return entry, body
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def refresh(self, key):
+        """Mark a stale entry as current after a 304 and return its body"""
+        with self.lock:
+            body = self._read_body(key)
+            if body is None:
+                return None
+            now = time.time()
+            self.index[key].update({'stored_at': now, 'last_used': now})
+            self.revalidated += 1
+            self._write_index()
+            return body
+
+    def store(self, key, url, response):
+        """Save a 200 response body with its validators"""
+        body = response.content
+        with self.lock:
+            tmp_path = self.root / f".{key}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, self.root / f"{key}.json")
+
+            now = time.time()
+            self.index[key] = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'size': len(body),
+                'stored_at': now,
+                'last_used': now
+            }
+            self.misses += 1
+            self._evict()
+            self._write_index()
+
+    def _read_body(self, key):
+        try:
+            with open(self.root / f"{key}.json", 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            self.index.pop(key, None)
+            return None
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = sum(entry['size'] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index.pop(key)['size']
+            (self.root / f"{key}.json").unlink(missing_ok=True)
+            self.evictions += 1
+
+    def _write_index(self):
+        tmp_path = self.index_path.with_name(f".{self.index_path.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @property
+    def size(self):
+        return sum(entry['size'] for entry in self.index.values())
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.index),
+            'bytes': self.size
+        }
+
+    def flush(self):
+        """Persist last-use times so LRU order survives between runs"""
+        with self.lock:
+            self._write_index()
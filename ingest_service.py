@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from data_status import READINGS_STORE_DIR
+from features import IncrementalFeatureStore
+from latest_index import LatestIndex, make_index_server
+from reading_batch import ReadingBatch
+from readings_store import ReadingsStore
+from run_etl import FloodETL
+from streaming import NDJSONPageWriter
+from transforms import transform_readings, transform_stations
+
+LATEST_READINGS_PARAMS = {"latest": ""}
+
+
+class PollStats:
+    """Running counters for one poller"""
+
+    def __init__(self, name):
+        self.name = name
+        self.polls = 0
+        self.errors = 0
+        self.items = 0
+        self.changed = 0
+        self.last_fetch = None
+        self.max_fetch = 0.0
+        self.last_commit = None
+        self.last_lag = None
+        self.last_batch = 0
+
+    def record(self, items, changed, fetch_seconds, commit_seconds, lag_seconds=None):
+        self.polls += 1
+        self.items += items
+        self.changed += changed
+        self.last_batch = changed
+        self.last_fetch = fetch_seconds
+        self.max_fetch = max(self.max_fetch, fetch_seconds)
+        self.last_commit = commit_seconds
+        self.last_lag = lag_seconds
+
+    def as_dict(self):
+        return {key: value for key, value in vars(self).items() if key != 'name'}
+
+
+def _lag_seconds(records, now=None):
+    """Seconds between now and the newest dateTime in a batch"""
+    times = [record.get('dateTime') for record in records if record.get('dateTime')]
+    if not times:
+        return None
+    newest = pd.Timestamp(max(times))
+    if newest.tzinfo is None:
+        newest = newest.tz_localize('UTC')
+    now = now or datetime.now(timezone.utc)
+    return (pd.Timestamp(now) - newest).total_seconds()
+
+
+class IngestService:
+    """Long-running poller that pushes only changed latest readings downstream
+
+    Two asyncio tasks poll the latest-readings and floods endpoints on their
+    own schedules. Responses are diffed against the last reading seen per
+    measure (and the last message time per flood), and only changes are
+    committed: readings to the ReadingsStore and, if given, through the
+    IncrementalFeatureStore and into a LatestIndex; floods to an NDJSON
+    change log. Blocking work runs in threads so a slow commit never delays
+    the next poll's timer. ``engine`` should have no HTTP cache, or every
+    poll inside an endpoint's TTL sees the previous response.
+    """
+
+    def __init__(self, engine, store, feature_store=None, stations_df=None, floods_path=None,
+                 readings_interval=30.0, floods_interval=60.0, latest_index=None):
+        self.engine = engine
+        self.store = store
+        self.feature_store = feature_store
+        self.latest_index = latest_index
+        self.stations_df = stations_df
+        self.floods_path = Path(floods_path) if floods_path else None
+        self.readings_interval = readings_interval
+        self.floods_interval = floods_interval
+
+        # measure URL -> dateTime of the last reading pushed downstream
+        self.last_seen = {}
+        # flood @id -> timeMessageChanged of the last version logged
+        self.floods_seen = {}
+        self.readings_stats = PollStats("readings")
+        self.floods_stats = PollStats("floods")
+        self.stop_event = None
+
+    def diff_readings(self, items):
+        """Readings newer than the last one seen for their measure, with the state updates
+
+        The updates are applied only once the readings are committed, so a
+        failed commit is retried on the next poll.
+        """
+        changed, updates = [], {}
+        for item in items:
+            measure = item.get('measure')
+            date_time = item.get('dateTime')
+            if not measure or not date_time:
+                continue
+            previous = updates.get(measure, self.last_seen.get(measure))
+            if previous is None or date_time > previous:
+                updates[measure] = date_time
+                changed.append(item)
+        return changed, updates
+
+    def diff_floods(self, items):
+        """Floods that are new or whose message changed, with the state updates"""
+        changed, updates = [], {}
+        for item in items:
+            flood_id = item.get('@id')
+            version = item.get('timeMessageChanged')
+            if flood_id and (flood_id not in self.floods_seen or self.floods_seen[flood_id] != version):
+                updates[flood_id] = version
+                changed.append(item)
+        return changed, updates
+
+    def commit_readings(self, readings):
+        """Append readings to the store, featurize them and update the latest index"""
+        batch = ReadingBatch.from_records(readings)
+        self.store.append(batch)
+        readings_df = transform_readings(batch)
+        if self.feature_store is not None and self.stations_df is not None:
+            self.feature_store.update(readings_df, self.stations_df)
+        if self.latest_index is not None:
+            self.latest_index.update(readings_df)
+
+    def commit_floods(self, floods):
+        if self.floods_path is None:
+            return
+        with NDJSONPageWriter(self.floods_path, append=True) as writer:
+            writer.write_page(floods)
+
+    async def _poll(self, stats, endpoint, params, interval, diff, commit, seen):
+        """Poll one endpoint every ``interval`` seconds until stopped"""
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                data = await asyncio.to_thread(self.engine.get_json, endpoint, params)
+                fetched = time.monotonic()
+                items = data.get('items', [])
+                changed, updates = diff(items)
+                if changed:
+                    await asyncio.to_thread(commit, changed)
+                    seen.update(updates)
+                committed = time.monotonic()
+
+                lag = _lag_seconds(changed) if endpoint == "readings" else None
+                stats.record(len(items), len(changed), fetched - started, committed - fetched, lag)
+                lag_text = f", lag {lag:.0f}s" if lag is not None else ""
+                logging.info(f"{endpoint} poll: {len(items)} items, {len(changed)} changed, "
+                             f"fetch {fetched - started:.2f}s, commit {committed - fetched:.2f}s{lag_text}")
+            except Exception as e:
+                stats.errors += 1
+                logging.error(f"{endpoint} poll failed: {e}")
+
+            # Sleep out the rest of the interval, waking early on shutdown
+            remaining = interval - (time.monotonic() - started)
+            if remaining > 0:
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stop(self):
+        """Ask the pollers to finish their current cycle and exit"""
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    async def run(self, install_signal_handlers=True):
+        """Poll until stop() is called or SIGINT/SIGTERM is received"""
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        handled = []
+        if install_signal_handlers:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, self.stop)
+                    handled.append(sig)
+                except (NotImplementedError, RuntimeError):
+                    pass
+
+        logging.info(f"Ingest service started: readings every {self.readings_interval}s, "
+                     f"floods every {self.floods_interval}s")
+        try:
+            await asyncio.gather(
+                self._poll(self.readings_stats, "readings", LATEST_READINGS_PARAMS, self.readings_interval,
+                           self.diff_readings, self.commit_readings, self.last_seen),
+                self._poll(self.floods_stats, "floods", None, self.floods_interval,
+                           self.diff_floods, self.commit_floods, self.floods_seen)
+            )
+        finally:
+            for sig in handled:
+                loop.remove_signal_handler(sig)
+            logging.info(f"Ingest service stopped: readings {self.readings_stats.as_dict()}, "
+                         f"floods {self.floods_stats.as_dict()}")
+
+    def stats(self):
+        return {'readings': self.readings_stats.as_dict(), 'floods': self.floods_stats.as_dict()}
+
+
+def run_ingest_service(readings_interval=30.0, floods_interval=60.0, index_port=None):
+    """Run the ingest service against the live API until interrupted
+
+    With ``index_port`` a LatestIndex is loaded from the store, kept current
+    by the service and served over HTTP on that port.
+    """
+    # The pollers fetch without the HTTP cache: a floods response served from
+    # it for its TTL would skip every other poll at a floods_interval that long
+    etl = FloodETL(use_cache=False)
+    store = ReadingsStore(READINGS_STORE_DIR)
+    stations_path = etl._layer_path("processed", "stations")
+    if stations_path.exists():
+        stations_df = etl.load_table("processed", "stations")
+    else:
+        stations = [item for page in etl.engine.iter_pages("stations", limit=500) for item in page]
+        stations_df = transform_stations(stations)
+
+    latest_index = server = None
+    if index_port is not None:
+        latest_index = LatestIndex.from_store(store)
+        server = make_index_server(latest_index, port=index_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logging.info(f"Serving latest readings for {len(latest_index)} series on port {index_port}")
+
+    service = IngestService(
+        etl.engine,
+        store,
+        IncrementalFeatureStore(etl.features_dir / "incremental", etl.backends["features"]),
+        stations_df,
+        floods_path=etl.raw_dir / "flood_changes.ndjson",
+        readings_interval=readings_interval,
+        floods_interval=floods_interval,
+        latest_index=latest_index
+    )
+    try:
+        asyncio.run(service.run())
+    finally:
+        etl.engine.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return service.stats()
+
+
+if __name__ == "__main__":
+    run_ingest_service()
@@ -0,0 +1,235 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from transforms import transform_readings
+
+# Marks an empty ring buffer cell
+EMPTY_TIME = np.iinfo(np.int64).min
+
+
+def _epoch_ns(datetimes):
+    """UTC epoch nanoseconds of a datetime Series"""
+    return pd.to_datetime(datetimes, utc=True).dt.as_unit('ns').astype('int64').to_numpy()
+
+
+def _format_time(ns):
+    return pd.Timestamp(int(ns), unit='ns', tz='UTC').isoformat()
+
+
+def _json_value(value):
+    # json.dumps writes NaN as a bare NaN token, which is not valid JSON
+    return None if np.isnan(value) else float(value)
+
+
+class LatestIndex:
+    """Latest ``depth`` readings per (station, measure) in array ring buffers
+
+    Every series owns one row of two ``(series, depth)`` arrays (epoch-ns
+    times and values) plus a head position, so the latest reading is one
+    array lookup and a lookback of n readings is a slice. Series ids are
+    assigned on first sight and the arrays double when full. Readings that
+    are not newer than a series' latest are ignored.
+    """
+
+    def __init__(self, depth=96, capacity=1024):
+        self.depth = depth
+        self.slots = {}
+        self.series = []
+        self.station_slots = {}
+        self.times = np.full((capacity, depth), EMPTY_TIME, dtype=np.int64)
+        self.values = np.full((capacity, depth), np.nan)
+        self.heads = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.series)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes + self.heads.nbytes + self.counts.nbytes
+
+    def _slot(self, station_id, measure_id):
+        key = (station_id, measure_id)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.series)
+            if slot == len(self.heads):
+                self._grow()
+            self.slots[key] = slot
+            self.series.append(key)
+            self.station_slots.setdefault(station_id, []).append(slot)
+        return slot
+
+    def _grow(self):
+        capacity = 2 * len(self.heads)
+        times = np.full((capacity, self.depth), EMPTY_TIME, dtype=np.int64)
+        values = np.full((capacity, self.depth), np.nan)
+        times[:len(self.times)] = self.times
+        values[:len(self.values)] = self.values
+        self.times, self.values = times, values
+        self.heads = np.concatenate([self.heads, np.zeros(capacity - len(self.heads), dtype=np.int64)])
+        self.counts = np.concatenate([self.counts, np.zeros(capacity - len(self.counts), dtype=np.int64)])
+
+    def update(self, readings):
+        """Add readings: raw API records, a ReadingBatch or a processed readings DataFrame
+
+        Returns the number of readings written.
+        """
+        df = readings if isinstance(readings, pd.DataFrame) else transform_readings(readings)
+        df = df[df['datetime'].notna()]
+        if not len(df):
+            return 0
+
+        with self.lock:
+            codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([df['station_id'], df['measure_id']]))
+            slot_of_code = np.array([self._slot(*key) for key in uniques], dtype=np.int64)
+            slots = slot_of_code[codes]
+            times = _epoch_ns(df['datetime'])
+            values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=float)
+
+            # Group by series in time order and keep only rows newer than the series' latest
+            order = np.lexsort((times, slots))
+            slots, times, values = slots[order], times[order], values[order]
+            latest = self.times[slots, (self.heads[slots] - 1) % self.depth]
+            keep = times > latest
+            # Of several readings at the same time, keep the last one
+            keep[:-1] &= (slots[:-1] != slots[1:]) | (times[:-1] != times[1:])
+            slots, times, values = slots[keep], times[keep], values[keep]
+            if not len(slots):
+                return 0
+
+            # Rank of each row within its series; only the last depth rows can survive
+            starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+            sizes = np.diff(np.r_[starts, len(slots)])
+            rank = np.arange(len(slots)) - np.repeat(starts, sizes)
+            new_rows = np.repeat(sizes, sizes)
+            survive = rank >= new_rows - self.depth
+
+            positions = (self.heads[slots] + rank) % self.depth
+            self.times[slots[survive], positions[survive]] = times[survive]
+            self.values[slots[survive], positions[survive]] = values[survive]
+
+            touched = slots[starts]
+            self.heads[touched] = (self.heads[touched] + sizes) % self.depth
+            self.counts[touched] = np.minimum(self.depth, self.counts[touched] + sizes)
+            return len(slots)
+
+    @classmethod
+    def from_store(cls, store, depth=96, batch_size=200_000, partitions=None):
+        """Build an index from the readings store, batch by batch"""
+        index = cls(depth)
+        for batch in store.iter_batches(batch_size, partitions):
+            index.update(batch)
+        return index
+
+    def latest(self, station_id, measure_id=None):
+        """Latest reading of each measure at a station: {measure_id: (time, value)}"""
+        with self.lock:
+            result = {}
+            for slot in self.station_slots.get(station_id, []):
+                measure = self.series[slot][1]
+                if measure_id is not None and measure != measure_id:
+                    continue
+                position = (self.heads[slot] - 1) % self.depth
+                result[measure] = (_format_time(self.times[slot, position]), float(self.values[slot, position]))
+            return result
+
+    def lookback(self, station_id, measure_id, n=None):
+        """Up to the last n readings of one series, oldest first, as (times, values)"""
+        with self.lock:
+            slot = self.slots.get((station_id, measure_id))
+            if slot is None:
+                return np.array([], dtype='datetime64[ns]'), np.array([])
+            n = min(self.counts[slot], n if n is not None else self.depth)
+            positions = (self.heads[slot] - n + np.arange(n)) % self.depth
+            times = self.times[slot, positions].astype('datetime64[ns]')
+            return times, self.values[slot, positions].copy()
+
+    def snapshot(self):
+        """Latest reading of every series as a DataFrame"""
+        with self.lock:
+            n = len(self.series)
+            positions = (self.heads[:n] - 1) % self.depth
+            rows = np.arange(n)
+            return pd.DataFrame({
+                'station_id': [key[0] for key in self.series],
+                'measure_id': [key[1] for key in self.series],
+                'datetime': pd.to_datetime(self.times[rows, positions], utc=True),
+                'value': self.values[rows, positions],
+            })
+
+
+def make_index_server(index, host="127.0.0.1", port=8765):
+    """HTTP API over a LatestIndex for dashboards
+
+    GET /stations/{id}/latest[?measure=]
+    GET /stations/{id}/readings?measure=...&n=...
+    GET /series
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            parts = [part for part in url.path.split('/') if part]
+
+            if parts == ['series']:
+                body = [{'station_id': s, 'measure_id': m} for s, m in index.series]
+            elif len(parts) == 3 and parts[0] == 'stations' and parts[2] == 'latest':
+                latest = index.latest(parts[1], query.get('measure'))
+                if not latest:
+                    self.send_error(404, "unknown station")
+                    return
+                body = {measure: {'dateTime': t, 'value': _json_value(v)} for measure, (t, v) in latest.items()}
+            elif len(parts) == 3 and parts[0] == 'stations' and parts[2] == 'readings' and 'measure' in query:
+                try:
+                    n = int(query['n']) if 'n' in query else None
+                except ValueError:
+                    n = -1
+                if n is not None and n < 0:
+                    self.send_error(400, "n must be a non-negative integer")
+                    return
+                times, values = index.lookback(parts[1], query['measure'], n)
+                body = [{'dateTime': _format_time(t), 'value': _json_value(v)}
+                        for t, v in zip(times.astype(np.int64), values)]
+            else:
+                self.send_error(404)
+                return
+
+            payload = json.dumps(body, allow_nan=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_index(index, host="127.0.0.1", port=8765):
+    """Serve a LatestIndex over HTTP until interrupted"""
+    server = make_index_server(index, host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    from data_status import READINGS_STORE_DIR
+    from readings_store import ReadingsStore
+
+    index = LatestIndex.from_store(ReadingsStore(READINGS_STORE_DIR))
+    print(f"Serving latest readings for {len(index)} series on http://127.0.0.1:8765")
+    serve_index(index)
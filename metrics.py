@@ -0,0 +1,305 @@
+import bisect
+import contextlib
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# Upper bounds in seconds of the page latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROFILERS = ("cprofile", "sample")
+
+
+class Histogram:
+    """Fixed-bucket histogram, exported like a Prometheus histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (inf past the last bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': {('+Inf' if bound == float('inf') else str(bound)): count
+                        for bound, count in self.cumulative()},
+        }
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS mark so a stage's own peak can be read (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb(since_reset):
+    """Peak RSS in MB since the last reset, or over the process lifetime"""
+    if since_reset:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StackSampler:
+    """Sampling profiler: records every thread's stack every ``interval`` seconds
+
+    Far cheaper than cProfile, so usable on production runs, and unlike
+    cProfile it sees the fetch threads too. Output is in collapsed-stack format (one
+    ``frame;frame;frame count`` line per stack) for flame graph tools.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = False
+        self.thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while self.running:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def enable(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.running = False
+        self.thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class PipelineMetrics:
+    """Wall time, throughput, memory and HTTP metrics for pipeline stages
+
+    ``stage(name)`` times a block and yields a dict the block can add
+    ``rows`` (and anything else) to; bytes downloaded and retries during
+    the stage are filled in from the engine's counters. An engine given
+    these metrics reports every page through ``observe_page``, ``add_bytes``
+    and ``add_retry``. With ``profile`` set to "cprofile" or "sample", each
+    stage is profiled and the profile written to ``profile_dir``.
+
+    Peak RSS is a process-wide mark, reset only when a stage starts with no
+    other stage running. ``peak_rss_scope`` says what a stage's
+    ``peak_rss_mb`` covers: "stage" when it ran alone, "concurrent" when
+    it overlapped other stages (the peak of all of them since the first
+    started), or "process" (lifetime peak) where the mark cannot be reset.
+    """
+
+    def __init__(self, profile=None, profile_dir="metrics"):
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profile}', expected one of {PROFILERS}")
+        self.profile = profile
+        self.profile_dir = Path(profile_dir)
+        self.stages = []
+        self.page_latency = {}
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        # Records of the stages running now, as run_dag runs them in threads
+        self.active = []
+        self.since_reset = False
+
+    def _endpoint(self, endpoint):
+        counters = self.endpoints.get(endpoint)
+        if counters is None:
+            counters = self.endpoints[endpoint] = {'pages': 0, 'rows': 0, 'bytes': 0, 'retries': 0}
+            self.page_latency[endpoint] = Histogram()
+        return counters
+
+    def observe_page(self, endpoint, seconds, rows):
+        with self.lock:
+            counters = self._endpoint(endpoint)
+            counters['pages'] += 1
+            counters['rows'] += rows
+            self.page_latency[endpoint].observe(seconds)
+
+    def add_bytes(self, endpoint, nbytes):
+        with self.lock:
+            self._endpoint(endpoint)['bytes'] += nbytes
+
+    def add_retry(self, endpoint):
+        with self.lock:
+            self._endpoint(endpoint)['retries'] += 1
+
+    def _totals(self):
+        with self.lock:
+            return (sum(c['bytes'] for c in self.endpoints.values()),
+                    sum(c['retries'] for c in self.endpoints.values()))
+
+    def _profiler(self):
+        if self.profile == "cprofile":
+            import cProfile
+            return cProfile.Profile(), ".prof"
+        return StackSampler(), ".folded"
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a pipeline stage; set ``rows`` on the yielded dict for rows/s"""
+        record = {'stage': name, 'rows': None}
+        bytes_before, retries_before = self._totals()
+        with self.lock:
+            # Resetting under a running stage would cut off its peak
+            if self.active:
+                for other in self.active:
+                    other['_overlapped'] = True
+                record['_overlapped'] = True
+            else:
+                self.since_reset = _reset_peak_rss()
+            since_reset = self.since_reset
+            self.active.append(record)
+        profiler = None
+        if self.profile:
+            profiler, suffix = self._profiler()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                record['profile'] = str(self.profile_dir / f"{name}{suffix}")
+                profiler.dump_stats(record['profile'])
+
+            bytes_after, retries_after = self._totals()
+            with self.lock:
+                self.active.remove(record)
+                overlapped = record.pop('_overlapped', False)
+            record.update({
+                'seconds': round(seconds, 4),
+                'rows_per_s': round(record['rows'] / seconds) if record['rows'] and seconds else None,
+                'bytes_downloaded': bytes_after - bytes_before,
+                'retries': retries_after - retries_before,
+                'peak_rss_mb': round(_peak_rss_mb(since_reset), 1),
+                'peak_rss_scope': "concurrent" if overlapped else "stage" if since_reset else "process",
+            })
+            self.stages.append(record)
+            rate = f" ({record['rows_per_s']:,} rows/s)" if record['rows_per_s'] else ""
+            logging.info(f"Stage {name}: {seconds:.2f}s, {record['rows'] or 0:,} rows{rate}, "
+                         f"{record['bytes_downloaded']:,} bytes downloaded, {record['retries']} retries, "
+                         f"peak RSS {record['peak_rss_mb']} MB ({record['peak_rss_scope']})")
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'stages': list(self.stages),
+                'endpoints': {endpoint: dict(counters, page_latency=self.page_latency[endpoint].to_dict())
+                              for endpoint, counters in self.endpoints.items()},
+            }
+
+    def to_prometheus(self, prefix="flood_etl"):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}")
+
+        with self.lock:
+            stages = list(self.stages)
+            endpoints = {endpoint: dict(counters) for endpoint, counters in self.endpoints.items()}
+            histograms = dict(self.page_latency)
+
+        metric("stage_seconds", "gauge", "Wall time of the last run of each stage",
+               [({'stage': s['stage']}, s['seconds']) for s in stages])
+        metric("stage_rows", "gauge", "Rows produced by each stage",
+               [({'stage': s['stage']}, s['rows'] or 0) for s in stages])
+        metric("stage_peak_rss_bytes", "gauge", "Peak resident memory during each stage (see scope)",
+               [({'stage': s['stage'], 'scope': s['peak_rss_scope']}, int(s['peak_rss_mb'] * 1024 * 1024))
+                for s in stages])
+        for name, help_text in (("pages", "Pages fetched"), ("rows", "Rows fetched"),
+                                ("bytes", "Response bytes downloaded"), ("retries", "Request retries")):
+            metric(f"http_{name}_total", "counter", f"{help_text} per endpoint",
+                   [({'endpoint': e}, c[name]) for e, c in endpoints.items()])
+
+        lines.append(f"# HELP {prefix}_page_latency_seconds Page fetch latency per endpoint")
+        lines.append(f"# TYPE {prefix}_page_latency_seconds histogram")
+        for endpoint, histogram in histograms.items():
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float('inf') else bound
+                lines.append(f'{prefix}_page_latency_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {count}')
+            lines.append(f'{prefix}_page_latency_seconds_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+            lines.append(f'{prefix}_page_latency_seconds_count{{endpoint="{endpoint}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory, name="pipeline_metrics"):
+        """Write <name>.json and <name>.prom (for a node_exporter textfile collector)"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for suffix, text in ((".json", json.dumps(self.to_dict(), indent=2)), (".prom", self.to_prometheus())):
+            path = directory / f"{name}{suffix}"
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+            paths.append(path)
+        return paths
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+
+class Task:
+    """One pipeline step: a callable with the files it reads and writes
+
+    ``inputs`` and ``outputs`` are file or directory paths. A task runs
+    after every task that produces one of its inputs, and after the tasks
+    named in ``after``. ``always`` marks tasks whose real input is outside
+    the tree (an API pull), which therefore never skip. Bump ``version``
+    to force a rerun after changing the task's code.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), after=(), always=False, version=""):
+        self.name = name
+        self.func = func
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.after = list(after)
+        self.always = always
+        self.version = version
+
+
+class FileHasher:
+    """MD5 of files and directories, recomputed only when size or mtime change"""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else {}
+        self.lock = threading.Lock()
+
+    def _file(self, path):
+        stat = path.stat()
+        key = str(path)
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['md5']
+
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                md5.update(block)
+        with self.lock:
+            self.cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'md5': md5.hexdigest()}
+        return md5.hexdigest()
+
+    def digest(self, path):
+        """Content hash of a file or directory, or None if it does not exist"""
+        path = Path(path)
+        if path.is_file():
+            return self._file(path)
+        if path.is_dir():
+            md5 = hashlib.md5()
+            for child in sorted(p for p in path.rglob('*') if p.is_file()):
+                md5.update(f"{child.relative_to(path)}:{self._file(child)}\n".encode())
+            return md5.hexdigest() + ".dir"
+        return None
+
+
+class PipelineDAG:
+    """Run tasks concurrently in dependency order, skipping those whose inputs are unchanged
+
+    A task is skipped when its inputs hash the same as at its last
+    successful run and its outputs still exist unchanged. Hashes and a
+    size/mtime cache are kept in ``state_path``. With ``metrics`` (a
+    PipelineMetrics), every task that runs is a stage; a task may return
+    its row count for rows/s. After a run, each of ``dvc_roots`` holding
+    outputs of tasks that ran is ``dvc add``-ed: a root already tracked
+    (with a sibling ``<root>.dvc``, like flood_data.dvc) has its .dvc file
+    refreshed, and one not tracked yet gets its .dvc file created.
+    """
+
+    def __init__(self, state_path, max_workers=4, metrics=None, dvc_roots=()):
+        self.state_path = Path(state_path)
+        self.max_workers = max_workers
+        self.metrics = metrics
+        self.dvc_roots = [Path(root) for root in dvc_roots]
+        self.tasks = {}
+
+        self.state = {'tasks': {}, 'files': {}}
+        if self.state_path.exists():
+            with open(self.state_path, 'r') as f:
+                self.state = json.load(f)
+        self.hasher = FileHasher(self.state['files'])
+        self.state_lock = threading.Lock()
+
+    def add(self, name, func, inputs=(), outputs=(), after=(), always=False, version=""):
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task '{name}'")
+        self.tasks[name] = Task(name, func, inputs, outputs, after, always, version)
+        return self.tasks[name]
+
+    def dependencies(self):
+        """Upstream task names of each task, from matching outputs to inputs plus ``after``"""
+        producers = {}
+        for task in self.tasks.values():
+            for output in task.outputs:
+                producers[output] = task.name
+
+        deps = {}
+        for task in self.tasks.values():
+            upstream = set(task.after)
+            for path in task.inputs:
+                # An input inside a produced directory depends on that directory's producer
+                for candidate in (path, *path.parents):
+                    if candidate in producers:
+                        upstream.add(producers[candidate])
+                        break
+            unknown = upstream - set(self.tasks)
+            if unknown:
+                raise ValueError(f"Task '{task.name}' depends on unknown tasks {sorted(unknown)}")
+            deps[task.name] = upstream - {task.name}
+        self._check_acyclic(deps)
+        return deps
+
+    @staticmethod
+    def _check_acyclic(deps):
+        visiting, done = set(), set()
+
+        def visit(name, chain):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in pipeline: {' -> '.join(chain + [name])}")
+            visiting.add(name)
+            for upstream in deps[name]:
+                visit(upstream, chain + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in deps:
+            visit(name, [])
+
+    def _selected(self, deps, targets):
+        """Targets and everything upstream of them"""
+        if targets is None:
+            return set(self.tasks)
+        selected, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.tasks:
+                raise ValueError(f"Unknown task '{name}'")
+            if name not in selected:
+                selected.add(name)
+                stack.extend(deps[name])
+        return selected
+
+    def _hashes(self, paths):
+        return {str(path): self.hasher.digest(path) for path in paths}
+
+    def _up_to_date(self, task, input_hashes):
+        with self.state_lock:
+            record = self.state['tasks'].get(task.name)
+        if task.always or record is None:
+            return False
+        if record['version'] != task.version or record['inputs'] != input_hashes:
+            return False
+        outputs = self._hashes(task.outputs)
+        return None not in outputs.values() and outputs == record['outputs']
+
+    def _run_task(self, task, force):
+        """Run or skip one task; returns "ran" or "skipped" """
+        input_hashes = self._hashes(task.inputs)
+        missing = [path for path, digest in input_hashes.items() if digest is None]
+        if missing:
+            raise FileNotFoundError(f"Task '{task.name}' is missing inputs {missing}")
+        if not force and self._up_to_date(task, input_hashes):
+            logging.info(f"Task {task.name}: inputs unchanged, skipped")
+            return "skipped"
+
+        logging.info(f"Task {task.name}: running")
+        if self.metrics is not None:
+            with self.metrics.stage(task.name) as stage:
+                result = task.func()
+                if isinstance(result, int) and not isinstance(result, bool):
+                    stage['rows'] = result
+        else:
+            task.func()
+
+        record = {'version': task.version, 'inputs': input_hashes, 'outputs': self._hashes(task.outputs)}
+        with self.state_lock:
+            self.state['tasks'][task.name] = record
+        return "ran"
+
+    def run(self, targets=None, force=False):
+        """Run the selected tasks; returns {task: "ran" | "skipped" | "failed" | "blocked"}
+
+        Independent tasks run concurrently on up to ``max_workers`` threads.
+        When a task fails, tasks downstream of it are blocked, the others
+        still run, and the first failure is raised once all have finished.
+        """
+        deps = self.dependencies()
+        selected = self._selected(deps, targets)
+        status = {}
+        errors = []
+        pending = set(selected)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in sorted(pending):
+                    upstream = deps[name] & selected
+                    if any(status.get(u) in ("failed", "blocked") for u in upstream):
+                        status[name] = "blocked"
+                        pending.discard(name)
+                    elif all(status.get(u) in ("ran", "skipped") for u in upstream):
+                        running[pool.submit(self._run_task, self.tasks[name], force)] = name
+                        pending.discard(name)
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        status[name] = future.result()
+                    except Exception as e:
+                        logging.error(f"Task {name} failed: {e}")
+                        status[name] = "failed"
+                        errors.append(e)
+
+        self._save_state()
+        changed = [self.tasks[name] for name, result in status.items() if result == "ran"]
+        self._track_with_dvc(changed)
+        if errors:
+            raise errors[0]
+        return status
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _track_with_dvc(self, changed_tasks):
+        """``dvc add`` each DVC root holding outputs of tasks that ran"""
+        roots = []
+        for root in self.dvc_roots:
+            resolved = root.resolve()
+            for task in changed_tasks:
+                if any(resolved in (output.resolve(), *output.resolve().parents) for output in task.outputs):
+                    roots.append(root)
+                    break
+        if not roots:
+            return
+
+        if shutil.which("dvc") is None:
+            logging.warning(f"dvc is not installed; not updating DVC tracking of {[str(r) for r in roots]}")
+            return
+        for root in roots:
+            result = subprocess.run(["dvc", "add", str(root)], capture_output=True, text=True)
+            if result.returncode:
+                logging.warning(f"dvc add {root} failed: {result.stderr.strip()}")
+            else:
+                logging.info(f"Updated DVC tracking of {root} in {root.with_name(f'{root.name}.dvc')}")
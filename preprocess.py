@@ -1,13 +1,13 @@
-import pandas as pd
-import numpy as np 
 import os
 
+from catalog import DataCatalog
+
+# Columns come from the data catalog, so the CSVs are not loaded just to list them
 current_directory = os.getcwd()
+catalog = DataCatalog(os.path.join(current_directory, 'flood_data'))
+
 file_path = os.path.join(current_directory, 'flood_data', 'flood_warnings.csv')
-df = pd.read_csv(file_path)
-print(df.columns)
+print(catalog.columns(file_path))
 
 file_path = os.path.join(current_directory, 'flood_data', 'stations.csv')
-df_stations = pd.read_csv(file_path)
-
-print(df_stations.columns)
\ No newline at end of file
+print(catalog.columns(file_path))
\ No newline at end of file
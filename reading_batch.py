@@ -0,0 +1,243 @@
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from decoding import decode_columns, iter_raw_records
+
+# Raw reading fields kept by a batch; '@id' is rebuilt from measure and dateTime
+RECORD_FIELDS = ['station', 'measure', 'dateTime', 'value', 'unit', 'parameter', 'qualifier']
+
+# Dictionary-encoded fields
+CATEGORICAL_FIELDS = ['station', 'measure', 'unit', 'parameter', 'qualifier']
+
+# Root of station and measure URLs when a batch is built from processed ids
+API_ROOT = "http://environment.data.gov.uk/flood-monitoring/id"
+
+# Timestamps are int64 epoch microseconds, the resolution of processed readings
+TIME_UNIT = 'us'
+NAT = np.iinfo(np.int64).min
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def _encode(values):
+    """Categorical of ``values`` with categories in first-seen order; missing values get code -1"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return pd.Categorical.from_codes(codes, pd.Index(uniques, dtype=object))
+
+
+def _epoch(values):
+    """int64 epoch microseconds of ISO strings, NAT where missing or unparseable
+
+    Readings share timestamps across stations, so each distinct string is
+    parsed once.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    lookup = np.append(parsed.dt.as_unit(TIME_UNIT).to_numpy(dtype='int64', na_value=NAT), NAT)
+    return lookup[codes]
+
+
+def _renamed(categorical, mapper):
+    """``categorical`` with ``mapper`` applied to its categories, merging any that collide"""
+    categories = pd.Index(mapper(categorical.categories), dtype=object)
+    if categories.is_unique:
+        return pd.Categorical.from_codes(categorical.codes, categories)
+    codes, uniques = pd.factorize(categories)
+    remapped = np.append(codes, -1)[categorical.codes]
+    return pd.Categorical.from_codes(remapped, pd.Index(uniques, dtype=object))
+
+
+def _last_segment(index):
+    return index.astype(str).str.replace(r'^.*/', '', regex=True)
+
+
+def _decoded(categorical, missing=None):
+    """Object array of a categorical's values, ``missing`` where the code is -1"""
+    lookup = np.append(categorical.categories.to_numpy(dtype=object), missing)
+    return lookup[categorical.codes]
+
+
+class ReadingBatch:
+    """Readings held as arrays instead of one dict per record
+
+    Station, measure, unit, parameter and qualifier are dictionary-encoded
+    (pd.Categorical: small integer codes plus one copy of each distinct
+    string), times are int64 epoch microseconds (UTC) and values a float64
+    or float32 array, so a reading costs tens of bytes instead of the
+    hundreds its dict takes. The reading '@id' is not stored: the API
+    builds it from the measure and dateTime, and ``iter_records`` does the
+    same. Iterating a batch yields raw-style records, so it can stand in
+    for a list of readings, e.g. in ReadingsStore.append. Unparseable
+    dateTimes and non-numeric values are kept as missing.
+    """
+
+    def __init__(self, station, measure, times, values, unit, parameter, qualifier):
+        self.station = station
+        self.measure = measure
+        self.times = times
+        self.values = values
+        self.unit = unit
+        self.parameter = parameter
+        self.qualifier = qualifier
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays and the dictionaries' strings"""
+        total = self.times.nbytes + self.values.nbytes
+        for name in CATEGORICAL_FIELDS:
+            categorical = getattr(self, name)
+            total += categorical.codes.nbytes
+            total += sum(len(c) + 49 for c in categorical.categories if isinstance(c, str))
+        return total
+
+    @classmethod
+    def empty(cls, value_dtype=np.float64):
+        return cls.from_columns(decode_columns([], RECORD_FIELDS), value_dtype)
+
+    @classmethod
+    def from_columns(cls, columns, value_dtype=np.float64):
+        """Build a batch from decoding.Columns holding at least RECORD_FIELDS"""
+        values = pd.to_numeric(pd.Series(columns['value'], dtype=object), errors='coerce')
+        return cls(
+            station=_encode(columns['station']),
+            measure=_encode(columns['measure']),
+            times=_epoch(columns['dateTime']),
+            values=values.to_numpy(dtype=value_dtype, na_value=np.nan),
+            unit=_encode(columns['unit']),
+            parameter=_encode(columns['parameter']),
+            qualifier=_encode(columns['qualifier']),
+        )
+
+    @classmethod
+    def from_records(cls, records, chunk_rows=100_000, value_dtype=np.float64):
+        """Build a batch from an iterable of raw reading records, ``chunk_rows`` at a time
+
+        Only one chunk of records is alive at once, so a lazy source (an
+        NDJSONDataset, a raw file) never has to fit in memory as dicts.
+        """
+        interned = [field for field in RECORD_FIELDS if field != 'value']
+        records = iter(records)
+        batches = []
+        while True:
+            columns = decode_columns(islice(records, chunk_rows), RECORD_FIELDS, interned)
+            if not len(columns):
+                break
+            batches.append(cls.from_columns(columns, value_dtype))
+        return cls.concat(batches) if batches else cls.empty(value_dtype)
+
+    @classmethod
+    def read_raw(cls, path, chunk_rows=100_000, value_dtype=np.float64):
+        """Stream a raw readings file (JSON array or NDJSON) into a batch"""
+        return cls.from_records(iter_raw_records(path), chunk_rows, value_dtype)
+
+    @classmethod
+    def from_frame(cls, df, api_root=API_ROOT):
+        """Build a batch from a processed readings DataFrame
+
+        Categorical columns keep their codes and datetime/value columns
+        their arrays, so nothing row-sized is copied when the frame already
+        has the batch's dtypes (as ``to_frame`` returns it).
+        """
+        def encoded(column):
+            values = df[column]
+            return values.array if isinstance(values.dtype, pd.CategoricalDtype) else _encode(values)
+
+        times = df['datetime']
+        if not (isinstance(times.dtype, pd.DatetimeTZDtype) and times.dtype.unit == TIME_UNIT):
+            times = pd.to_datetime(times, utc=True).dt.as_unit(TIME_UNIT)
+        return cls(
+            station=_renamed(encoded('station_id'), lambda ids: f"{api_root}/stations/" + ids.astype(str)),
+            measure=_renamed(encoded('measure_id'), lambda ids: f"{api_root}/measures/" + ids.astype(str)),
+            times=times.array.asi8,
+            values=df['value'].to_numpy(),
+            unit=encoded('unit'),
+            parameter=encoded('parameter'),
+            qualifier=encoded('qualifier'),
+        )
+
+    def station_ids(self):
+        """Station codes with the station ids (last URL segment) as categories"""
+        return _renamed(self.station, _last_segment)
+
+    def measure_ids(self):
+        """Measure codes with the measure ids (last URL segment) as categories"""
+        return _renamed(self.measure, _last_segment)
+
+    def datetimes(self):
+        """The times as a datetime64[us, UTC] array"""
+        return pd.to_datetime(self.times.view(f'M8[{TIME_UNIT}]')).tz_localize('UTC').array
+
+    def date_strings(self):
+        """dateTime of every reading in the API's format, None where missing"""
+        codes, uniques = pd.factorize(self.times)
+        formatted = pd.to_datetime(uniques.view(f'M8[{TIME_UNIT}]')).strftime(DATETIME_FORMAT)
+        lookup = np.asarray(formatted, dtype=object)
+        lookup[uniques == NAT] = None
+        return lookup[codes]
+
+    def to_frame(self):
+        """The batch as a DataFrame sharing its arrays
+
+        Columns are station_id, measure_id, datetime, value, unit, parameter
+        and qualifier, the dictionary-encoded ones as categoricals. Codes
+        and values are not copied; pandas has no public way to wrap int64
+        times as a tz-aware column, so the datetime column is one copy.
+        """
+        return pd.DataFrame({
+            'station_id': self.station_ids(),
+            'measure_id': self.measure_ids(),
+            'datetime': self.datetimes(),
+            'value': self.values,
+            'unit': self.unit,
+            'parameter': self.parameter,
+            'qualifier': self.qualifier,
+        }, copy=False)
+
+    @classmethod
+    def concat(cls, batches):
+        """One batch holding ``batches`` in order, with merged dictionaries"""
+        batches = list(batches)
+        if len(batches) == 1:
+            return batches[0]
+        merged = {
+            name: pd.api.types.union_categoricals([getattr(b, name) for b in batches])
+            for name in CATEGORICAL_FIELDS
+        }
+        return cls(
+            times=np.concatenate([b.times for b in batches]),
+            values=np.concatenate([b.values for b in batches]),
+            **merged,
+        )
+
+    def iter_records(self):
+        """Yield raw-style reading records, rebuilding '@id' from measure and dateTime"""
+        measures = _decoded(self.measure)
+        date_times = self.date_strings()
+        reading_roots = _decoded(_renamed(self.measure, lambda urls: urls.astype(str).str.replace(
+            '/id/measures/', '/data/readings/', regex=False)))
+        columns = zip(_decoded(self.station), measures, date_times, self.values.tolist(),
+                      _decoded(self.unit), _decoded(self.parameter), _decoded(self.qualifier), reading_roots)
+        for station, measure, date_time, value, unit, parameter, qualifier, root in columns:
+            record = {
+                '@id': f"{root}/{date_time}" if root is not None and date_time is not None else None,
+                'dateTime': date_time,
+                'measure': measure,
+                'station': station,
+                'value': None if value != value else value,
+                'unit': unit,
+                'parameter': parameter,
+                'qualifier': qualifier,
+            }
+            # Fields the source record did not have are left out, not written as null
+            yield {key: value for key, value in record.items() if value is not None}
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def to_records(self):
+        return list(self.iter_records())
@@ -0,0 +1,374 @@
+import csv
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+
+from streaming import iter_ndjson
+
+
+class ReadingsStore:
+    """Append-only, date-partitioned store of raw reading records
+
+    Each commit writes one NDJSON segment per touched ``date=YYYY-MM-DD``
+    partition and then atomically replaces ``_manifest.json``. Readers only
+    see segments listed in the manifest, so a crash mid-commit leaves the
+    store exactly as it was. The manifest also carries the union of fields
+    seen so far, which lets the schema widen without rewriting old segments.
+
+    Readings are identified by measure and dateTime (see ``key_of``). A
+    commit skips readings already stored and writes revised values to small
+    revision segments, which readers apply over the partition's records
+    until ``compact`` folds them in.
+    """
+
+    def __init__(self, root, max_open_partitions=64, compact_ratio=0.05):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / "_manifest.json"
+        self.max_open_partitions = max_open_partitions
+        self.compact_ratio = compact_ratio
+        self.manifest = self._load_manifest()
+        self._dedup = None
+        self.last_append = None
+
+    def _load_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        return {'version': 1, 'fields': [], 'segments': []}
+
+    def _write_manifest(self):
+        tmp_path = self.manifest_path.with_name(f".{self.manifest_path.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def partition_of(record):
+        """Partition key for a reading: the date part of its dateTime"""
+        date_time = record.get('dateTime') or ''
+        return f"date={date_time[:10]}" if len(date_time) >= 10 else "date=unknown"
+
+    @staticmethod
+    def key_of(record):
+        """Identity of a reading: (measure, dateTime), or its '@id' when either is missing"""
+        measure, date_time = record.get('measure'), record.get('dateTime')
+        if measure and date_time:
+            return measure, date_time
+        return record.get('@id')
+
+    @property
+    def fields(self):
+        return list(self.manifest['fields'])
+
+    @property
+    def partitions(self):
+        return sorted({segment['partition'] for segment in self.manifest['segments']})
+
+    def __len__(self):
+        return sum(segment['rows'] for segment in self.segments())
+
+    def segments(self, partitions=None):
+        """Committed record segments, optionally restricted to some partitions"""
+        return [segment for segment in self._all_segments(partitions) if not segment.get('revisions')]
+
+    def revision_segments(self, partitions=None):
+        """Committed revision segments, in commit order"""
+        return [segment for segment in self._all_segments(partitions) if segment.get('revisions')]
+
+    def _all_segments(self, partitions=None):
+        if partitions is not None:
+            partitions = set(partitions)
+        return [
+            segment for segment in self.manifest['segments']
+            if partitions is None or segment['partition'] in partitions
+        ]
+
+    @property
+    def dedup(self):
+        """Persistent (measure, dateTime) index of committed readings
+
+        Created on first write; dedup_index needs numpy and pandas, which
+        reading the store does not.
+        """
+        if self._dedup is None:
+            from dedup_index import DedupIndex
+
+            self._dedup = DedupIndex(self.root / "_index", self.max_open_partitions)
+        return self._dedup
+
+    def _committed_rows(self, partition):
+        return sum(segment['rows'] for segment in self.segments([partition]))
+
+    def append(self, records, chunk_rows=10_000):
+        """Commit a batch of reading records, skipping readings already stored
+
+        ``records`` may be any iterable, including a lazy stream of pages
+        flattened into records. Readings are looked up by measure and
+        dateTime in the store's DedupIndex: one already stored with the same
+        value and qualifier is skipped, and one whose value or qualifier
+        changed (a late revision) goes to a revision segment that replaces
+        the stored reading for readers. So repeated pulls of overlapping
+        windows do not grow the store. Partitions whose revisions pass
+        ``compact_ratio`` of their rows are compacted after the commit.
+        Returns the number of new records written; ``last_append`` also
+        counts the duplicates skipped and the readings revised.
+        """
+        import numpy as np
+        from dedup_index import reading_keys
+
+        run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        open_files = OrderedDict()
+        pending = {}
+        # partition -> {reading key: latest revised record}
+        revisions = {}
+        fields = dict.fromkeys(self.manifest['fields'])
+        dedup = self.dedup
+        written = duplicates = 0
+
+        try:
+            records = iter(records)
+            while True:
+                chunk = list(islice(records, chunk_rows))
+                if not chunk:
+                    break
+                groups = {}
+                for record in chunk:
+                    groups.setdefault(self.partition_of(record), []).append(record)
+
+                for partition, group in groups.items():
+                    if partition not in pending:
+                        partition_dir = self.root / partition
+                        partition_dir.mkdir(exist_ok=True)
+                        pending[partition] = {
+                            'tmp': partition_dir / f".seg-{run_id}.ndjson.tmp",
+                            'file': f"{partition}/seg-{run_id}.ndjson",
+                            'rows': 0
+                        }
+                    segment = pending[partition]
+                    dedup.load(partition, self._committed_rows(partition) + segment['rows'],
+                               lambda p=partition: self._partition_records(p, pending))
+
+                    keys, fingerprints, keyed = reading_keys(group)
+                    keyed_at = np.flatnonzero(keyed)
+                    new, revised = dedup.merge(partition, keys[keyed_at], fingerprints[keyed_at],
+                                               unkeyed=len(group) - len(keyed_at))
+                    keep = ~keyed
+                    keep[keyed_at[new]] = True
+                    for i in keyed_at[revised]:
+                        revisions.setdefault(partition, {})[self.key_of(group[i])] = group[i]
+                        fields.update(dict.fromkeys(group[i]))
+                    duplicates += len(keyed_at) - int(new.sum()) - int(revised.sum())
+
+                    rows = [record for record, kept in zip(group, keep.tolist()) if kept]
+                    if not rows:
+                        continue
+                    handle = self._segment_file(open_files, partition, segment['tmp'])
+                    for record in rows:
+                        handle.write(json.dumps(record))
+                        handle.write('\n')
+                        fields.update(dict.fromkeys(record))
+                    segment['rows'] += len(rows)
+                    written += len(rows)
+
+            for handle in open_files.values():
+                handle.flush()
+                os.fsync(handle.fileno())
+                handle.close()
+            open_files.clear()
+
+            # Revised readings are few, so each partition's go out in one small segment
+            for partition, revised in revisions.items():
+                tmp_path = self.root / partition / f".rev-{run_id}.ndjson.tmp"
+                pending[f"{partition}/revisions"] = {
+                    'partition': partition,
+                    'tmp': tmp_path,
+                    'file': f"{partition}/rev-{run_id}.ndjson",
+                    'rows': len(revised),
+                    'revisions': True
+                }
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for record in revised.values():
+                        f.write(json.dumps(record))
+                        f.write('\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            # Publish segments, then make them visible with a single manifest swap
+            new_segments = []
+            for name, segment in pending.items():
+                if not segment['rows']:
+                    segment['tmp'].unlink(missing_ok=True)
+                    continue
+                os.replace(segment['tmp'], self.root / segment['file'])
+                new_segment = {
+                    'partition': segment.get('partition', name),
+                    'file': segment['file'],
+                    'rows': segment['rows'],
+                    'run_id': run_id
+                }
+                if segment.get('revisions'):
+                    new_segment['revisions'] = True
+                new_segments.append(new_segment)
+
+            if new_segments:
+                self.manifest['segments'].extend(new_segments)
+                self.manifest['fields'] = list(fields)
+                self._write_manifest()
+            dedup.flush()
+        except BaseException:
+            for handle in open_files.values():
+                handle.close()
+            for segment in pending.values():
+                segment['tmp'].unlink(missing_ok=True)
+            dedup.discard()
+            raise
+
+        self.last_append = {
+            'added': written,
+            'duplicates': duplicates,
+            'revised': sum(len(revised) for revised in revisions.values())
+        }
+        due = [
+            partition for partition in revisions
+            if sum(s['rows'] for s in self.revision_segments([partition]))
+            > self.compact_ratio * self._committed_rows(partition)
+        ]
+        if due:
+            self.compact(due)
+        return written
+
+    def _segment_file(self, open_files, partition, tmp_path):
+        """Open handle on a partition's pending segment, keeping a bounded number open"""
+        if partition in open_files:
+            open_files.move_to_end(partition)
+            return open_files[partition]
+        if len(open_files) >= self.max_open_partitions:
+            _, handle = open_files.popitem(last=False)
+            handle.close()
+        open_files[partition] = open(tmp_path, 'a', encoding='utf-8')
+        return open_files[partition]
+
+    def _partition_records(self, partition, pending):
+        """Committed records of a partition plus those pending in the current commit"""
+        yield from self.iter_records([partition])
+        segment = pending.get(partition)
+        if segment is not None and segment['tmp'].exists():
+            yield from iter_ndjson(segment['tmp'])
+
+    def _revisions(self, partitions=None):
+        """{partition: {reading key: latest revised record}} from the revision segments"""
+        revisions = {}
+        for segment in self.revision_segments(partitions):
+            revised = revisions.setdefault(segment['partition'], {})
+            for record in iter_ndjson(self.root / segment['file']):
+                revised[self.key_of(record)] = record
+        return revisions
+
+    def compact(self, partitions=None):
+        """Fold revision segments into the records of their partitions
+
+        Each partition with revisions is rewritten as one segment and the
+        rewrites are swapped in with a single manifest write. Returns the
+        partitions compacted.
+        """
+        revisions = self._revisions(partitions)
+        run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        new_segments, replaced = [], []
+        try:
+            for partition, revised in revisions.items():
+                segment = {
+                    'partition': partition,
+                    'file': f"{partition}/seg-{run_id}.ndjson",
+                    'rows': 0,
+                    'run_id': run_id
+                }
+                tmp_path = self.root / partition / f".seg-{run_id}.ndjson.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for source in self.segments([partition]):
+                        for record in iter_ndjson(self.root / source['file']):
+                            f.write(json.dumps(revised.get(self.key_of(record), record)))
+                            f.write('\n')
+                            segment['rows'] += 1
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.root / segment['file'])
+                new_segments.append(segment)
+                replaced.extend(self._all_segments([partition]))
+
+            if new_segments:
+                self.manifest['segments'] = [
+                    segment for segment in self.manifest['segments'] if segment not in replaced
+                ] + new_segments
+                self._write_manifest()
+        except BaseException:
+            for segment in new_segments:
+                (self.root / segment['file']).unlink(missing_ok=True)
+            for partition in revisions:
+                (self.root / partition / f".seg-{run_id}.ndjson.tmp").unlink(missing_ok=True)
+            raise
+
+        for segment in replaced:
+            (self.root / segment['file']).unlink(missing_ok=True)
+        return list(revisions)
+
+    def iter_records(self, partitions=None):
+        """Yield committed records in commit order, with revised values applied"""
+        revisions = self._revisions(partitions)
+        for segment in self.segments(partitions):
+            revised = revisions.get(segment['partition'])
+            records = iter_ndjson(self.root / segment['file'])
+            if revised is None:
+                yield from records
+            else:
+                key_of = self.key_of
+                for record in records:
+                    yield revised.get(key_of(record), record)
+
+    def latest(self, station_id, measure_id=None):
+        """Latest committed reading of each measure of a station, as {measure_id: record}
+
+        Partitions are read newest first and the scan stops after the first
+        one holding the station, so only the recent end of the store is read.
+        """
+        latest = {}
+        for partition in reversed(self.partitions):
+            if partition == "date=unknown":
+                continue
+            for record in self.iter_records([partition]):
+                if (record.get('station') or '').rsplit('/', 1)[-1] != station_id:
+                    continue
+                measure = (record.get('measure') or '').rsplit('/', 1)[-1]
+                if measure_id is not None and measure != measure_id:
+                    continue
+                current = latest.get(measure)
+                if current is None or record.get('dateTime', '') >= current.get('dateTime', ''):
+                    latest[measure] = record
+            if latest:
+                break
+        return latest
+
+    def iter_batches(self, batch_size, partitions=None):
+        """Yield committed records in lists of at most batch_size"""
+        batch = []
+        for record in self.iter_records(partitions):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def export_csv(self, csv_path, partitions=None):
+        """Stream committed records to a single CSV using the widened schema"""
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=sorted(self.manifest['fields']))
+            writer.writeheader()
+            for record in self.iter_records(partitions):
+                writer.writerow(record)
@@ -1,20 +1,69 @@
-import requests
-import pandas as pd
-import json
 from datetime import datetime, timedelta
-import time
+from functools import partial
 import logging
+import os
 from pathlib import Path
 
+import pandas as pd
+
+from catalog import DataCatalog
+from checkpoint import discard_partial, extract_to_ndjson
+from decoding import load_raw_columns
+from extraction import BASE_URL, ExtractionEngine
+from features import IncrementalFeatureStore, add_neighbour_features, build_features, build_features_out_of_core
+from http_cache import HTTPCache
+from metrics import PipelineMetrics
+from pipeline_dag import PipelineDAG
+from reading_batch import ReadingBatch
+from spatial import StationIndex
+from storage import get_backend
+from streaming import read_schema
+from transforms import INTERN_FIELDS, RAW_FIELDS, drop_duplicate_readings, transform_flood_areas, transform_floods, transform_readings, transform_stations
+from warning_aggregation import DEFAULT_WINDOWS as WARNING_WINDOWS, aggregate_warnings
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Storage backend used for each data layer unless overridden
+DEFAULT_STORAGE = {
+    "raw": "json",
+    "processed": "csv",
+    "features": "csv",
+}
+
 class FloodETL:
-    def __init__(self):
-        self.base_url = "https://environment.data.gov.uk/flood-monitoring/id"
+    def __init__(self, base_url=BASE_URL, max_workers=4, rate_limit=10.0, streaming=False, storage=None,
+                 use_cache=True, profile=None):
+        self.base_url = base_url
         self.data_dir = Path("data")
+        
+        # Per-stage and per-page metrics, written to data/metrics by run_pipeline;
+        # profile="cprofile" or "sample" also profiles each stage
+        self.metrics_dir = self.data_dir / "metrics"
+        self.metrics = PipelineMetrics(profile, self.metrics_dir)
+        
+        # Stations and floods are revalidated against data/cache instead of re-downloaded
+        self.cache = HTTPCache(self.data_dir / "cache") if use_cache else None
+        # The pool has room for the three concurrent pulls of run_dag
+        self.engine = ExtractionEngine(base_url, max_workers=max_workers, rate_limit=rate_limit, cache=self.cache,
+                                       metrics=self.metrics, pool_size=3 * max_workers)
         self.raw_dir = self.data_dir / "raw"
         self.processed_dir = self.data_dir / "processed"
         self.features_dir = self.data_dir / "features"
+        self.layer_dirs = {
+            "raw": self.raw_dir,
+            "processed": self.processed_dir,
+            "features": self.features_dir,
+        }
+        
+        # Pick a storage backend per layer, e.g. storage={"processed": "parquet"}
+        self.storage = dict(DEFAULT_STORAGE, **(storage or {}))
+        if streaming:
+            self.storage["raw"] = "ndjson"
+        self.streaming = self.storage["raw"] == "ndjson"
+        self.backends = {layer: get_backend(layer, name) for layer, name in self.storage.items()}
+        
+        # Every saved dataset is recorded in data/_catalog.json
+        self.catalog = DataCatalog(self.data_dir)
         
         # Create directories
         for dir_path in [self.raw_dir, self.processed_dir, self.features_dir]:
@@ -22,211 +71,357 @@ class FloodETL:
     
     def extract(self):
         """Extract data from API"""
-        logging.info("Starting extraction...")
-        
-        # Extract stations
-        stations = self._extract_paginated_data("stations", limit=500)
-        self._save_json(stations, self.raw_dir / "stations.json")
+        with self.metrics.stage("extract") as stage:
+            logging.info("Starting extraction...")
+            
+            # Readings cover the last 90 days
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=90)
+            
+            stations = self._extract_dataset("stations", limit=500)
+            readings = self._extract_dataset("readings", self._readings_params(start_date, end_date), limit=1000)
+            floods = self._extract_dataset("floods", limit=500)
+            
+            logging.info(f"Extraction complete: {len(stations)} stations, {len(readings)} readings, {len(floods)} floods")
+            stage['rows'] = len(stations) + len(readings) + len(floods)
+            if self.cache is not None:
+                self.cache.flush()
+                logging.info(f"HTTP cache: {self.cache.stats()}")
+            return stations, readings, floods
+    
+    def _extract_dataset(self, name, params=None, limit=500):
+        """Pull one endpoint to its raw file
         
-        # Extract readings (last 90 days)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=90)
-        readings = self._extract_readings(start_date, end_date)
-        self._save_json(readings, self.raw_dir / "readings.json")
-        
-        # Extract floods
-        floods = self._extract_paginated_data("floods", limit=500)
-        self._save_json(floods, self.raw_dir / "floods.json")
-        
-        logging.info(f"Extraction complete: {len(stations)} stations, {len(readings)} readings, {len(floods)} floods")
-        return stations, readings, floods
-    
-    def _extract_paginated_data(self, endpoint, limit=500):
-        """Extract paginated data from API"""
-        all_data = []
-        offset = 0
-        
-        while True:
-            try:
-                response = requests.get(
-                    f"{self.base_url}/{endpoint}",
-                    params={"_limit": limit, "_offset": offset},
-                    timeout=30
-                )
-                data = response.json()
-                items = data.get('items', [])
-                
-                if not items:
-                    break
-                
-                all_data.extend(items)
-                offset += limit
-                logging.info(f"Extracted {len(items)} {endpoint}...")
-                time.sleep(0.1)
-                
-            except Exception as e:
-                logging.error(f"Error extracting {endpoint}: {e}")
-                break
+        When streaming, pages go straight to raw NDJSON and a lazy dataset is
+        returned; otherwise the records are collected and saved as raw JSON.
+        """
+        if self.streaming:
+            return self._stream_paginated_data(name, params, limit)
+        records = self._extract_paginated_data(name, params, limit)
+        self._save_raw(records, name)
+        return records
+    
+    def _extract_paginated_data(self, endpoint, params=None, limit=500):
+        """Extract paginated data from API
         
+        Pages are spooled to a checkpointed NDJSON file under data/raw/_partial,
+        so an interrupted pull resumes from its last page on the next run.
+        """
+        spool_path = self.raw_dir / "_partial" / f"{endpoint}.ndjson"
+        dataset = self._checkpointed_pull(endpoint, spool_path, params, limit)
+        all_data = list(dataset)
+        discard_partial(spool_path)
         return all_data
     
+    def _stream_paginated_data(self, endpoint, params=None, limit=500):
+        """Write each page to raw NDJSON as it arrives, checkpointing after each page"""
+        path = self._layer_path("raw", endpoint)
+        dataset = self._checkpointed_pull(endpoint, path, params, limit)
+        self.catalog.record(path, len(dataset), read_schema(path)['fields'])
+        return dataset
+    
+    def _checkpointed_pull(self, endpoint, path, params, limit):
+        """Pull an endpoint to NDJSON, resuming from a checkpoint if one exists"""
+        try:
+            return extract_to_ndjson(
+                self.engine, endpoint, path, params, limit,
+                on_page=lambda items: logging.info(f"Extracted {len(items)} {endpoint}...")
+            )
+        except Exception as e:
+            logging.error(f"Error extracting {endpoint}: {e}; rerun to resume from the checkpoint")
+            raise
+    
+    def _readings_params(self, start_date, end_date):
+        """Query parameters for a readings date range"""
+        return {
+            "startdate": start_date.strftime('%Y-%m-%d'),
+            "enddate": end_date.strftime('%Y-%m-%d'),
+            "_sorted": "asc"
+        }
+    
     def _extract_readings(self, start_date, end_date):
         """Extract readings with date range"""
-        all_readings = []
-        offset = 0
-        limit = 1000
-        
-        while True:
-            try:
-                response = requests.get(
-                    f"{self.base_url}/readings",
-                    params={
-                        "startdate": start_date.strftime('%Y-%m-%d'),
-                        "enddate": end_date.strftime('%Y-%m-%d'),
-                        "_limit": limit,
-                        "_offset": offset,
-                        "_sorted": "asc"
-                    },
-                    timeout=30
-                )
-                data = response.json()
-                readings = data.get('items', [])
-                
-                if not readings:
-                    break
-                
-                all_readings.extend(readings)
-                offset += limit
-                logging.info(f"Extracted {len(readings)} readings...")
-                time.sleep(0.2)
-                
-            except Exception as e:
-                logging.error(f"Error extracting readings: {e}")
-                break
-        
-        return all_readings
+        params = self._readings_params(start_date, end_date)
+        return self._extract_paginated_data("readings", params, limit=1000)
     
     def transform(self):
         """Transform raw data into structured format"""
-        logging.info("Starting transformation...")
+        with self.metrics.stage("transform") as stage:
+            logging.info("Starting transformation...")
+            
+            # Load only the raw fields the transforms read
+            stations = self._load_raw_for_transform("stations")
+            readings = self._load_raw_for_transform("readings")
+            floods = self._load_raw_for_transform("floods")
+            
+            # Transform data, with one extraction timestamp for the whole batch
+            extracted_at = datetime.now()
+            stations_df = self._transform_stations(stations, extracted_at)
+            readings_df = self._transform_readings(readings, extracted_at)
+            floods_df = self._transform_floods(floods, extracted_at)
+            
+            # Save processed data
+            self.save_table("processed", stations_df, "stations")
+            self.save_table("processed", readings_df, "readings")
+            self.save_table("processed", floods_df, "floods")
+            
+            stage['rows'] = len(readings_df)
+            logging.info("Transformation complete")
+            return stations_df, readings_df, floods_df
+    
+    def _transform_stations(self, raw_stations, extracted_at=None):
+        """Transform stations data"""
+        return transform_stations(raw_stations, extracted_at)
+    
+    def _transform_readings(self, raw_readings, extracted_at=None):
+        """Transform readings data, dropping readings repeated within the pull"""
+        return drop_duplicate_readings(transform_readings(raw_readings, extracted_at))
+    
+    def _transform_floods(self, raw_floods, extracted_at=None):
+        """Transform floods data"""
+        return transform_floods(raw_floods, extracted_at)
+    
+    def extract_flood_areas(self):
+        """Extract flood areas and their reference coordinates to raw and processed"""
+        areas = self._extract_paginated_data("floodAreas", limit=500)
+        self._save_raw(areas, "flood_areas")
+        areas_df = transform_flood_areas(areas)
+        self.save_table("processed", areas_df, "flood_areas")
+        logging.info(f"Extracted {len(areas_df)} flood areas")
+        return areas_df
+    
+    def build_spatial_maps(self, k=5, max_km=None, area_km=10.0):
+        """Precompute station neighbour and station-to-flood-area tables
         
-        # Load raw data
-        stations = self._load_json(self.raw_dir / "stations.json")
-        readings = self._load_json(self.raw_dir / "readings.json")
-        floods = self._load_json(self.raw_dir / "floods.json")
+        Saved as processed/station_neighbours and, when processed/flood_areas
+        exists, processed/station_flood_areas.
+        """
+        index = StationIndex(self.load_table("processed", "stations"))
+        neighbours_df = index.neighbours(k, max_km)
+        self.save_table("processed", neighbours_df, "station_neighbours")
         
-        # Transform data
-        stations_df = self._transform_stations(stations)
-        readings_df = self._transform_readings(readings)
-        floods_df = self._transform_floods(floods)
+        areas_df = None
+        if self._layer_path("processed", "flood_areas").exists():
+            areas_df = index.flood_areas(self.load_table("processed", "flood_areas"), max_km=area_km)
+            self.save_table("processed", areas_df, "station_flood_areas")
         
-        # Save processed data
-        stations_df.to_csv(self.processed_dir / "stations.csv", index=False)
-        readings_df.to_csv(self.processed_dir / "readings.csv", index=False)
-        floods_df.to_csv(self.processed_dir / "floods.csv", index=False)
+        logging.info(f"Spatial maps built for {len(index)} stations")
+        return neighbours_df, areas_df
+    
+    def aggregate_warnings(self, windows=WARNING_WINDOWS, max_km=None, workers=None):
+        """Join flood warnings with readings of stations near their areas over pre-event windows
         
-        logging.info("Transformation complete")
-        return stations_df, readings_df, floods_df
+        Warnings are processed/floods plus, when the ingest service has
+        logged them, every warning version in raw/flood_changes.ndjson.
+        Stations come from processed/station_flood_areas (see
+        build_spatial_maps). Saved as features/warning_windows.
+        """
+        with self.metrics.stage("aggregate_warnings") as stage:
+            logging.info("Aggregating flood warnings against readings...")
+            
+            floods_df = self.load_table("processed", "floods")
+            history_path = self.raw_dir / "flood_changes.ndjson"
+            if history_path.exists():
+                history = load_raw_columns(history_path, RAW_FIELDS["floods"], INTERN_FIELDS["floods"])
+                floods_df = pd.concat([transform_floods(history), floods_df], ignore_index=True)
+            
+            windows_df = aggregate_warnings(
+                floods_df,
+                self.load_table("processed", "station_flood_areas"),
+                self.load_table("processed", "readings"),
+                windows=windows,
+                max_km=max_km,
+                workers=workers
+            )
+            self.save_table("features", windows_df, "warning_windows")
+            stage['rows'] = len(windows_df)
+            logging.info(f"Warning windows: {len(windows_df)} rows")
+            return windows_df
     
-    def _transform_stations(self, raw_stations):
-        """Transform stations data"""
-        transformed = []
-        for station in raw_stations:
-            transformed.append({
-                'station_id': station.get('@id', '').split('/')[-1],
-                'label': station.get('label'),
-                'river_name': station.get('riverName'),
-                'town': station.get('town'),
-                'lat': station.get('lat'),
-                'long': station.get('long'),
-                'status': station.get('status'),
-                'last_updated': datetime.now()
-            })
-        return pd.DataFrame(transformed)
-    
-    def _transform_readings(self, raw_readings):
-        """Transform readings data"""
-        transformed = []
-        for reading in raw_readings:
-            transformed.append({
-                'reading_id': reading.get('@id', '').split('/')[-1],
-                'station_id': reading.get('station', '').split('/')[-1],
-                'datetime': reading.get('dateTime'),
-                'value': reading.get('value'),
-                'unit': reading.get('unit'),
-                'parameter': reading.get('parameter'),
-                'qualifier': reading.get('qualifier'),
-                'extracted_at': datetime.now()
-            })
-        return pd.DataFrame(transformed)
-    
-    def _transform_floods(self, raw_floods):
-        """Transform floods data"""
-        transformed = []
-        for flood in raw_floods:
-            transformed.append({
-                'flood_id': flood.get('@id', '').split('/')[-1],
-                'severity': flood.get('severity'),
-                'description': flood.get('description'),
-                'is_active': flood.get('isActive', False),
-                'area_name': flood.get('floodArea', {}).get('name'),
-                'time_changed': flood.get('timeMessageChanged'),
-                'extracted_at': datetime.now()
-            })
-        return pd.DataFrame(transformed)
-    
-    def create_features(self):
-        """Create features for ML model"""
-        logging.info("Creating features...")
-        
-        # Load processed data
-        stations_df = pd.read_csv(self.processed_dir / "stations.csv")
-        readings_df = pd.read_csv(self.processed_dir / "readings.csv")
-        
-        # Merge data
-        merged = pd.merge(readings_df, stations_df, on='station_id', how='left')
-        
-        # Create time features
-        merged['datetime'] = pd.to_datetime(merged['datetime'])
-        merged['hour'] = merged['datetime'].dt.hour
-        merged['day_of_week'] = merged['datetime'].dt.dayofweek
-        merged['month'] = merged['datetime'].dt.month
-        merged['year'] = merged['datetime'].dt.year
-        
-        # Create lag features
-        merged.sort_values(['station_id', 'datetime'], inplace=True)
-        merged['value_lag_1'] = merged.groupby('station_id')['value'].shift(1)
-        merged['value_lag_24'] = merged.groupby('station_id')['value'].shift(24)
+    def create_features(self, incremental=False, neighbours=False):
+        """Create features for ML model
+        
+        With ``incremental=True`` only readings newer than the last processed
+        row of their series are featurized and appended to
+        data/features/incremental.
+        With ``neighbours=True`` the full build also gets neighbour-station
+        features from processed/station_neighbours (see build_spatial_maps).
+        """
+        with self.metrics.stage("create_features") as stage:
+            logging.info("Creating features...")
+            
+            # Load processed data
+            stations_df = self.load_table("processed", "stations")
+            readings_df = self.load_table("processed", "readings")
+            
+            if incremental:
+                store = IncrementalFeatureStore(self.features_dir / "incremental", self.backends["features"])
+                features_df = store.update(readings_df, stations_df)
+                stage['rows'] = len(features_df)
+                logging.info(f"Features created for {len(features_df)} new readings")
+                return features_df
+            
+            features_df = self._build_features(stations_df, readings_df, neighbours)
+            stage['rows'] = len(features_df)
+            logging.info("Features created")
+            return features_df
+    
+    def _build_features(self, stations_df, readings_df, neighbours=False):
+        """Build the full feature table and save it to features/features"""
+        features_df = build_features(readings_df, stations_df)
+        if neighbours:
+            neighbours_df = self.load_table("processed", "station_neighbours")
+            add_neighbour_features(features_df, neighbours_df)
         
         # Save features
-        merged.to_csv(self.features_dir / "features.csv", index=False)
+        self.save_table("features", features_df, "features")
+        return features_df
+    
+    def create_features_out_of_core(self, chunk_rows=1_000_000, workers=None):
+        """Create features partition by partition for readings larger than memory
+        
+        Output goes to data/features/partitioned as one part per partition.
+        """
+        with self.metrics.stage("create_features_out_of_core") as stage:
+            logging.info("Creating features out of core...")
+            
+            stations_df = self.load_table("processed", "stations")
+            readings_path = self._layer_path("processed", "readings")
+            chunks = self.backends["processed"].iter_chunks(readings_path, chunk_rows)
+            
+            parts = build_features_out_of_core(
+                chunks,
+                stations_df,
+                self.features_dir / "partitioned",
+                backend_name=self.storage["features"],
+                chunk_rows=chunk_rows,
+                workers=workers
+            )
+            
+            stage['rows'] = sum(rows for _, rows in parts)
+            logging.info(f"Features created: {stage['rows']} rows in {len(parts)} parts")
+            return parts
+    
+    def _layer_path(self, layer, name):
+        """Path of a dataset in a layer, with the extension of that layer's backend"""
+        return self.layer_dirs[layer] / f"{name}{self.backends[layer].extension}"
+    
+    def _save_raw(self, records, name):
+        """Save raw API records"""
+        path = self._layer_path("raw", name)
+        self.backends["raw"].save(records, path)
+        self.catalog.record_records(path, records)
+    
+    def _load_raw(self, name):
+        """Load a raw dataset written by extract"""
+        return self.backends["raw"].load(self._layer_path("raw", name))
+    
+    def _load_raw_for_transform(self, name):
+        """Stream a raw dataset into the compact form its transform reads
         
-        logging.info("Features created")
-        return merged
+        Readings become a dictionary-encoded ReadingBatch, and every other
+        dataset becomes Columns holding only the fields its transform reads.
+        """
+        path = self._layer_path("raw", name)
+        if name == "readings":
+            return ReadingBatch.read_raw(path)
+        return load_raw_columns(path, RAW_FIELDS[name], INTERN_FIELDS[name])
     
-    def _save_json(self, data, filepath):
-        """Save data as JSON"""
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+    def save_table(self, layer, df, name):
+        """Save a table to the processed or features layer"""
+        path = self._layer_path(layer, name)
+        self.backends[layer].save(df, path)
+        self.catalog.record_frame(path, df)
     
-    def _load_json(self, filepath):
-        """Load data from JSON"""
-        with open(filepath, 'r') as f:
-            return json.load(f)
+    def load_table(self, layer, name, columns=None):
+        """Load a table, or only some of its columns, from the processed or features layer"""
+        return self.backends[layer].load(self._layer_path(layer, name), columns=columns)
+    
+    def build_dag(self, max_workers=4):
+        """The pipeline as a DAG with one task per dataset
+        
+        The three API pulls run concurrently and always run; each transform
+        starts as soon as its own raw file is ready and is skipped, like
+        create_features, when its inputs are unchanged since the last run.
+        """
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=90)
+        extracted_at = datetime.now()
+        # data/raw and data/processed are versioned in git, so DVC tracks the
+        # features layer (data/features.dvc), created on the first run
+        dag = PipelineDAG(self.data_dir / ".pipeline_state.json", max_workers, self.metrics,
+                          dvc_roots=[self.features_dir])
+        
+        pulls = {
+            "stations": (None, 500),
+            "readings": (self._readings_params(start_date, end_date), 1000),
+            "floods": (None, 500),
+        }
+        transforms = {
+            "stations": self._transform_stations,
+            "readings": self._transform_readings,
+            "floods": self._transform_floods,
+        }
+        for name, (params, limit) in pulls.items():
+            dag.add(f"extract_{name}", partial(self._extract_task, name, params, limit),
+                    outputs=[self._layer_path("raw", name)], always=True)
+            dag.add(f"transform_{name}", partial(self._transform_task, name, transforms[name], extracted_at),
+                    inputs=[self._layer_path("raw", name)], outputs=[self._layer_path("processed", name)])
+        
+        dag.add("create_features", self._features_task,
+                inputs=[self._layer_path("processed", "stations"), self._layer_path("processed", "readings")],
+                outputs=[self._layer_path("features", "features")])
+        return dag
+    
+    def _extract_task(self, name, params, limit):
+        return len(self._extract_dataset(name, params, limit))
+    
+    def _transform_task(self, name, transform, extracted_at):
+        df = transform(self._load_raw_for_transform(name), extracted_at)
+        self.save_table("processed", df, name)
+        return len(df)
+    
+    def _features_task(self):
+        stations_df = self.load_table("processed", "stations")
+        readings_df = self.load_table("processed", "readings")
+        return len(self._build_features(stations_df, readings_df))
+    
+    def run_dag(self, targets=None, force=False, max_workers=4):
+        """Run the pipeline DAG, or only ``targets`` and their upstream tasks
+        
+        Returns each task's status ("ran", "skipped", "failed" or "blocked").
+        """
+        logging.info("🚀 Starting ETL Pipeline (DAG)")
+        try:
+            status = self.build_dag(max_workers).run(targets, force)
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+            json_path, _ = self.metrics.write(self.metrics_dir)
+            logging.info(f"Pipeline metrics written to {json_path}")
+        
+        logging.info(f"✅ ETL Pipeline Complete: {status}")
+        return status
     
     def run_pipeline(self):
         """Run complete ETL pipeline"""
         logging.info("🚀 Starting ETL Pipeline")
         
         # Run all steps
-        self.extract()
-        self.transform()
-        features_df = self.create_features()
+        try:
+            self.extract()
+            self.transform()
+            features_df = self.create_features()
+        finally:
+            # Written even for a failed run, to show where it stopped
+            json_path, _ = self.metrics.write(self.metrics_dir)
+            logging.info(f"Pipeline metrics written to {json_path}")
         
         logging.info("✅ ETL Pipeline Complete")
         return features_df
 
 # For direct execution
 if __name__ == "__main__":
-    etl = FloodETL()
+    # FLOOD_ETL_PROFILE=cprofile or sample profiles each stage into data/metrics
+    etl = FloodETL(profile=os.environ.get("FLOOD_ETL_PROFILE"))
     etl.run_pipeline()
\ No newline at end of file
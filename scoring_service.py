@@ -0,0 +1,245 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from train_model import POOLED, STATION_MODEL_DIR, _decision, score_by_station, station_model_path
+
+
+class ModelCache:
+    """LRU-bounded warm cache of per-station models saved by save_station_models
+
+    The pooled model is loaded once and always kept; station models are
+    loaded on first use and the least recently used are dropped once more
+    than ``max_models`` are held.
+    """
+
+    def __init__(self, directory=STATION_MODEL_DIR, max_models=256):
+        import joblib
+
+        self.joblib = joblib
+        self.directory = Path(directory)
+        self.max_models = max_models
+        self.base = joblib.load(self.directory / "_pooled.joblib")
+        self.models = OrderedDict()
+        self.missing = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, station):
+        """A station's model, or None if it has none and the pooled model applies"""
+        with self.lock:
+            model = self.models.get(station)
+            if model is not None:
+                self.models.move_to_end(station)
+                self.hits += 1
+                return model
+            if station in self.missing:
+                self.hits += 1
+                return None
+
+        path = station_model_path(self.directory, station)
+        model = self.joblib.load(path) if path.exists() else None
+        with self.lock:
+            self.misses += 1
+            if model is None:
+                self.missing.add(station)
+                return None
+            self.models[station] = model
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+                self.evictions += 1
+        return model
+
+    def stats(self):
+        return {
+            'loaded': len(self.models),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class MicroBatcher:
+    """Collect concurrent scoring requests into one batch
+
+    A batch closes when it holds ``max_batch_rows`` rows or ``max_wait``
+    seconds after its first request, whichever comes first; it is then
+    scored with one call and each request's future gets its slice.
+    """
+
+    def __init__(self, score_batch, max_batch_rows=4096, max_wait=0.005):
+        self.score_batch = score_batch
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batch_sizes = deque(maxlen=10_000)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, df):
+        future = Future()
+        self.requests.put((df, future))
+        return future
+
+    def _run(self):
+        while self.running:
+            try:
+                first = self.requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+
+            batch = [first]
+            rows = len(first[0])
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.running = False
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            self.batch_sizes.append(rows)
+            try:
+                frames = [df for df, _ in batch]
+                scores = self.score_batch(pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0])
+                start = 0
+                for df, future in batch:
+                    future.set_result(scores[start:start + len(df)])
+                    start += len(df)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def close(self):
+        self.running = False
+        self.requests.put(None)
+        self.thread.join()
+
+
+class ScoringService:
+    """Online anomaly scoring over feature rows shaped like create_features output
+
+    Requests are micro-batched and scored with warm per-station models.
+    ``anomaly_score`` is the negated SVM decision function, so higher means
+    more anomalous and values above 0 are flagged.
+    """
+
+    def __init__(self, model_dir=STATION_MODEL_DIR, max_models=256, max_batch_rows=4096, max_wait_ms=5.0):
+        self.cache = ModelCache(model_dir, max_models)
+        self.batcher = MicroBatcher(self._score_batch, max_batch_rows, max_wait_ms / 1000)
+        self.latencies = deque(maxlen=10_000)
+        self.rows_scored = 0
+
+    def _score_batch(self, df):
+        base = self.cache.base
+        X = base._matrix(df)
+        if not base.per_station or 'station_id' not in df:
+            return -_decision(base.models[POOLED], X)
+        return -score_by_station(X, df['station_id'], self.cache.get, base.models[POOLED])
+
+    def score(self, rows, timeout=30):
+        """Score a DataFrame or list of feature dicts; returns anomaly scores"""
+        start = time.perf_counter()
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows)
+        scores = self.batcher.submit(df).result(timeout)
+        self.latencies.append(time.perf_counter() - start)
+        self.rows_scored += len(df)
+        return scores
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        batch_sizes = np.array(self.batcher.batch_sizes)
+        return {
+            'requests': len(latencies),
+            'rows_scored': self.rows_scored,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'mean_batch_rows': float(batch_sizes.mean()) if len(batch_sizes) else None,
+            'models': self.cache.stats(),
+        }
+
+    def close(self):
+        self.batcher.close()
+
+
+def make_scoring_server(service, host="127.0.0.1", port=8766):
+    """HTTP API: POST /score with {"rows": [...]}, GET /stats"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, body, status=200):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self._send_json(service.stats())
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/score':
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                rows = json.loads(self.rfile.read(length))['rows']
+                scores = service.score(rows)
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json({'error': str(e)}, status=400)
+                return
+            self._send_json({
+                'anomaly_score': [float(score) for score in scores],
+                'is_anomaly': [bool(score > 0) for score in scores],
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_scoring(model_dir=STATION_MODEL_DIR, host="127.0.0.1", port=8766):
+    """Run the scoring service until interrupted"""
+    service = ScoringService(model_dir)
+    server = make_scoring_server(service, host, port)
+    logging.info(f"Scoring service on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        logging.info(f"Scoring service stopped: {service.stats()}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    serve_scoring()
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _coordinate(series):
+    """Numeric coordinate column; a few stations report a list of positions, use the first"""
+    first = series.map(lambda value: value[0] if isinstance(value, list) and value else value)
+    return pd.to_numeric(first, errors='coerce').to_numpy(dtype=float)
+
+
+class PointIndex:
+    """Ball tree (haversine) over a set of points for k-nearest, radius and bounding-box queries
+
+    ``df`` needs an id column plus ``lat``/``long`` in degrees; rows without
+    coordinates are left out. Bounding boxes use a latitude-sorted copy of
+    the points, so a query is two binary searches and a longitude filter.
+    """
+
+    def __init__(self, df, id_column):
+        lat, long = _coordinate(df['lat']), _coordinate(df['long'])
+        valid = ~(np.isnan(lat) | np.isnan(long))
+        self.ids = df[id_column].to_numpy(dtype=object)[valid]
+        self.lat, self.long = lat[valid], long[valid]
+        self.tree = BallTree(np.radians(np.column_stack([self.lat, self.long])), metric='haversine')
+
+        self.lat_order = np.argsort(self.lat, kind='mergesort')
+        self.sorted_lat = self.lat[self.lat_order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _query_points(lat, long):
+        return np.radians(np.column_stack([np.atleast_1d(lat), np.atleast_1d(long)]))
+
+    def nearest(self, lat, long, k=5):
+        """The k nearest points to one location, closest first, as (ids, distances in km)"""
+        k = min(k, len(self))
+        distances, positions = self.tree.query(self._query_points(lat, long), k=k)
+        return self.ids[positions[0]], distances[0] * EARTH_RADIUS_KM
+
+    def nearest_many(self, lats, longs, k=1):
+        """Vectorized k-nearest for many locations: (positions, distances in km), each (n, k)"""
+        k = min(k, len(self))
+        distances, positions = self.tree.query(self._query_points(lats, longs), k=k)
+        return positions, distances * EARTH_RADIUS_KM
+
+    def within(self, lat, long, radius_km):
+        """Points within radius_km of a location, closest first, as (ids, distances in km)"""
+        positions, distances = self.tree.query_radius(
+            self._query_points(lat, long), r=radius_km / EARTH_RADIUS_KM,
+            return_distance=True, sort_results=True
+        )
+        return self.ids[positions[0]], distances[0] * EARTH_RADIUS_KM
+
+    def bbox(self, min_lat, min_long, max_lat, max_long):
+        """Ids of points inside a latitude/longitude box"""
+        lo = np.searchsorted(self.sorted_lat, min_lat, side='left')
+        hi = np.searchsorted(self.sorted_lat, max_lat, side='right')
+        candidates = self.lat_order[lo:hi]
+        long = self.long[candidates]
+        return self.ids[candidates[(long >= min_long) & (long <= max_long)]]
+
+
+class StationIndex(PointIndex):
+    """Spatial index over processed stations"""
+
+    def __init__(self, stations_df):
+        super().__init__(stations_df, 'station_id')
+        self.rivers = None
+        if 'river_name' in stations_df:
+            river = stations_df.drop_duplicates('station_id').set_index('station_id')['river_name']
+            self.rivers = river.reindex(self.ids).to_numpy(dtype=object)
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, usecols=lambda c: c in {'station_id', 'lat', 'long', 'river_name'}))
+
+    def neighbours(self, k=5, max_km=None):
+        """Each station's k nearest other stations
+
+        One batched tree query for all stations instead of a pairwise join.
+        Returns station_id, neighbour_id, rank (1 = closest), distance_km
+        and same_river.
+        """
+        positions, distances = self.nearest_many(self.lat, self.long, k + 1)
+        source = np.repeat(np.arange(len(self)), positions.shape[1])
+        target = positions.ravel()
+        distance = distances.ravel()
+
+        # Drop each station itself (normally rank 0, but co-located stations can swap)
+        keep = target != source
+        if max_km is not None:
+            keep &= distance <= max_km
+        source, target, distance = source[keep], target[keep], distance[keep]
+        rank = pd.Series(source).groupby(source).cumcount().to_numpy() + 1
+        keep = rank <= k
+
+        neighbours = pd.DataFrame({
+            'station_id': self.ids[source[keep]],
+            'neighbour_id': self.ids[target[keep]],
+            'rank': rank[keep],
+            'distance_km': distance[keep],
+        })
+        if self.rivers is not None:
+            same = self.rivers[source[keep]] == self.rivers[target[keep]]
+            neighbours['same_river'] = same & pd.notna(self.rivers[source[keep]])
+        return neighbours
+
+    def flood_areas(self, areas_df, k=3, max_km=10.0):
+        """Nearest flood areas to each station by area reference point
+
+        Returns station_id, area_id, rank and distance_km for up to k areas
+        within max_km of each station.
+        """
+        areas = PointIndex(areas_df, 'area_id')
+        positions, distances = areas.nearest_many(self.lat, self.long, k)
+        pairs = pd.DataFrame({
+            'station_id': np.repeat(self.ids, positions.shape[1]),
+            'area_id': areas.ids[positions.ravel()],
+            'rank': np.tile(np.arange(1, positions.shape[1] + 1), len(self)),
+            'distance_km': distances.ravel(),
+        })
+        return pairs[pairs['distance_km'] <= max_km].reset_index(drop=True)
@@ -0,0 +1,96 @@
+import json
+
+import pandas as pd
+
+from streaming import NDJSONPageWriter, iter_ndjson
+
+# Low-cardinality string columns stored dictionary-encoded by columnar backends
+CATEGORICAL_COLUMNS = ['station_id', 'unit', 'parameter', 'qualifier']
+
+
+class JSONBackend:
+    """Raw records as a single indented JSON array"""
+    extension = ".json"
+
+    def save(self, records, path):
+        with open(path, 'w') as f:
+            json.dump(records, f, indent=2)
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+
+class NDJSONBackend:
+    """Raw records as newline-delimited JSON, written page by page"""
+    extension = ".ndjson"
+
+    def writer(self, path):
+        return NDJSONPageWriter(path)
+
+    def save(self, records, path):
+        with self.writer(path) as writer:
+            writer.write_page(records)
+
+    def load(self, path):
+        return list(iter_ndjson(path))
+
+
+class CSVBackend:
+    """Tables as CSV text"""
+    extension = ".csv"
+
+    def save(self, df, path):
+        df.to_csv(path, index=False)
+
+    def load(self, path, columns=None):
+        return pd.read_csv(path, usecols=columns)
+
+    def iter_chunks(self, path, chunk_rows, columns=None):
+        """Yield the table in DataFrames of at most chunk_rows rows"""
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+class ParquetBackend:
+    """Tables as typed, compressed Parquet with categorical string columns"""
+    extension = ".parquet"
+
+    def __init__(self, compression="zstd"):
+        self.compression = compression
+
+    def save(self, df, path):
+        df = df.copy()
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns and pd.api.types.is_string_dtype(df[column]):
+                df[column] = df[column].astype('category')
+        df.to_parquet(path, engine="pyarrow", compression=self.compression, index=False)
+
+    def load(self, path, columns=None):
+        return pd.read_parquet(path, engine="pyarrow", columns=columns, memory_map=True)
+
+    def iter_chunks(self, path, chunk_rows, columns=None):
+        """Yield the table in DataFrames of at most chunk_rows rows"""
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+
+
+RAW_BACKENDS = {
+    "json": JSONBackend,
+    "ndjson": NDJSONBackend,
+}
+
+TABLE_BACKENDS = {
+    "csv": CSVBackend,
+    "parquet": ParquetBackend,
+}
+
+
+def get_backend(layer, name):
+    """Instantiate the storage backend called ``name`` for a data layer"""
+    backends = RAW_BACKENDS if layer == "raw" else TABLE_BACKENDS
+    if name not in backends:
+        raise ValueError(f"Unknown {layer} storage backend '{name}', expected one of {sorted(backends)}")
+    return backends[name]()
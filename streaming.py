@@ -0,0 +1,115 @@
+import csv
+import json
+import os
+
+from decoding import loads
+
+
+class NDJSONPageWriter:
+    """Append pages of records to an NDJSON file as they arrive
+
+    Only the current page is ever held in memory. Field names are tracked in
+    first-seen order as new keys show up and written to a ``.schema.json``
+    sidecar on close, so CSV headers can be produced without re-reading.
+
+    ``resume`` takes a checkpoint as returned by ``position()``: the file is
+    cut back to that point, dropping any page written after it, and writing
+    continues from there.
+    """
+
+    def __init__(self, path, append=False, resume=None):
+        self.path = str(path)
+        self.schema_path = f"{self.path}.schema.json"
+        self.fieldnames = {}
+        self.rows = 0
+
+        if resume is not None:
+            with open(self.path, 'r+b') as f:
+                f.truncate(resume['bytes'])
+            self.fieldnames = dict.fromkeys(resume['fields'])
+            self.rows = resume['rows']
+            append = True
+        elif append and os.path.exists(self.schema_path):
+            schema = read_schema(self.path)
+            self.fieldnames = dict.fromkeys(schema['fields'])
+            self.rows = schema['rows']
+
+        self.file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+
+    def write_page(self, items):
+        """Write one page of records and flush it to disk"""
+        for item in items:
+            self.fieldnames.update(dict.fromkeys(item))
+            self.file.write(json.dumps(item))
+            self.file.write('\n')
+        self.file.flush()
+        self.rows += len(items)
+
+    def position(self):
+        """Sync to disk and return what is needed to resume after this page"""
+        os.fsync(self.file.fileno())
+        return {'bytes': self.file.tell(), 'rows': self.rows, 'fields': list(self.fieldnames)}
+
+    def close(self):
+        self.file.close()
+        with open(self.schema_path, 'w') as f:
+            json.dump({'fields': list(self.fieldnames), 'rows': self.rows}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NDJSONDataset:
+    """Lazy, re-iterable view over an NDJSON file written by NDJSONPageWriter"""
+
+    def __init__(self, path, rows=None):
+        self.path = str(path)
+        self.rows = rows
+
+    def __len__(self):
+        if self.rows is None:
+            self.rows = read_schema(self.path)['rows']
+        return self.rows
+
+    def __iter__(self):
+        return iter_ndjson(self.path)
+
+
+def read_schema(path):
+    """Read the schema sidecar written alongside an NDJSON file"""
+    with open(f"{path}.schema.json", 'r') as f:
+        return json.load(f)
+
+
+def iter_ndjson(path):
+    """Yield records from an NDJSON file one at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def ndjson_to_csv(ndjson_path, csv_path, fieldnames, time_field=None):
+    """Convert an NDJSON file to CSV in a single streaming pass
+
+    Returns the row count and the min and max of ``time_field`` (compared as
+    ISO strings), gathered on the way so the CSV never has to be re-read.
+    """
+    rows = 0
+    first = last = None
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for record in iter_ndjson(ndjson_path):
+            writer.writerow(record)
+            rows += 1
+            value = record.get(time_field) if time_field else None
+            if value:
+                if first is None or value < first:
+                    first = value
+                if last is None or value > last:
+                    last = value
+    return rows, first, last
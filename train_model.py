@@ -1,3 +1,254 @@
-import mlflow as ml
-from sklearn.svm import OneClassSVM
-import tensorflow as tf
+import copy
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+# scikit-learn, joblib and mlflow are imported where they are used so that
+# importing this module (e.g. for the scoring service) stays fast
+
+FEATURE_COLUMNS = [
+    'value', 'value_lag_1', 'value_lag_24',
+    'value_mean_6h', 'value_std_6h', 'value_max_24h',
+    'rate_of_rise_1h', 'rate_of_rise_6h',
+    'hour',
+]
+POOLED = "__pooled__"
+MODEL_PATH = Path("models") / "anomaly_model.joblib"
+STATION_MODEL_DIR = Path("models") / "anomaly_model"
+
+
+def station_model_path(directory, station):
+    return Path(directory) / "stations" / f"{quote(str(station), safe='')}.joblib"
+
+
+class AnomalyModel:
+    """OneClassSVM anomaly detector per station, with a pooled fallback
+
+    Stations with at least ``min_station_rows`` training rows get their own
+    scaler and model; all others are scored by a model fitted on a sample of
+    every station. Missing feature values are filled with training medians.
+    ``score`` returns the SVM decision function, negative for anomalies.
+    """
+
+    def __init__(self, feature_columns=FEATURE_COLUMNS, per_station=True, nu=0.01, gamma='scale',
+                 min_station_rows=200, max_train_rows=2000, seed=0):
+        self.feature_columns = list(feature_columns)
+        self.per_station = per_station
+        self.nu = nu
+        self.gamma = gamma
+        self.min_station_rows = min_station_rows
+        self.max_train_rows = max_train_rows
+        self.seed = seed
+        self.medians = None
+        self.models = {}
+
+    def _matrix(self, df):
+        """Feature matrix with missing values filled from the training medians"""
+        X = df.reindex(columns=self.feature_columns).to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.take(self.medians, np.nonzero(missing)[1])
+        return X
+
+    def _fit_one(self, X, rng):
+        from sklearn.svm import OneClassSVM
+
+        if len(X) > self.max_train_rows:
+            X = X[rng.choice(len(X), self.max_train_rows, replace=False)]
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1.0
+        svm = OneClassSVM(nu=self.nu, gamma=self.gamma).fit((X - mean) / scale)
+        return mean, scale, svm
+
+    def fit(self, features_df):
+        """Fit the pooled model and, if per_station, one model per large-enough station"""
+        rng = np.random.default_rng(self.seed)
+        raw = features_df.reindex(columns=self.feature_columns).to_numpy(dtype=np.float64, na_value=np.nan)
+        self.medians = np.nan_to_num(np.nanmedian(raw, axis=0))
+        X = self._matrix(features_df)
+
+        self.models = {POOLED: self._fit_one(X, rng)}
+        if self.per_station:
+            codes, stations = pd.factorize(features_df['station_id'])
+            order = np.argsort(codes, kind='mergesort')
+            bounds = np.searchsorted(codes[order], np.arange(len(stations) + 1))
+            for code, station in enumerate(stations):
+                rows = order[bounds[code]:bounds[code + 1]]
+                if len(rows) >= self.min_station_rows:
+                    self.models[station] = self._fit_one(X[rows], rng)
+        return self
+
+    def score(self, features_df):
+        """Decision scores for feature rows, one vectorized call per station"""
+        X = self._matrix(features_df)
+        if not self.per_station:
+            return _decision(self.models[POOLED], X)
+        return score_by_station(X, features_df['station_id'], self.models.get, self.models[POOLED])
+
+    def predict(self, features_df):
+        """True where a row is scored as anomalous"""
+        return self.score(features_df) < 0
+
+    def save(self, path=MODEL_PATH):
+        import joblib
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self, path)
+        return path
+
+    def save_station_models(self, directory=STATION_MODEL_DIR):
+        """Save the pooled model and one file per station model, for loading on demand"""
+        import joblib
+
+        directory = Path(directory)
+        (directory / "stations").mkdir(parents=True, exist_ok=True)
+        pooled_only = copy.copy(self)
+        pooled_only.models = {POOLED: self.models[POOLED]}
+        joblib.dump(pooled_only, directory / "_pooled.joblib")
+        for station, model in self.models.items():
+            if station != POOLED:
+                joblib.dump(model, station_model_path(directory, station))
+        return directory
+
+    @staticmethod
+    def load(path=MODEL_PATH):
+        import joblib
+
+        return joblib.load(path)
+
+    def log_to_mlflow(self, path, metrics=None, run_name="anomaly_model"):
+        """Log parameters, metrics and the saved model file to MLflow"""
+        import mlflow
+
+        with mlflow.start_run(run_name=run_name):
+            mlflow.log_params({
+                'per_station': self.per_station,
+                'nu': self.nu,
+                'gamma': self.gamma,
+                'min_station_rows': self.min_station_rows,
+                'max_train_rows': self.max_train_rows,
+                'station_models': len(self.models) - 1,
+            })
+            if metrics:
+                mlflow.log_metrics(metrics)
+            mlflow.log_artifact(str(path))
+
+
+def _decision(model, X):
+    mean, scale, svm = model
+    return svm.decision_function((X - mean) / scale)
+
+
+def score_by_station(X, station_ids, get_model, pooled):
+    """Score matrix rows with one decision_function call per station
+
+    ``get_model(station)`` returns a station's (mean, scale, svm) or None;
+    rows of stations without a model, or without a station, share one call
+    to the ``pooled`` model.
+    """
+    scores = np.empty(len(X))
+    codes, stations = pd.factorize(station_ids)
+    order = np.argsort(codes, kind='mergesort')
+    bounds = np.searchsorted(codes[order], np.arange(len(stations) + 1))
+    pooled_rows = [np.flatnonzero(codes < 0)]
+    for code, station in enumerate(stations):
+        rows = order[bounds[code]:bounds[code + 1]]
+        model = get_model(station)
+        if model is not None:
+            scores[rows] = _decision(model, X[rows])
+        else:
+            pooled_rows.append(rows)
+    rows = np.concatenate(pooled_rows)
+    if len(rows):
+        scores[rows] = _decision(pooled, X[rows])
+    return scores
+
+
+# Set in each scoring worker process by _init_scoring_worker
+_worker_state = {}
+
+
+def _init_scoring_worker(model_path):
+    """Load the model once per worker process"""
+    _worker_state['model'] = AnomalyModel.load(model_path)
+
+
+def _score_chunk(features_df):
+    return _worker_state['model'].score(features_df)
+
+
+def score_parallel(model_path, features_df, workers=None, chunks_per_worker=4):
+    """Score feature rows across a process pool, split by whole stations
+
+    Each worker loads the saved model once. Rows are grouped into chunks of
+    whole stations of roughly equal size, so every station is still scored
+    with one vectorized call. Returns scores in the input row order.
+    """
+    if not len(features_df):
+        # No rows to cut into chunks, nor to start a pool for
+        return np.empty(0)
+    workers = workers or os.cpu_count() or 1
+    codes, _ = pd.factorize(features_df['station_id'])
+    order = np.argsort(codes, kind='mergesort')
+    # Cut the station-sorted rows into chunks, moving each cut to a station boundary
+    sorted_codes = codes[order]
+    cuts = np.linspace(0, len(order), workers * chunks_per_worker + 1).astype(int)[1:-1]
+    cuts = np.unique(np.searchsorted(sorted_codes, sorted_codes[cuts], side='left'))
+    pieces = [rows for rows in np.split(order, cuts) if len(rows)]
+
+    # Only ship the columns the model reads
+    feature_columns = AnomalyModel.load(model_path).feature_columns
+    features_df = features_df[['station_id'] + [c for c in feature_columns if c in features_df.columns]]
+
+    scores = np.empty(len(features_df))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker,
+                             initargs=(str(model_path),)) as pool:
+        results = pool.map(_score_chunk, [features_df.iloc[rows] for rows in pieces])
+        for rows, chunk_scores in zip(pieces, results):
+            scores[rows] = chunk_scores
+    return scores
+
+
+def train_and_score(features_df=None, model_path=MODEL_PATH, per_station=True, workers=None, use_mlflow=True,
+                    station_model_dir=None):
+    """Train on the create_features output, save the model and score every row
+
+    The per-station files for the scoring service go to
+    ``station_model_dir``, by default ``model_path`` without its suffix
+    (models/anomaly_model.joblib -> STATION_MODEL_DIR).
+    """
+    if station_model_dir is None:
+        station_model_dir = Path(model_path).with_suffix('')
+    if features_df is None:
+        from run_etl import FloodETL
+        features_df = FloodETL().load_table("features", "features")
+
+    logging.info(f"Training anomaly model on {len(features_df)} feature rows...")
+    model = AnomalyModel(per_station=per_station).fit(features_df)
+    model.save(model_path)
+    model.save_station_models(station_model_dir)
+
+    scores = score_parallel(model_path, features_df, workers)
+    anomaly_rate = float((scores < 0).mean()) if len(scores) else 0.0
+    logging.info(f"Saved {len(model.models) - 1} station models to {model_path} and {station_model_dir}; "
+                 f"anomaly rate {anomaly_rate:.3%}")
+
+    if use_mlflow:
+        try:
+            model.log_to_mlflow(model_path, {'anomaly_rate': anomaly_rate, 'rows': len(features_df)})
+        except ImportError:
+            logging.warning("mlflow is not installed; skipping experiment logging")
+
+    return model, scores
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    train_and_score()
@@ -0,0 +1,157 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from decoding import Columns
+from reading_batch import ReadingBatch
+
+# Raw API fields each transform reads; decoders may drop every other field
+STATION_FIELDS = ['@id', 'label', 'riverName', 'town', 'lat', 'long', 'status']
+READING_FIELDS = ['@id', 'station', 'measure', 'dateTime', 'value', 'unit', 'parameter', 'qualifier']
+FLOOD_FIELDS = ['@id', 'severity', 'description', 'isActive', 'floodArea', 'floodAreaID', 'timeRaised',
+                'timeMessageChanged']
+FLOOD_AREA_FIELDS = ['@id', 'notation', 'label', 'riverOrSea', 'lat', 'long']
+
+RAW_FIELDS = {
+    'stations': STATION_FIELDS,
+    'readings': READING_FIELDS,
+    'floods': FLOOD_FIELDS,
+    'flood_areas': FLOOD_AREA_FIELDS,
+}
+
+# String fields repeated across records, worth interning while decoding
+INTERN_FIELDS = {
+    'stations': ['riverName', 'town', 'status'],
+    'readings': ['station', 'measure', 'dateTime', 'unit', 'parameter', 'qualifier'],
+    'floods': ['severity'],
+    'flood_areas': ['riverOrSea'],
+}
+
+
+def _frame(records, keys):
+    """Build a DataFrame holding only ``keys`` from a list of API records or Columns"""
+    if isinstance(records, Columns):
+        missing = [None] * len(records)
+        return pd.DataFrame({key: records.data.get(key, missing) for key in keys}, columns=keys)
+    if not isinstance(records, list):
+        records = list(records)
+    return pd.DataFrame.from_records(records, columns=keys)
+
+
+def _last_segment(series):
+    """Last path segment of each URL, '' where the URL is missing"""
+    # Repeated URLs (stations, measures) are only split once per distinct value
+    codes, uniques = pd.factorize(series)
+    segments = pd.Series(uniques, dtype=object).astype(str).str.replace(r'^.*/', '', regex=True)
+    # Missing values get code -1, which picks the trailing ''
+    lookup = np.append(segments.to_numpy(dtype=object), '')
+    return pd.Series(lookup[codes], index=series.index, dtype=object)
+
+
+def _stamp(extracted_at):
+    return pd.Timestamp(extracted_at if extracted_at is not None else datetime.now())
+
+
+def transform_stations(raw_stations, extracted_at=None):
+    """Transform stations data"""
+    raw = _frame(raw_stations, STATION_FIELDS)
+    return pd.DataFrame({
+        'station_id': _last_segment(raw['@id']),
+        'label': raw['label'],
+        'river_name': raw['riverName'],
+        'town': raw['town'],
+        'lat': raw['lat'],
+        'long': raw['long'],
+        'status': raw['status'],
+        'last_updated': _stamp(extracted_at)
+    })
+
+
+def _transform_reading_batch(batch, extracted_at):
+    """transform_readings for a ReadingBatch, mapping dictionaries instead of every row"""
+    frame = batch.to_frame()
+
+    def ids(column):
+        return frame[column].cat.add_categories('').fillna('').astype(object)
+
+    def labels(column):
+        # Missing values (code -1) stay NaN, and the dtype is inferred as for records
+        categorical = frame[column]
+        lookup = np.append(categorical.cat.categories.to_numpy(dtype=object), np.nan)
+        return pd.Series(lookup[categorical.cat.codes.to_numpy()], dtype=object).infer_objects()
+
+    reading_id = pd.Series(batch.date_strings(), dtype=object)
+    reading_id[frame['measure_id'].isna()] = None
+    return pd.DataFrame({
+        'reading_id': reading_id.fillna(''),
+        'station_id': ids('station_id'),
+        'measure_id': ids('measure_id'),
+        'datetime': frame['datetime'],
+        'value': frame['value'],
+        'unit': labels('unit'),
+        'parameter': labels('parameter'),
+        'qualifier': labels('qualifier'),
+        'extracted_at': _stamp(extracted_at)
+    })
+
+
+def transform_readings(raw_readings, extracted_at=None):
+    """Transform readings data, parsing dateTime to a UTC datetime column
+
+    ``raw_readings`` is a list of records, Columns or a ReadingBatch.
+    """
+    if isinstance(raw_readings, ReadingBatch):
+        return _transform_reading_batch(raw_readings, extracted_at)
+    raw = _frame(raw_readings, READING_FIELDS)
+    return pd.DataFrame({
+        'reading_id': _last_segment(raw['@id']),
+        'station_id': _last_segment(raw['station']),
+        'measure_id': _last_segment(raw['measure']),
+        'datetime': pd.to_datetime(raw['dateTime'], utc=True, format='ISO8601', errors='coerce'),
+        'value': raw['value'],
+        'unit': raw['unit'],
+        'parameter': raw['parameter'],
+        'qualifier': raw['qualifier'],
+        'extracted_at': _stamp(extracted_at)
+    })
+
+
+def drop_duplicate_readings(readings_df):
+    """One row per (measure_id, datetime), keeping the last pulled
+
+    Overlapping pulls and pages shifting while an endpoint is paged both
+    repeat readings; the last copy carries any revised value.
+    """
+    return readings_df.drop_duplicates(['measure_id', 'datetime'], keep='last', ignore_index=True)
+
+
+def transform_floods(raw_floods, extracted_at=None):
+    """Transform floods data, keeping the flood area id that links a warning to stations"""
+    raw = _frame(raw_floods, FLOOD_FIELDS)
+    area = raw['floodArea'].astype(object)
+    return pd.DataFrame({
+        'flood_id': _last_segment(raw['@id']),
+        'severity': raw['severity'],
+        'description': raw['description'],
+        'is_active': raw['isActive'].fillna(False).astype(bool),
+        'area_name': area.str.get('name'),
+        'area_id': raw['floodAreaID'].where(raw['floodAreaID'].notna(), area.str.get('notation')),
+        'time_raised': raw['timeRaised'],
+        'time_changed': raw['timeMessageChanged'],
+        'extracted_at': _stamp(extracted_at)
+    })
+
+
+def transform_flood_areas(raw_areas, extracted_at=None):
+    """Transform flood area records, keeping their reference coordinates"""
+    raw = _frame(raw_areas, FLOOD_AREA_FIELDS)
+    area_id = raw['notation'].where(raw['notation'].notna(), _last_segment(raw['@id']))
+    return pd.DataFrame({
+        'area_id': area_id,
+        'label': raw['label'],
+        'river_or_sea': raw['riverOrSea'],
+        'lat': pd.to_numeric(raw['lat'], errors='coerce'),
+        'long': pd.to_numeric(raw['long'], errors='coerce'),
+        'extracted_at': _stamp(extracted_at)
+    })
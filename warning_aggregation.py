@@ -0,0 +1,200 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from features import SERIES_KEY, _to_ms
+
+# Readings in [event_time - window, event_time) are aggregated for each window
+DEFAULT_WINDOWS = ['6h', '24h', '72h']
+STATISTICS = ['count', 'mean', 'std', 'min', 'max', 'change']
+
+
+def warning_events(floods_df):
+    """One row per raised warning: flood_id, area_id, severity and event_time (UTC)
+
+    The event time is when the warning was raised, or when its message last
+    changed for records without a raised time. A warning seen in several
+    snapshots, as in the ingest service's change log, counts once per
+    raised time. Rows without an area or a time are dropped.
+    """
+    changed = pd.to_datetime(floods_df['time_changed'], utc=True, format='ISO8601', errors='coerce')
+    if 'time_raised' in floods_df:
+        raised = pd.to_datetime(floods_df['time_raised'], utc=True, format='ISO8601', errors='coerce')
+        changed = raised.where(raised.notna(), changed)
+    events = pd.DataFrame({
+        'flood_id': floods_df['flood_id'],
+        'area_id': floods_df['area_id'],
+        'severity': floods_df['severity'],
+        'event_time': changed,
+    })
+    events = events.dropna(subset=['area_id', 'event_time'])
+    return events.drop_duplicates(['flood_id', 'event_time'], keep='last', ignore_index=True)
+
+
+class ReadingIntervalIndex:
+    """Processed readings sorted by (series, time) for time-window lookups
+
+    Each (station_id, measure_id) series is contiguous and time-sorted, so
+    the readings of one series in [start, end) are two binary searches on a
+    single composite key, as in add_window_features, and window statistics
+    come from prefix sums (count, sum, sum of squares) and ufunc reduceat
+    (min, max) over the row range. Nothing is joined against the readings.
+    ``series`` lists station_id, measure_id and parameter of each series
+    code.
+    """
+
+    def __init__(self, readings_df):
+        datetimes = pd.to_datetime(readings_df['datetime'], utc=True)
+        present = datetimes.notna().to_numpy()
+        df = readings_df.loc[present]
+        groups = df.groupby(SERIES_KEY, sort=True, dropna=False)
+        codes = groups.ngroup().to_numpy()
+        columns = {'parameter': 'first'} if 'parameter' in df else {}
+        self.series = groups.agg(columns).reset_index() if columns else groups.size().reset_index()[SERIES_KEY]
+
+        times = datetimes[present].dt.as_unit('ms').astype('int64').to_numpy()
+        values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=float)
+        order = np.lexsort((times, codes))
+        self.codes, self.times, self.values = codes[order], times[order], values[order]
+
+        # One monotonic key across series; span keeps lookups inside their series
+        self.origin = int(self.times.min()) if len(self.times) else 0
+        self.span = int(self.times.max()) - self.origin + 1 if len(self.times) else 1
+        self.composite = self.codes * self.span + (self.times - self.origin)
+
+        # Sums are taken around each series' mean, so the variance of a
+        # slowly varying level does not cancel out
+        valid = ~np.isnan(self.values)
+        counts = np.bincount(self.codes[valid], minlength=len(self.series))
+        sums = np.bincount(self.codes[valid], weights=self.values[valid], minlength=len(self.series))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.base = np.where(counts > 0, sums / counts, 0.0)
+        shifted = np.where(valid, self.values - self.base[self.codes], 0.0)
+        self.count_prefix = np.concatenate([[0], np.cumsum(valid)])
+        self.sum_prefix = np.concatenate([[0.0], np.cumsum(shifted)])
+        self.square_prefix = np.concatenate([[0.0], np.cumsum(shifted * shifted)])
+
+    def __len__(self):
+        return len(self.values)
+
+    def bounds(self, codes, starts, ends):
+        """Row range [lo, hi) of the readings of series ``codes`` with starts <= time < ends (epoch ms)"""
+        lo = codes * self.span + np.clip(starts - self.origin, 0, self.span)
+        hi = codes * self.span + np.clip(ends - self.origin, 0, self.span)
+        return np.searchsorted(self.composite, lo, side='left'), np.searchsorted(self.composite, hi, side='left')
+
+    def window_stats(self, codes, lo, hi):
+        """STATISTICS of the values in rows [lo, hi) of series ``codes``
+
+        change is the last value in the window minus the first. Statistics
+        of windows without readings are NaN (count 0).
+        """
+        count = self.count_prefix[hi] - self.count_prefix[lo]
+        total = self.sum_prefix[hi] - self.sum_prefix[lo]
+        squares = self.square_prefix[hi] - self.square_prefix[lo]
+        nonempty = hi > lo
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+            variance = np.where(count > 1, (squares - total * mean) / (count - 1), np.nan)
+
+        # reduceat over interleaved bounds also reduces the gap between one
+        # window and the next, so windows go in start order to keep the gaps
+        # short; the padding makes hi == len a valid bound
+        padded = np.append(self.values, np.nan)
+        order = np.argsort(lo, kind='stable')
+        edges = np.column_stack([lo[order], hi[order]]).ravel()
+        minimum = np.empty(len(lo))
+        maximum = np.empty(len(lo))
+        if len(edges):
+            minimum[order] = np.fmin.reduceat(padded, edges)[::2]
+            maximum[order] = np.fmax.reduceat(padded, edges)[::2]
+        last = np.where(nonempty, padded[np.maximum(hi - 1, 0)], np.nan)
+        first = np.where(nonempty, padded[lo], np.nan)
+        return {
+            'count': count,
+            'mean': mean + self.base[codes],
+            'std': np.sqrt(np.clip(variance, 0, None)),
+            'min': np.where(nonempty, minimum, np.nan),
+            'max': np.where(nonempty, maximum, np.nan),
+            'change': last - first,
+        }
+
+
+def aggregate_warning_windows(events, station_areas, index, windows):
+    """Window statistics for one chunk of warning events
+
+    ``windows`` maps window names to lengths in ms. Returns a row per
+    (warning, station in its area, series of that station).
+    """
+    pairs = events.merge(station_areas[['area_id', 'station_id', 'distance_km']], on='area_id')
+    series = index.series.assign(code=np.arange(len(index.series)))
+    pairs = pairs.merge(series, on='station_id')
+    codes = pairs.pop('code').to_numpy()
+    event_ms = pairs['event_time'].dt.as_unit('ms').astype('int64').to_numpy()
+
+    columns = {}
+    for name, window in windows.items():
+        lo, hi = index.bounds(codes, event_ms - window, event_ms)
+        for statistic, values in index.window_stats(codes, lo, hi).items():
+            columns[f'value_{statistic}_{name}'] = values
+    return pd.concat([pairs, pd.DataFrame(columns, index=pairs.index)], axis=1)
+
+
+# Set in each aggregation worker process by _init_aggregation_worker
+_worker_state = {}
+
+
+def _init_aggregation_worker(index, station_areas, windows):
+    """Receive the broadcast reading index and station-area table once per worker process"""
+    _worker_state['index'] = index
+    _worker_state['station_areas'] = station_areas
+    _worker_state['windows'] = windows
+
+
+def _aggregate_chunk(events):
+    return aggregate_warning_windows(events, _worker_state['station_areas'], _worker_state['index'],
+                                     _worker_state['windows'])
+
+
+def aggregate_warnings(floods_df, station_areas_df, readings_df, windows=DEFAULT_WINDOWS, max_km=None,
+                       workers=None, chunk_events=5_000):
+    """Join flood warnings with the readings of nearby stations over pre-event windows
+
+    ``station_areas_df`` links stations to flood areas (station_id,
+    area_id, distance_km), as FloodETL.build_spatial_maps writes it;
+    ``max_km`` keeps only the closer pairs. For each warning event (see
+    warning_events), each station linked to its area and each of that
+    station's series, the readings in [event_time - window, event_time)
+    are summarized as value_{count,mean,std,min,max,change}_{window}.
+
+    The readings are indexed once (ReadingIntervalIndex) and events are
+    aggregated in chunks of ``chunk_events`` across a process pool, with
+    the index broadcast to every worker; ``workers=1`` runs in this
+    process. Rows come out in event order.
+    """
+    windows = {name: _to_ms(name) for name in windows}
+    events = warning_events(floods_df)
+    station_areas = station_areas_df
+    if max_km is not None:
+        station_areas = station_areas[station_areas['distance_km'] <= max_km]
+    # Only areas that have stations can produce rows
+    events = events[events['area_id'].isin(station_areas['area_id'])].reset_index(drop=True)
+    index = ReadingIntervalIndex(readings_df)
+
+    chunks = [events.iloc[start:start + chunk_events] for start in range(0, len(events), chunk_events)]
+    workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+    if workers == 1:
+        parts = [aggregate_warning_windows(chunk, station_areas, index, windows) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_aggregation_worker,
+            initargs=(index, station_areas, windows)
+        ) as pool:
+            parts = list(pool.map(_aggregate_chunk, chunks))
+
+    if not parts:
+        parts = [aggregate_warning_windows(events, station_areas, index, windows)]
+    return pd.concat(parts, ignore_index=True)